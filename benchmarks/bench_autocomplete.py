@@ -0,0 +1,105 @@
+"""Benchmark of /autocomplete requests, typed one keystroke at a time, for the memory and database repositories.
+
+The bundled csv files are loaded and EXTRA_ARTISTS artists and EXTRA_USERS users are added, named after random words
+of the track titles. Every prefix of SAMPLE names of each kind is then requested through the Flask test client and the
+median, 99th percentile and maximum request times are reported. For the database the first request of each kind loads
+the prefix index; that request is reported on its own.
+
+Run from the project root:
+
+    python -m benchmarks.bench_autocomplete
+"""
+import os
+import random
+import tempfile
+import time
+
+from music import create_app
+import music.adapters.repository as repo
+from music.adapters.database_repository import SqlAlchemyRepository
+from music.adapters.orm import users_table
+from music.adapters.text_search import tokenize
+from music.domainmodel.artist import Artist
+from music.domainmodel.user import User
+
+from utils import get_project_root
+
+DATA_PATH = get_project_root() / "music" / "adapters" / "data"
+EXTRA_ARTISTS = 50_000
+EXTRA_USERS = 50_000
+FIRST_EXTRA_ID = 1_000_000
+SAMPLE = 200
+
+
+def random_names(vocabulary, count):
+    # -- unique, as user names are
+    names = set()
+    while len(names) < count:
+        names.add(' '.join(random.sample(vocabulary, random.randint(1, 3))).title())
+    return sorted(names)
+
+
+def add_names(tracks):
+    vocabulary = sorted({term for track in tracks for term in tokenize(track.title)})
+    artists = [Artist(FIRST_EXTRA_ID + index, name)
+               for index, name in enumerate(random_names(vocabulary, EXTRA_ARTISTS))]
+    users = [User(FIRST_EXTRA_ID + index, name, 'password-hash')
+             for index, name in enumerate(random_names(vocabulary, EXTRA_USERS))]
+    if isinstance(repo.repo_instance, SqlAlchemyRepository):
+        # -- one transaction each, as adding them one at a time would take minutes
+        repo.repo_instance.bulk_insert([], artists, [], [])
+        with repo.repo_instance._session_cm as scm:
+            scm.session.execute(users_table.insert(), [
+                {'id': user.user_id, 'user_name': user.user_name, 'password': user.password} for user in users])
+            scm.commit()
+    else:
+        for artist in artists:
+            repo.repo_instance.add_artist(artist)
+        for user in users:
+            repo.repo_instance.add_user(user)
+    return {'artist': [artist.full_name for artist in artists], 'user': [user.user_name for user in users]}
+
+
+def percentile(sorted_timings, fraction):
+    return sorted_timings[min(len(sorted_timings) - 1, int(len(sorted_timings) * fraction))]
+
+
+def run(name, config):
+    random.seed(235)
+    app = create_app(dict(config, TESTING='True', TEST_DATA_PATH=DATA_PATH))
+    client = app.test_client()
+    with app.app_context():
+        names = add_names(repo.repo_instance.get_all_tracks())
+    print(name)
+    for kind in ('artist', 'user'):
+        start = time.perf_counter()
+        client.get('/autocomplete', query_string={'kind': kind, 'q': 'zz'})
+        first_request = time.perf_counter() - start
+
+        timings = []
+        for typed_name in random.sample(names[kind], SAMPLE):
+            for length in range(1, len(typed_name) + 1):
+                start = time.perf_counter()
+                client.get('/autocomplete', query_string={'kind': kind, 'q': typed_name[:length]})
+                timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f'  {kind:<7} first {first_request * 1000:>7.2f} ms   {len(timings):>5} keystrokes '
+              f'p50 {percentile(timings, 0.5) * 1000:.2f} ms  p99 {percentile(timings, 0.99) * 1000:.2f} ms  '
+              f'max {timings[-1] * 1000:.2f} ms')
+
+
+def run_database():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        run('database', {'REPOSITORY': 'database', 'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path})
+    finally:
+        repo.repo_instance.close_session()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    run('memory', {'REPOSITORY': 'memory'})
+    run_database()
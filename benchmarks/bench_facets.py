@@ -0,0 +1,123 @@
+"""Benchmark of browse_tracks on 100k tracks, for the memory and database repositories.
+
+The tracks of the bundled csv files are copied as in bench_search. Pages of tracks matching random combinations of
+genre, decade, release year, album type and duration filters, with the counts of every facet, are then read REPEAT
+times. The time of the first page (which loads the facets) and the median and 99th percentile time per page are
+reported, next to the median time of filtering and counting by looping over every track in Python.
+
+Run from the project root:
+
+    python -m benchmarks.bench_facets
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from benchmarks.bench_search import copied_tracks, read_dataset
+from music.adapters.database_repository import SqlAlchemyRepository
+from music.adapters.facets import DURATION_BUCKETS
+from music.adapters.memory_repository import MemoryRepository
+from music.adapters.orm import metadata, map_model_to_tables
+
+REPEAT = 500
+
+
+def percentile(sorted_timings, fraction):
+    return sorted_timings[min(len(sorted_timings) - 1, int(len(sorted_timings) * fraction))]
+
+
+def random_filters(reader):
+    genre_ids = sorted(genre.genre_id for genre in reader.dataset_of_genres)
+    years = sorted({album.release_year for album in reader.dataset_of_albums if album.release_year is not None})
+    album_types = sorted({album.album_type for album in reader.dataset_of_albums if album.album_type})
+    choices = {
+        'genre': lambda: random.choice(genre_ids),
+        'decade': lambda: random.choice(years) // 10 * 10,
+        'year': lambda: random.choice(years),
+        'album_type': lambda: random.choice(album_types),
+        'duration': lambda: random.choice(DURATION_BUCKETS),
+    }
+    return lambda: {facet: choose() for facet, choose in choices.items() if random.random() < 0.3}
+
+
+def scan(tracks, genre_id):
+    # -- one facet filtered and every facet counted, by looping over the tracks
+    counts = {facet: Counter() for facet in ('genre', 'year', 'album_type')}
+    matching = []
+    for track in tracks:
+        genre_ids = [genre.genre_id for genre in track.genres]
+        counts['genre'].update(genre_ids)
+        if genre_id in genre_ids:
+            matching.append(track.track_id)
+            if track.album is not None:
+                counts['year'][track.album.release_year] += 1
+                counts['album_type'][track.album.album_type] += 1
+    return matching[:20], counts
+
+
+def run(name, repo, reader, tracks):
+    random.seed(235)
+    filters = random_filters(reader)
+
+    start = time.perf_counter()
+    repo.browse_tracks({}, 20)
+    first = time.perf_counter() - start
+
+    timings = []
+    for _ in range(REPEAT):
+        if isinstance(repo, SqlAlchemyRepository):
+            repo.reset_session()
+        page_filters = filters()
+        start = time.perf_counter()
+        repo.browse_tracks(page_filters, 20, random.choice([0, 0, 20, 100]))
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    scans = []
+    for _ in range(5):
+        start = time.perf_counter()
+        scan(tracks, 21)
+        scans.append(time.perf_counter() - start)
+
+    print(f'{name:<10} first {first * 1000:8.2f} ms  p50 {percentile(timings, 0.5) * 1000:6.2f} ms  '
+          f'p99 {percentile(timings, 0.99) * 1000:6.2f} ms  (scanning {len(tracks)} tracks: '
+          f'{statistics.median(scans) * 1000:.2f} ms)')
+
+
+def run_database():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    clear_mappers()
+    engine = create_engine('sqlite:///' + path)
+    metadata.create_all(engine)
+    map_model_to_tables()
+    repo = SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+    try:
+        reader = read_dataset()
+        tracks = list(copied_tracks(reader))
+        repo.bulk_insert(reader.dataset_of_albums, reader.dataset_of_artists, tracks, reader.dataset_of_genres)
+        run('database', repo, reader, tracks)
+    finally:
+        repo.close_session()
+        engine.dispose()
+        os.remove(path)
+
+
+def run_memory():
+    clear_mappers()
+    reader = read_dataset()
+    tracks = list(copied_tracks(reader))
+    repo = MemoryRepository()
+    repo.bulk_load(reader.dataset_of_albums, reader.dataset_of_artists, tracks, reader.dataset_of_genres)
+    run('memory', repo, reader, tracks)
+
+
+if __name__ == '__main__':
+    run_memory()
+    run_database()
@@ -0,0 +1,47 @@
+"""Micro-benchmark of parsing the track_genres column of the bundled raw_tracks_excerpt.csv.
+
+Compares ast.literal_eval (the original parser) with parse_genres, both without and with its per-string memo.
+
+Run from the project root:
+
+    python -m benchmarks.bench_genre_parser
+"""
+import ast
+import timeit
+
+from music.adapters.csvdatareader import TrackCSVReader, parse_genres
+
+from utils import get_project_root
+
+DATA_PATH = get_project_root() / "music" / "adapters" / "data"
+REPEAT = 20
+
+
+def literal_eval_genres(track_genres_raw: str) -> tuple:
+    return tuple((int(genre_dict['genre_id']), genre_dict['genre_title'])
+                 for genre_dict in ast.literal_eval(track_genres_raw))
+
+
+def uncached_parse_genres(track_genres_raw: str) -> tuple:
+    return parse_genres.__wrapped__(track_genres_raw)
+
+
+def parse_all(parse, values):
+    # -- the memo starts empty on every run, as it would for a single ingest
+    parse_genres.cache_clear()
+    return [parse(value) for value in values]
+
+
+def run(name, parse, values):
+    elapsed = min(timeit.repeat(lambda: parse_all(parse, values), number=1, repeat=REPEAT))
+    print(f'{name:<24} {len(values):>6} values {elapsed * 1000:>9.2f} ms {len(values) / elapsed:>12.0f} values/s')
+
+
+if __name__ == '__main__':
+    reader = TrackCSVReader(str(DATA_PATH / "raw_albums_excerpt.csv"), str(DATA_PATH / "raw_tracks_excerpt.csv"))
+    values = [row['track_genres'] for row in reader.iter_track_rows() if row['track_genres']]
+    assert all(parse_genres(value) == literal_eval_genres(value) for value in values)
+
+    run('ast.literal_eval', literal_eval_genres, values)
+    run('parse_genres (no memo)', uncached_parse_genres, values)
+    run('parse_genres', parse_genres, values)
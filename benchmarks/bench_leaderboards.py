@@ -0,0 +1,112 @@
+"""Benchmark of get_leaderboard on 100k tracks, for the memory and database repositories.
+
+The tracks of the bundled csv files are copied as in bench_search. Leaderboards of random metrics, overall and of
+random genres, artists and release years, are then read REPEAT times, each after a like or playlist add of a random
+track by one of USERS users. The time to show the first leaderboard (which loads them) and the median and 99th
+percentile time per leaderboard are reported, next to the median time of ranking the tracks by scanning them all.
+
+Run from the project root:
+
+    python -m benchmarks.bench_leaderboards
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from benchmarks.bench_search import copied_tracks, read_dataset
+from music.adapters.database_repository import SqlAlchemyRepository
+from music.adapters.memory_repository import MemoryRepository
+from music.adapters.orm import metadata, map_model_to_tables
+from music.adapters.repository import LEADERBOARD_METRICS
+from music.domainmodel.user import User
+
+REPEAT = 500
+USERS = 20
+
+
+def percentile(sorted_timings, fraction):
+    return sorted_timings[min(len(sorted_timings) - 1, int(len(sorted_timings) * fraction))]
+
+
+def random_scopes(reader):
+    genre_ids = sorted(genre.genre_id for genre in reader.dataset_of_genres)
+    artist_ids = sorted(artist.artist_id for artist in reader.dataset_of_artists)
+    years = sorted({album.release_year for album in reader.dataset_of_albums if album.release_year is not None})
+    return lambda: random.choice([None, ('genre', random.choice(genre_ids)), ('artist', random.choice(artist_ids)),
+                                  ('year', random.choice(years))])
+
+
+def run(name, repo, reader, tracks):
+    random.seed(235)
+    for user_id in range(1, USERS + 1):
+        repo.add_user(User(user_id, f'listener{user_id}', 'password-hash'))
+    users = [repo.get_user(f'listener{user_id}') for user_id in range(1, USERS + 1)]
+    track_ids = [track.track_id for track in tracks]
+    random_scope = random_scopes(reader)
+
+    start = time.perf_counter()
+    repo.get_leaderboard('listens', None, 20)
+    first = time.perf_counter() - start
+
+    timings = []
+    for _ in range(REPEAT):
+        track = repo.get_track(random.choice(track_ids))
+        if random.random() < 0.5:
+            repo.add_to_favourite(track, random.choice(users))
+        else:
+            repo.add_to_playlist(track, random.choice(users))
+        if isinstance(repo, SqlAlchemyRepository):
+            repo.reset_session()
+        metric, scope = random.choice(LEADERBOARD_METRICS), random_scope()
+        start = time.perf_counter()
+        repo.get_leaderboard(metric, scope, 20)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    scans = []
+    for _ in range(5):
+        start = time.perf_counter()
+        sorted(tracks, key=lambda track: (-track.track_listens, track.track_id))[:20]
+        scans.append(time.perf_counter() - start)
+
+    print(f'{name:<10} first {first * 1000:8.2f} ms  p50 {percentile(timings, 0.5) * 1000:6.2f} ms  '
+          f'p99 {percentile(timings, 0.99) * 1000:6.2f} ms  (scanning {len(tracks)} tracks: '
+          f'{statistics.median(scans) * 1000:.2f} ms)')
+
+
+def run_database():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    clear_mappers()
+    engine = create_engine('sqlite:///' + path)
+    metadata.create_all(engine)
+    map_model_to_tables()
+    repo = SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+    try:
+        reader = read_dataset()
+        tracks = list(copied_tracks(reader))
+        repo.bulk_insert(reader.dataset_of_albums, reader.dataset_of_artists, tracks, reader.dataset_of_genres)
+        run('database', repo, reader, tracks)
+    finally:
+        repo.close_session()
+        engine.dispose()
+        os.remove(path)
+
+
+def run_memory():
+    clear_mappers()
+    reader = read_dataset()
+    tracks = list(copied_tracks(reader))
+    repo = MemoryRepository()
+    repo.bulk_load(reader.dataset_of_albums, reader.dataset_of_artists, tracks, reader.dataset_of_genres)
+    run('memory', repo, reader, tracks)
+
+
+if __name__ == '__main__':
+    run_memory()
+    run_database()
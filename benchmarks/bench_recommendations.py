@@ -0,0 +1,77 @@
+"""Benchmark of /search for a logged-in user with FAVOURITES favourite tracks, for the memory and database repositories.
+
+The page lists the user's suggested tracks. The bundled csv files are loaded and OTHER_USERS other users each like
+OTHER_FAVOURITES random tracks, so there are likes in common to learn from. /search is then requested REPEAT times
+through the Flask test client and the median and 99th percentile request times are reported.
+
+Run from the project root:
+
+    python -m benchmarks.bench_recommendations
+"""
+import os
+import random
+import tempfile
+import time
+
+from music import create_app
+import music.adapters.repository as repo
+from music.domainmodel.user import User
+
+from utils import get_project_root
+
+DATA_PATH = get_project_root() / "music" / "adapters" / "data"
+FAVOURITES = 500
+OTHER_USERS = 100
+OTHER_FAVOURITES = 50
+REPEAT = 200
+
+
+def add_favourites(user_id, user_name, tracks, count):
+    repo.repo_instance.add_user(User(user_id, user_name, 'password-hash'))
+    user = repo.repo_instance.get_user(user_name)
+    for track in random.sample(tracks, count):
+        repo.repo_instance.add_to_favourite(track, user)
+
+
+def percentile(sorted_timings, fraction):
+    return sorted_timings[min(len(sorted_timings) - 1, int(len(sorted_timings) * fraction))]
+
+
+def run(name, config):
+    random.seed(235)
+    app = create_app(dict(config, TESTING='True', TEST_DATA_PATH=DATA_PATH, WTF_CSRF_ENABLED=False))
+    client = app.test_client()
+    with app.app_context():
+        tracks = repo.repo_instance.get_all_tracks()
+        for user_id in range(1, OTHER_USERS + 1):
+            add_favourites(user_id, f'listener{user_id}', tracks, OTHER_FAVOURITES)
+        add_favourites(OTHER_USERS + 1, 'benchmark', tracks, FAVOURITES)
+    with client.session_transaction() as session:
+        session['user_name'] = 'benchmark'
+
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        response = client.get('/search')
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    timings.sort()
+    print(f'{name:<10} /search p50 {percentile(timings, 0.5) * 1000:7.2f} ms  '
+          f'p99 {percentile(timings, 0.99) * 1000:7.2f} ms')
+
+
+def run_database():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        run('database', {'REPOSITORY': 'database', 'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path})
+    finally:
+        repo.repo_instance.close_session()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    run('memory', {'REPOSITORY': 'memory'})
+    run_database()
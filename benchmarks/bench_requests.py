@@ -0,0 +1,69 @@
+"""Benchmark of /all_tracks served by the threaded development server with the 'null' and 'queue' pool modes.
+
+Every mode gets a freshly populated SQLite file database; CLIENTS threads then request the first pages of the track
+list for DURATION seconds and the completed requests per second are reported.
+
+Run from the project root:
+
+    python -m benchmarks.bench_requests
+"""
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+from werkzeug.serving import make_server
+
+from music import create_app
+
+from utils import get_project_root
+
+DATA_PATH = get_project_root() / "music" / "adapters" / "data"
+CLIENTS = 8
+DURATION = 5
+URLS = ['/all_tracks', '/all_tracks?after=20', '/all_tracks?after=200', '/all_tracks?last=1']
+
+
+def request_loop(base_url, deadline, completed):
+    count = 0
+    while time.perf_counter() < deadline:
+        with urllib.request.urlopen(base_url + URLS[count % len(URLS)]) as response:
+            response.read()
+        count += 1
+    completed.append(count)
+
+
+def run(pool_mode):
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    app = create_app({
+        'TESTING': 'True',
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path,
+        'SQLALCHEMY_POOL': pool_mode,
+        'TEST_DATA_PATH': DATA_PATH,
+    })
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        completed = []
+        deadline = time.perf_counter() + DURATION
+        clients = [threading.Thread(target=request_loop, args=(base_url, deadline, completed))
+                   for _ in range(CLIENTS)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        print(f'{pool_mode:<8} {sum(completed):>7} requests {sum(completed) / DURATION:>9.1f} requests/s')
+    finally:
+        server.shutdown()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    # -- 'static' is left out: it shares one connection (and so one transaction) and is refused for file databases
+    for pool_mode in ['null', 'queue']:
+        run(pool_mode)
@@ -0,0 +1,105 @@
+"""Benchmark of search_tracks on 100k tracks, for the SQLite database and the memory repository.
+
+The bundled csv files are read once and their tracks are copied COPIES times under new ids (sharing artists, albums and
+genres), then every query in QUERIES fetches its first page of 20 tracks. The median time per query is reported, as
+well as the time MemoryRepository takes to index the tracks.
+
+Run from the project root:
+
+    python -m benchmarks.bench_search
+"""
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters.database_repository import SqlAlchemyRepository
+from music.adapters.memory_repository import MemoryRepository
+from music.adapters.orm import metadata, map_model_to_tables
+from music.domainmodel.track import Track
+
+from utils import get_project_root
+
+DATA_PATH = get_project_root() / "music" / "adapters" / "data"
+COPIES = 50
+ID_STRIDE = 1_000_000
+REPEAT = 50
+QUERIES = ['awol', 'food', 'electric ave', 'rock', 'hip hop', 'the', 'love', 'experimental pop', 'zzzz']
+
+
+def copied_tracks(reader):
+    for copy in range(COPIES):
+        for track in reader.dataset_of_tracks:
+            duplicate = Track(track.track_id + copy * ID_STRIDE, track.title)
+            duplicate.track_url = track.track_url
+            duplicate.track_duration = track.track_duration
+            duplicate.track_listens = track.track_listens
+            duplicate.track_favorites = track.track_favorites
+            duplicate.track_interest = track.track_interest
+            duplicate.artist = track.artist
+            duplicate.album = track.album
+            for genre in track.genres:
+                duplicate.add_genre(genre)
+            yield duplicate
+
+
+def time_query(repo, query):
+    timings = []
+    for _ in range(REPEAT):
+        if isinstance(repo, SqlAlchemyRepository):
+            repo.reset_session()
+        start = time.perf_counter()
+        tracks = repo.search_tracks(query, 20, 0)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(tracks)
+
+
+def read_dataset():
+    reader = TrackCSVReader(str(DATA_PATH / "raw_albums_excerpt.csv"), str(DATA_PATH / "raw_tracks_excerpt.csv"))
+    reader.read_csv_files()
+    return reader
+
+
+def run(name, repo):
+    print(name)
+    for query in QUERIES:
+        elapsed, found = time_query(repo, query)
+        print(f'  {query!r:<20} {found:>3} tracks {elapsed * 1000:>8.2f} ms')
+
+
+def run_database():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    clear_mappers()
+    engine = create_engine('sqlite:///' + path)
+    metadata.create_all(engine)
+    map_model_to_tables()
+    repo = SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+    try:
+        reader = read_dataset()
+        tracks = list(copied_tracks(reader))
+        repo.bulk_insert(reader.dataset_of_albums, reader.dataset_of_artists, tracks, reader.dataset_of_genres)
+        run(f'database, {len(tracks)} tracks', repo)
+    finally:
+        repo.close_session()
+        engine.dispose()
+        os.remove(path)
+
+
+def run_memory():
+    clear_mappers()
+    reader = read_dataset()
+    tracks = list(copied_tracks(reader))
+    repo = MemoryRepository()
+    start = time.perf_counter()
+    repo.bulk_load(reader.dataset_of_albums, reader.dataset_of_artists, tracks, reader.dataset_of_genres)
+    run(f'memory, {len(tracks)} tracks loaded and indexed in {time.perf_counter() - start:.2f} s', repo)
+
+
+if __name__ == '__main__':
+    run_database()
+    run_memory()
@@ -0,0 +1,58 @@
+"""Benchmark of the track feature matrix behind get_similar_tracks, on 100k tracks.
+
+The tracks of bench_search (the bundled csv files copied COPIES times) are encoded once, then the most similar tracks
+are found for one seed at a time and for batches of seeds. The build time and the median time per call are reported,
+then the median time to add one more track and to search right after it, which standardises the years and durations
+again.
+
+Run from the project root:
+
+    python -m benchmarks.bench_similarity
+"""
+import random
+import statistics
+import time
+
+from music.adapters.similarity import TrackFeatures, feature_row
+
+from benchmarks.bench_search import copied_tracks, read_dataset
+
+K = 5
+REPEAT = 20
+BATCH_SIZES = [1, 16, 64, 500]
+
+
+def main():
+    random.seed(235)
+    tracks = list(copied_tracks(read_dataset()))
+    start = time.perf_counter()
+    features = TrackFeatures(feature_row(track) for track in tracks)
+    print(f'{len(features)} tracks encoded in {time.perf_counter() - start:.2f} s')
+
+    track_ids = [track.track_id for track in tracks]
+    for batch_size in BATCH_SIZES:
+        timings = []
+        for _ in range(REPEAT):
+            seeds = random.sample(track_ids, batch_size)
+            start = time.perf_counter()
+            features.similar(seeds, K)
+            timings.append(time.perf_counter() - start)
+        elapsed = statistics.median(timings)
+        print(f'  {batch_size:>4} seeds  {elapsed * 1000:>8.2f} ms per call  '
+              f'{elapsed * 1000 / batch_size:>7.2f} ms per seed')
+
+    add_timings, search_timings = [], []
+    for track in random.sample(tracks, REPEAT):
+        row = (max(track_ids) + len(add_timings) + 1,) + feature_row(track)[1:]
+        start = time.perf_counter()
+        features.add(row)
+        add_timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        features.similar([row[0]], K)
+        search_timings.append(time.perf_counter() - start)
+    print(f'  adding a track {statistics.median(add_timings) * 1000:.3f} ms, '
+          f'then 1 seed {statistics.median(search_timings) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark of concurrent reads and writes on an SQLite file database, with and without the SQLITE_PRAGMAS of config.py.
+
+For every profile a freshly populated database is read by READERS threads, each fetching pages of tracks with their
+artist and album, while one writer thread commits reviews one at a time, as the web application does. Completed reads
+and writes per second are reported.
+
+Run from the project root:
+
+    python -m benchmarks.bench_sqlite_pragmas
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker, clear_mappers
+from sqlalchemy.pool import NullPool
+
+from config import Config
+from music.adapters import repository_populate
+from music.adapters.database_repository import SqlAlchemyRepository
+from music.adapters.orm import (
+    metadata, map_model_to_tables, set_sqlite_pragmas, albums_table, artists_table, reviews_table, tracks_table
+)
+
+from utils import get_project_root
+
+DATA_PATH = get_project_root() / "music" / "adapters" / "data"
+READERS = 4
+DURATION = 5
+
+
+def populated_engine(path, pragmas):
+    clear_mappers()
+    engine = create_engine('sqlite:///' + path, connect_args={"check_same_thread": False}, poolclass=NullPool)
+    set_sqlite_pragmas(engine, pragmas)
+    metadata.create_all(engine)
+    map_model_to_tables()
+    repo = SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+    repository_populate.populate(DATA_PATH, repo, True, fast_ingest=True)
+    repo.close_session()
+    return engine
+
+
+def read_loop(engine, track_ids, deadline, completed):
+    page = select(tracks_table.c.id, tracks_table.c.title, artists_table.c.full_name, albums_table.c.title) \
+        .join(artists_table, artists_table.c.artist_id == tracks_table.c.artist) \
+        .outerjoin(albums_table, albums_table.c.album_id == tracks_table.c.album) \
+        .order_by(tracks_table.c.id).limit(20)
+    count = 0
+    while time.perf_counter() < deadline:
+        # -- a new connection per read, as with the application's default 'null' pool
+        with engine.connect() as connection:
+            connection.execute(page.where(tracks_table.c.id > random.choice(track_ids))).all()
+        count += 1
+    completed.append(count)
+
+
+def write_loop(engine, track_ids, deadline, completed):
+    count = 0
+    while time.perf_counter() < deadline:
+        with engine.begin() as connection:
+            connection.execute(reviews_table.insert().values(track_id=random.choice(track_ids), rating=3,
+                                                             review_text='Benchmark review', timestamp=datetime.now()))
+        count += 1
+    completed.append(count)
+
+
+def run(name, pragmas):
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    engine = populated_engine(path, pragmas)
+    try:
+        with engine.connect() as connection:
+            track_ids = connection.execute(select(tracks_table.c.id)).scalars().all()
+        deadline = time.perf_counter() + DURATION
+        reads, writes = [], []
+        threads = [threading.Thread(target=read_loop, args=(engine, track_ids, deadline, reads))
+                   for _ in range(READERS)]
+        threads.append(threading.Thread(target=write_loop, args=(engine, track_ids, deadline, writes)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f'{name:<10} {sum(reads) / DURATION:>10.0f} reads/s {sum(writes) / DURATION:>10.0f} writes/s')
+    finally:
+        engine.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    run('defaults', {})
+    run('pragmas', Config.SQLITE_PRAGMAS)
@@ -0,0 +1,56 @@
+"""Benchmark memory-mode startup: populating from the csv files versus loading a snapshot.
+
+Run from the project root:
+
+    python -m benchmarks.bench_startup
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from music.adapters import repository_populate
+from music.adapters.csvdatareader import parse_genres
+from music.adapters.memory_repository import MemoryRepository
+from music.adapters.repository_snapshot import save_snapshot, load_snapshot
+
+from utils import get_project_root
+
+DATA_PATH = get_project_root() / "music" / "adapters" / "data"
+REPEAT = 5
+
+
+def cold_csv():
+    # -- a fresh process starts without the genre parser's memo
+    parse_genres.cache_clear()
+    repo = MemoryRepository()
+    repository_populate.populate(DATA_PATH, repo, False)
+    return repo
+
+
+def best_of(function):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == '__main__':
+    handle, snapshot_path = tempfile.mkstemp(suffix='.snapshot')
+    os.close(handle)
+    snapshot_path = Path(snapshot_path)
+    try:
+        cold_time, repo = best_of(cold_csv)
+        save_time, _ = best_of(lambda: save_snapshot(repo, snapshot_path, DATA_PATH))
+        warm_time, warm_repo = best_of(lambda: load_snapshot(snapshot_path, DATA_PATH))
+        assert warm_repo is not None and len(warm_repo.tracks) == len(repo.tracks)
+
+        print(f'tracks                 {len(repo.tracks):>8}')
+        print(f'snapshot size          {snapshot_path.stat().st_size / 1024:>8.0f} KiB')
+        print(f'cold start (csv)       {cold_time * 1000:>8.1f} ms')
+        print(f'snapshot save          {save_time * 1000:>8.1f} ms')
+        print(f'warm start (snapshot)  {warm_time * 1000:>8.1f} ms')
+    finally:
+        os.remove(snapshot_path)
@@ -14,9 +14,27 @@ class Config:
 
 
     REPOSITORY = environ.get('REPOSITORY')
+    # File caching the populated memory repository between restarts; unset to always read the csv files
+    MEMORY_SNAPSHOT_PATH = environ.get('MEMORY_SNAPSHOT_PATH')
 
     # Database configuration
     SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
+    # Connection pool of the database engine: 'null' (a new connection per session), 'queue' or 'static' (one
+    # shared connection, only allowed for an in-memory database)
+    SQLALCHEMY_POOL = environ.get('SQLALCHEMY_POOL', 'null')
+    # Connections kept open between requests by the 'queue' pool (busier moments open up to 10 more)
+    SQLALCHEMY_POOL_SIZE = int(environ.get('SQLALCHEMY_POOL_SIZE', '5'))
+    # Pragmas run on every new SQLite connection. WAL lets readers carry on while a write is committed, and with
+    # WAL synchronous=NORMAL only syncs at checkpoints; the other settings keep more of the database in memory.
+    SQLITE_PRAGMAS = {
+        'journal_mode': environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),    # bytes
+        'cache_size': int(environ.get('SQLITE_CACHE_SIZE', str(-64 * 1024))),          # negative: KiB
+        'temp_store': environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+    }
+    # How the artist, album and genres of listed tracks are loaded: 'joined' or 'selectin'
+    TRACK_LOADER_STRATEGY = environ.get('TRACK_LOADER_STRATEGY', 'joined')
 
     echo_string = environ.get('SQLALCHEMY_ECHO')
     SQLALCHEMY_ECHO = False
@@ -4,13 +4,26 @@ from flask import Flask
 
 # -- Reference to Repository
 import music.adapters.repository as repo
-from music.adapters import memory_repository, database_repository, repository_populate
-from music.adapters.orm import metadata, map_model_to_tables
+from music.adapters import memory_repository, database_repository, repository_populate, repository_snapshot
+from music.adapters.orm import metadata, map_model_to_tables, set_sqlite_pragmas, upgrade_schema
 
 # imports from SQLAlchemy
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, clear_mappers
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool, StaticPool
+
+# Connection pools selectable with SQLALCHEMY_POOL
+POOL_CLASSES = {
+    'null': NullPool,
+    'static': StaticPool,
+    'queue': QueuePool,
+}
+
+
+def is_in_memory_database(database_uri: str) -> bool:
+    url = make_url(database_uri)
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
 
 
 def create_app(test_config = None):
@@ -30,11 +43,20 @@ def create_app(test_config = None):
 
 
     if app.config['REPOSITORY'] == 'memory':
-        # Create the MemoryRepository implementation for a memory-based repository.
-        repo.repo_instance = memory_repository.MemoryRepository()
-        # fill the content of the repository from the provided csv files (has to be done every time we start app!)
-        database_mode = False
-        repository_populate.populate(data_path, repo.repo_instance, database_mode)
+        # Reuse the snapshot of a previous start when it was built from the same csv files.
+        snapshot_path = app.config.get('MEMORY_SNAPSHOT_PATH')
+        repo.repo_instance = None
+        if snapshot_path:
+            repo.repo_instance = repository_snapshot.load_snapshot(snapshot_path, data_path)
+
+        if repo.repo_instance is None:
+            # Create the MemoryRepository implementation for a memory-based repository.
+            repo.repo_instance = memory_repository.MemoryRepository()
+            # fill the content of the repository from the provided csv files
+            database_mode = False
+            repository_populate.populate(data_path, repo.repo_instance, database_mode)
+            if snapshot_path:
+                repository_snapshot.save_snapshot(repo.repo_instance, snapshot_path, data_path)
 
     elif app.config['REPOSITORY'] == 'database':
         # Configure database.
@@ -45,14 +67,29 @@ def create_app(test_config = None):
         # leading to a URI of "sqlite:///covid-19.db".
         # Note that create_engine does not establish any actual DB connection directly!
         database_echo = app.config['SQLALCHEMY_ECHO']
-        # Please do not change the settings for connect_args and poolclass!
-        database_engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass=NullPool,
-                                        echo=database_echo)
+        # Connections are shared between the threads of the server, hence check_same_thread=False. The default
+        # 'null' pool opens a new connection for every session, 'queue' keeps up to SQLALCHEMY_POOL_SIZE open
+        # connections for reuse and 'static' shares a single connection (required for an in-memory database).
+        # A shared connection is also a shared transaction: one request ending rolls back what another has written
+        # but not yet committed, so 'static' is refused for file databases, which should use 'queue' instead.
+        pool_mode = app.config['SQLALCHEMY_POOL']
+        if pool_mode not in POOL_CLASSES:
+            raise ValueError(f'Unknown SQLALCHEMY_POOL {pool_mode}')
+        if pool_mode == 'static' and not is_in_memory_database(database_uri):
+            raise ValueError(f"SQLALCHEMY_POOL 'static' is only for in-memory databases, use 'queue' for "
+                             f"{database_uri}")
+        pool_args = dict()
+        if pool_mode == 'queue':
+            pool_args = dict(pool_size=app.config['SQLALCHEMY_POOL_SIZE'])
+        database_engine = create_engine(database_uri, connect_args={"check_same_thread": False},
+                                        poolclass=POOL_CLASSES[pool_mode], echo=database_echo, **pool_args)
+        set_sqlite_pragmas(database_engine, app.config['SQLITE_PRAGMAS'])
 
         # Create the database session factory using sessionmaker (this has to be done once, in a global manner)
         session_factory = sessionmaker(autocommit=False, autoflush=True, bind=database_engine)
         # Create the SQLAlchemy DatabaseRepository instance for an sqlite3-based repository.
-        repo.repo_instance = database_repository.SqlAlchemyRepository(session_factory)
+        repo.repo_instance = database_repository.SqlAlchemyRepository(session_factory,
+                                                                      app.config['TRACK_LOADER_STRATEGY'])
 
         if app.config['TESTING'] == 'True' or len(database_engine.table_names()) == 0:
             print("REPOPULATING DATABASE...")
@@ -66,10 +103,12 @@ def create_app(test_config = None):
             map_model_to_tables()
 
             database_mode = True
-            repository_populate.populate(data_path, repo.repo_instance, database_mode)
+            repository_populate.populate(data_path, repo.repo_instance, database_mode, fast_ingest=True)
             print("REPOPULATING DATABASE... FINISHED")
 
         else:
+            # Add any tables or indexes introduced since the database file was created.
+            upgrade_schema(database_engine, data_path)
             # Solely generate mappings that map domain model classes to the database tables.
             map_model_to_tables()
 
@@ -87,10 +126,17 @@ def create_app(test_config = None):
         app.register_blueprint(friends.friends_blueprint)
         from .playlists import playlists
         app.register_blueprint(playlists.playlists_blueprint)
+        from .autocomplete import autocomplete
+        app.register_blueprint(autocomplete.autocomplete_blueprint)
+        from .leaderboards import leaderboards
+        app.register_blueprint(leaderboards.leaderboards_blueprint)
+        from .browse import browse
+        app.register_blueprint(browse.browse_blueprint)
 
 
         # # Register a callback the makes sure that database sessions are associated with http requests
-        # We reset the session inside the database repository before a new flask request is generated
+        # We reset the session inside the database repository before a new flask request is generated; the session
+        # registry itself is reused, so this only discards whatever session the thread was left with
         @app.before_request
         def before_flask_http_request_function():
             if isinstance(repo.repo_instance, database_repository.SqlAlchemyRepository):
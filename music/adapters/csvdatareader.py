@@ -1,7 +1,10 @@
 import os
+import re
 import csv
 import ast
 
+from functools import lru_cache
+
 from werkzeug.security import generate_password_hash
 
 from pathlib import Path
@@ -15,6 +18,15 @@ from music.domainmodel.genre import Genre
 from music.domainmodel.model import User, make_review
 
 
+# Columns of the tracks csv file used to build Track, Artist, Album and Genre objects; every other column is dropped
+# while reading so that rows are not kept around with their urls, license text etc.
+TRACK_COLUMNS = ('track_id', 'track_title', 'track_url', 'track_duration', 'artist_id', 'artist_name', 'album_id',
+                 'track_genres', 'track_listens', 'track_favorites', 'track_interest')
+
+# Popularity counts of the tracks csv file, named as the Track attributes and tracks table columns they fill
+POPULARITY_COLUMNS = ('track_listens', 'track_favorites', 'track_interest')
+
+
 def create_track_object(track_row):
     track = Track(int(track_row['track_id']), track_row['track_title'])
     track.track_url = track_row['track_url']
@@ -22,12 +34,28 @@ def create_track_object(track_row):
         track_row['track_duration'])) if track_row['track_duration'] is not None else None
     if type(track_duration) is int:
         track.track_duration = track_duration
+    for count_column, count in popularity_counts(track_row).items():
+        setattr(track, count_column, count)
     return track
 
 
-def create_artist_object(track_row):
+def popularity_counts(track_row) -> dict:
+    # -- popularity counts are blank for some tracks, which count as 0
+    counts = dict()
+    for count_column in POPULARITY_COLUMNS:
+        count = track_row.get(count_column)
+        counts[count_column] = int(count) if count is not None and count.isdigit() else 0
+    return counts
+
+
+def create_artist_object(track_row, artists_by_id: dict = None):
     artist_id = int(track_row['artist_id'])
+    # -- with an identity map, rows of the same artist share one Artist instance
+    if artists_by_id is not None and artist_id in artists_by_id:
+        return artists_by_id[artist_id]
     artist = Artist(artist_id, track_row['artist_name'])
+    if artists_by_id is not None:
+        artists_by_id[artist_id] = artist
     return artist
 
 
@@ -43,19 +71,49 @@ def create_album_object(row):
     return album
 
 
-def extract_genres(track_row: dict):
+# The track_genres column holds the repr of a list of dicts with string values, e.g.
+# [{'genre_id': '12', 'genre_title': 'Rock', 'genre_url': 'http://freemusicarchive.org/genre/Rock/'}]
+# Values containing a quote are written with the other quote character; escaped values are left to ast.literal_eval.
+_SINGLE_QUOTED = r"'([^'\\]*)'"
+_DOUBLE_QUOTED = r'"([^"\\]*)"'
+_GENRE_PAIR = rf"'(\w+)'\s*:\s*(?:{_SINGLE_QUOTED}|{_DOUBLE_QUOTED})"
+_GENRE_DICT = rf"\{{\s*{_GENRE_PAIR}(?:\s*,\s*{_GENRE_PAIR})*\s*,?\s*\}}"
+_GENRE_LIST_PATTERN = re.compile(rf"\[\s*(?:{_GENRE_DICT}(?:\s*,\s*{_GENRE_DICT})*\s*,?)?\s*\]")
+_GENRE_DICT_PATTERN = re.compile(_GENRE_DICT)
+_GENRE_PAIR_PATTERN = re.compile(_GENRE_PAIR)
+
+
+@lru_cache(maxsize=4096)
+def parse_genres(track_genres_raw: str) -> tuple:
+    """ Parses a track_genres value into a tuple of (genre_id, genre_title) pairs.
+    Results are memoised per distinct string, as the same few values repeat across thousands of tracks.
+    """
+    if _GENRE_LIST_PATTERN.fullmatch(track_genres_raw.strip()):
+        genre_dicts = []
+        for genre_match in _GENRE_DICT_PATTERN.finditer(track_genres_raw):
+            genre_dicts.append({pair.group(1): pair.group(2) if pair.group(2) is not None else pair.group(3)
+                                for pair in _GENRE_PAIR_PATTERN.finditer(genre_match.group())})
+    else:
+        # -- anything the fast parser does not recognise is parsed the slow (but general) way
+        genre_dicts = ast.literal_eval(track_genres_raw)
+
+    return tuple((int(genre_dict['genre_id']), genre_dict['genre_title']) for genre_dict in genre_dicts)
+
+
+def extract_genres(track_row: dict, genres_by_id: dict = None):
     # List of dictionaries inside the string.
     track_genres_raw = track_row['track_genres']
     # Populate genres. track_genres can be empty (None)
     genres = []
     if track_genres_raw:
         try:
-            genre_dicts = ast.literal_eval(
-                track_genres_raw) if track_genres_raw != "" else []
-
-            for genre_dict in genre_dicts:
-                genre = Genre(
-                    int(genre_dict['genre_id']), genre_dict['genre_title'])
+            for genre_id, genre_title in parse_genres(track_genres_raw):
+                # -- with an identity map, tracks of the same genre share one Genre instance
+                genre = genres_by_id.get(genre_id) if genres_by_id is not None else None
+                if genre is None:
+                    genre = Genre(genre_id, genre_title)
+                    if genres_by_id is not None:
+                        genres_by_id[genre_id] = genre
                 genres.append(genre)
         except Exception as e:
             print(track_genres_raw)
@@ -86,6 +144,11 @@ class TrackCSVReader:
         # Set of unique genres
         self.__dataset_of_genres = set()
 
+        # Identity maps, so every track references the single shared instance of its artist, album and genres
+        self.__artists_by_id = dict()
+        self.__albums_by_id = dict()
+        self.__genres_by_id = dict()
+
     @property
     def dataset_of_tracks(self) -> list:
         return self.__dataset_of_tracks
@@ -126,30 +189,44 @@ class TrackCSVReader:
         if not os.path.exists(self.__tracks_csv_file):
             print(f"path {self.__tracks_csv_file} does not exist!")
             return
-        track_rows = []
+        return list(self.iter_track_rows())
+
+    def iter_track_rows(self):
+        """ Yields the rows of the tracks csv file one at a time, holding only the TRACK_COLUMNS. """
+        if not os.path.exists(self.__tracks_csv_file):
+            print(f"path {self.__tracks_csv_file} does not exist!")
+            return
         # encoding of unicode_escape is required to decode successfully
         with open(self.__tracks_csv_file, encoding='unicode_escape') as track_csv:
-            reader = csv.DictReader(track_csv)
-            for track_row in reader:
-                track_rows.append(track_row)
-        return track_rows
-
-    def read_csv_files(self):
+            reader = csv.reader(track_csv)
+            header = next(reader, None)
+            if header is None:
+                return
+            positions = [header.index(column) for column in TRACK_COLUMNS]
+            width = len(header)
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) < width:
+                    # -- same as csv.DictReader, missing trailing values are None
+                    row += [None] * (width - len(row))
+                yield dict(zip(TRACK_COLUMNS, [row[position] for position in positions]))
+
+    def iter_tracks(self, albums_dict: dict = None):
+        """ Yields Track objects, with their artist, album and genres attached, one csv row at a time.
+        The artist, album and genre datasets are filled in as tracks are produced.
+        """
         # key is album_id
-        albums_dict: dict = self.read_albums_file_as_dict()
-        # list of track csv rows, not track objects
-        track_rows: list = self.read_tracks_file()
+        if albums_dict is None:
+            albums_dict = self.read_albums_file_as_dict()
 
-        # Make sure re-initialize to empty list, so that calling this function multiple times does not create
-        # duplicated dataset.
-        self.__dataset_of_tracks = []
-        for track_row in track_rows:
+        for track_row in self.iter_track_rows():
             track = create_track_object(track_row)
-            artist = create_artist_object(track_row)
+            artist = create_artist_object(track_row, self.__artists_by_id)
             track.artist = artist
 
             # Extract track_genres attributes and assign genres to the track.
-            track_genres = extract_genres(track_row)
+            track_genres = extract_genres(track_row, self.__genres_by_id)
             for genre in track_genres:
                 track.add_genre(genre)
 
@@ -157,6 +234,8 @@ class TrackCSVReader:
                 track_row['album_id']) if track_row['album_id'].isdigit() else None
 
             album = albums_dict[album_id] if album_id in albums_dict else None
+            if album is not None:
+                album = self.__albums_by_id.setdefault(album_id, album)
             track.album = album
 
             # Populate datasets for Artist and Genre
@@ -170,32 +249,34 @@ class TrackCSVReader:
                 if genre not in self.__dataset_of_genres:
                     self.__dataset_of_genres.add(genre)
 
+            yield track
+
+    def read_csv_files(self):
+        # key is album_id
+        albums_dict: dict = self.read_albums_file_as_dict()
+
+        # Make sure re-initialize to empty list, so that calling this function multiple times does not create
+        # duplicated dataset.
+        self.__dataset_of_tracks = []
+        for track in self.iter_tracks(albums_dict):
             self.__dataset_of_tracks.append(track)
 
         return self.__dataset_of_tracks
 
 
-def load_data(data_path: Path, repo: AbstractRepository):
+def load_data(data_path: Path, repo: AbstractRepository, fast_ingest: bool = False):
     tracks_filename = str(data_path / "raw_tracks_excerpt.csv")
     album_filename = str(data_path / "raw_albums_excerpt.csv")
     reader = TrackCSVReader(album_filename,tracks_filename)
-    reader.read_csv_files()
 
-    for album in reader.dataset_of_albums:
-        if repo.get_album(album.album_id) == None:
-            repo.add_album(album)
-
-    for artist in reader.dataset_of_artists:
-        if repo.get_artist(artist.artist_id) == None:
-            repo.add_artist(artist)
-
-    for track in reader.dataset_of_tracks:
-        if repo.get_track(track.track_id) == None:
-            repo.add_track(track)
-
-    for genre in reader.dataset_of_genres:
-        if repo.get_genre(genre.genre_id) == None:
-            repo.add_genre(genre)
+    if fast_ingest:
+        # -- the database repository's Core insert path (see SqlAlchemyRepository.bulk_insert) takes the tracks one
+        # -- csv row at a time; their artists, albums and genres are written as the tracks referencing them arrive
+        repo.bulk_insert([], [], reader.iter_tracks(), [])
+        return
+    reader.read_csv_files()
+    repo.bulk_load(reader.dataset_of_albums, reader.dataset_of_artists, reader.dataset_of_tracks,
+                   reader.dataset_of_genres)
 
 def load_user(data_path: Path, repo: AbstractRepository):
     user = User(0, 'testuser', generate_password_hash('testuser'))
@@ -1,24 +1,59 @@
+import threading
 from datetime import date
-from typing import List
+from typing import Dict, List, Tuple, Iterable
 
-from sqlalchemy import desc, asc, Column
-from sqlalchemy.exc import NoResultFound, MultipleResultsFound
+from sqlalchemy import desc, asc, case, Column, select, func, inspect, literal, literal_column
+from sqlalchemy.exc import IntegrityError, NoResultFound, MultipleResultsFound
 
-from sqlalchemy.orm import scoped_session
+from sqlalchemy.orm import scoped_session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 
 from music.adapters.repository import AbstractRepository
 
-from music.adapters.repository import AbstractRepository, RepositoryException
+from music.adapters.repository import (
+    AbstractRepository, RepositoryException, COMPLETION_KINDS, LEADERBOARD_METRICS, LEADERBOARD_SCOPES
+)
 from music.domainmodel.album import Album
 from music.domainmodel.artist import Artist
 from music.domainmodel.genre import Genre
 from music.domainmodel.playlist import PlayList
+from music.domainmodel.rating_summary import RatingSummary
 from music.domainmodel.review import Review
 from music.domainmodel.track import Track
 from music.domainmodel.user import User
 
 from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters.orm import (
+    albums_table, artists_table, genres_table, playlist_liked_by_table, playlist_tracks_table, playlists_table,
+    reviews_table, track_genres_table, track_ratings_table, tracks_table, tracks_search_table, users_table,
+    index_tracks_for_search
+)
+from music.adapters.facets import FACETS, TrackFacets
+from music.adapters.leaderboards import Leaderboards
+from music.adapters.recommendations import Recommender
+from music.adapters.similarity import FeatureRow, TrackFeatures, feature_row
+from music.adapters.text_search import tokenize, PrefixIndex
+
+
+def _forget_backref_tracks(entities: Iterable[object]):
+    # -- setting the artist, album or genres of a Track appends it to the mapped backref collection of each of them,
+    # -- so a shared artist, album or genre keeps every track of it alive. Those of objects never stored are emptied
+    for entity in entities:
+        state = inspect(entity)
+        if state.transient:
+            for relationship in state.mapper.relationships:
+                if relationship.uselist and relationship.key in state.dict:
+                    set_committed_value(entity, relationship.key, [])
+
+
+def _primary_key(entity):
+    # The key of a stored entity is read from its identity, as reading the attribute of an entity expired by a
+    # commit would reload it along with everything eagerly loaded for it.
+    state = inspect(entity)
+    if state.identity is not None:
+        return state.identity[0]
+    return state.mapper.primary_key_from_instance(entity)[0]
 
 
 class SessionContextManager:
@@ -46,17 +81,61 @@ class SessionContextManager:
         # this method can be used e.g. to allow Flask to start a new session for each http request,
         # via the 'before_request' callback
         self.close_current_session()
-        self.__session = scoped_session(self.__session_factory)
 
     def close_current_session(self):
+        # The registry is kept for the lifetime of the repository and holds one session per thread; remove() closes
+        # this thread's session (returning its connection to the pool) and the next access starts a new one.
         if not self.__session is None:
-            self.__session.close()
+            self.__session.remove()
+
+
+# Loader strategies for the artist and album shown in track lists: 'joined' adds them to the statement selecting the
+# tracks, 'selectin' loads each with one extra SELECT ... WHERE id IN (...) per page. Genres are always loaded with
+# selectin: joining a collection repeats every track row per genre, and SQLite materialises the whole
+# track_genres/genres join for it, which grows with the size of the catalogue rather than of the page.
+TRACK_LOADERS = {
+    'joined': joinedload,
+    'selectin': selectinload,
+}
+
+# bm25 weights of the title, artist, album and genres columns of tracks_search
+SEARCH_COLUMN_WEIGHTS = (10.0, 5.0, 5.0, 1.0)
+
+# The most tracks bulk_insert holds rows for before inserting them
+INGEST_CHUNK_SIZE = 5000
+
+# The tables the names of each kind in COMPLETION_KINDS are read from, and the rows counted for their popularity,
+# each with the column telling which name a row counts for (see _completions_version)
+COMPLETION_TABLES = {
+    'artist': ((artists_table, artists_table.c.artist_id), (tracks_table, tracks_table.c.artist)),
+    'album': ((albums_table, albums_table.c.album_id), (tracks_table, tracks_table.c.album)),
+    'genre': ((genres_table, genres_table.c.genre_id), (track_genres_table, track_genres_table.c.genre_id)),
+    'user': ((users_table, users_table.c.id), (playlist_liked_by_table, playlist_liked_by_table.c.playlist_id)),
+}
 
 
 class SqlAlchemyRepository(AbstractRepository):
 
-    def __init__(self, session_factory):
+    def __init__(self, session_factory, track_loader: str = 'joined'):
+        if track_loader not in TRACK_LOADERS:
+            raise RepositoryException(f'Unknown track loader {track_loader}')
         self._session_cm = SessionContextManager(session_factory)
+        self.__track_loader = TRACK_LOADERS[track_loader]
+        # -- (version, prefix index) of the names of each kind in COMPLETION_KINDS, the recommender of suggested
+        # -- tracks and the leaderboards, loaded on first use. All three follow the changes other processes sharing
+        # -- the database make: the completions are loaded again when the tables they are read from change (see
+        # -- _completions_version), the recommender and the leaderboards read the likes and counts of the tracks
+        # -- whose counts_version is above the one they last saw (see _recommender and _leaderboards)
+        self.__completions = dict()
+        self.__recommender = None
+        # -- the highest tracks.counts_version the recommender holds the likes of, and the leaderboards the counts of
+        self.__recommender_version = 0
+        self.__recommender_lock = threading.Lock()
+        self.__track_features = None
+        self.__track_facets = None
+        self.__leaderboards = None
+        self.__leaderboards_version = 0
+        self.__leaderboards_lock = threading.Lock()
 
     def close_session(self):
         self._session_cm.close_current_session()
@@ -68,6 +147,7 @@ class SqlAlchemyRepository(AbstractRepository):
         with self._session_cm as scm:
             scm.session.merge(album)
             scm.commit()
+        self._forget_catalogue_indexes()
 
     @property
     def users(self):
@@ -92,6 +172,7 @@ class SqlAlchemyRepository(AbstractRepository):
         with self._session_cm as scm:
             scm.session.merge(artist)
             scm.commit()
+        self._forget_catalogue_indexes()
 
 
     def get_artist(self, id: int) -> Artist:
@@ -109,7 +190,16 @@ class SqlAlchemyRepository(AbstractRepository):
     def add_track(self, track: Track):
         with self._session_cm as scm:
             scm.session.merge(track)
+            if isinstance(track, Track):
+                scm.session.flush()
+                index_tracks_for_search(scm.session, [track.track_id])
             scm.commit()
+        # -- the feature matrix takes the track as a new row rather than being loaded again
+        track_features = self.__track_features
+        self._forget_catalogue_indexes()
+        if track_features is not None and isinstance(track, Track):
+            track_features.add(feature_row(track))
+            self.__track_features = track_features
 
     def get_track(self, id: int) -> Track:
         track = None
@@ -131,60 +221,314 @@ class SqlAlchemyRepository(AbstractRepository):
         return albums
 
 
-    def get_tracks_by_album(self, album_name: str):
-        matching_tracks = []
-        # get album_id first then use album_id to get matching track
-        matching_album = self._session_cm.session.query(Album).filter(Album._Album__title == album_name).all()
-
-        #return matching_album
-        for album in matching_album:
-            matching_album_id = album.album_id
-            tracks = self._session_cm.session.query(Track).filter(Track._Track__album_id == matching_album_id).all()
-            for track in tracks:
-                matching_tracks.append(track)
-        return matching_tracks
+    def _track_relations(self):
+        # Artist, album and genres are loaded eagerly, as every track list shows them.
+        return [
+            self.__track_loader(Track._Track__artist),
+            self.__track_loader(Track._Track__album),
+            selectinload(Track._Track__genres)
+        ]
+
+    def _tracks_query(self):
+        return self._session_cm.session.query(Track).options(*self._track_relations())
+
+    def _users_query(self):
+        # -- user.html and playlist.html list the tracks of both playlists and the users who liked the playlist
+        return self._session_cm.session.query(User).options(
+            selectinload(User._User__playlist).options(
+                selectinload(PlayList._PlayList__list_of_tracks).options(*self._track_relations()),
+                selectinload(PlayList._PlayList__liked_by)
+            )
+        )
+
+    def _filter_tracks(self, query, track_filter: Tuple[str, str]):
+        if track_filter is None:
+            return query
+        field, key = track_filter
+        if field == 'artist':
+            return query.join(Artist, Artist._Artist__artist_id == Track._Track__artist_id) \
+                .filter(Artist._Artist__full_name == key)
+        elif field == 'album':
+            return query.join(Album, Album._Album__album_id == Track._Track__album_id) \
+                .filter(Album._Album__title == key)
+        elif field == 'genre':
+            # -- tracks of every genre with this name, not only the last one found
+            matching_track_ids = select(track_genres_table.c.track_id) \
+                .join(genres_table, genres_table.c.genre_id == track_genres_table.c.genre_id) \
+                .where(genres_table.c.name == key)
+            return query.filter(Track._Track__track_id.in_(matching_track_ids))
+        raise RepositoryException(f'Unknown track filter {field}')
 
+    def get_tracks_by_album(self, album_name: str):
+        return self._filter_tracks(self._tracks_query(), ('album', album_name)) \
+            .order_by(Track._Track__track_id) \
+            .all()
 
     def get_tracks_by_artist(self, artist_name: str):
-        matching_tracks = []
-        matching_artist = self._session_cm.session.query(Artist).filter(Artist._Artist__full_name == artist_name).all()
-
-        for artist in matching_artist:
-            matching_artist_id = artist.artist_id
-            tracks = self._session_cm.session.query(Track).filter(Track._Track__artist_id == matching_artist_id).all()
-            for track in tracks:
-                matching_tracks.append(track)
-        return matching_tracks
-
-
-
-
-
+        return self._filter_tracks(self._tracks_query(), ('artist', artist_name)) \
+            .order_by(Track._Track__track_id) \
+            .all()
 
     def get_tracks_by_genre(self, genre_name: str):
-        tracks_ids = []
-        matching_genre = self._session_cm.session.query(Genre).filter(Genre._Genre__name == genre_name).all()
-        for genre in matching_genre:
-            genre_id = genre.genre_id
-            tracks_ids = self._session_cm.session.execute(
-                'SELECT track_id FROM track_genres WHERE genre_id = :genre_id ORDER BY track_id ASC',
-                {'genre_id': genre_id}
-            ).fetchall()
-            tracks_ids = [id[0] for id in tracks_ids]
-
-        matching_tracks = []
-        for i in range(len(tracks_ids)):
-            track = self.get_track(tracks_ids[i])
-            matching_tracks.append(track)
-
-
-        return matching_tracks
-
+        return self._filter_tracks(self._tracks_query(), ('genre', genre_name)) \
+            .order_by(Track._Track__track_id) \
+            .all()
+
+    def get_tracks_page(self, after_id: int = None, limit: int = 20, track_filter: Tuple[str, str] = None,
+                        before_id: int = None, from_end: bool = False) -> List[Track]:
+        # Keyset pagination: the primary key index is seeked to the page boundary, so no earlier rows are read.
+        query = self._filter_tracks(self._tracks_query(), track_filter)
+        if before_id is not None or from_end:
+            if before_id is not None:
+                query = query.filter(Track._Track__track_id < before_id)
+            tracks = query.order_by(desc(Track._Track__track_id)).limit(limit).all()
+            tracks.reverse()
+            return tracks
+
+        if after_id is not None:
+            query = query.filter(Track._Track__track_id > after_id)
+        return query.order_by(asc(Track._Track__track_id)).limit(limit).all()
+
+    def count_tracks(self, track_filter: Tuple[str, str] = None) -> int:
+        query = self._session_cm.session.query(func.count(Track._Track__track_id)).select_from(Track)
+        return self._filter_tracks(query, track_filter).scalar()
+
+
+    def search_tracks(self, query: str, limit: int = 20, offset: int = 0) -> List[Track]:
+        terms = tokenize(query)
+        if len(terms) == 0:
+            return []
+        # Every term must match, as the start of a word; bm25 ranks matches in the title above the other columns.
+        match = ' '.join(f'"{term}"*' for term in terms)
+        search_table = literal_column(tracks_search_table.name)
+        rank = func.bm25(search_table, *SEARCH_COLUMN_WEIGHTS)
+        ranked = select(tracks_search_table.c.rowid.label('track_id'), rank.label('rank')) \
+            .where(search_table.op('MATCH')(match)) \
+            .order_by(rank, tracks_search_table.c.rowid) \
+            .limit(limit).offset(offset) \
+            .subquery()
+        return self._tracks_query() \
+            .join(ranked, ranked.c.track_id == Track._Track__track_id) \
+            .order_by(ranked.c.rank, Track._Track__track_id) \
+            .all()
+
+    def complete_names(self, kind: str, prefix: str, limit: int = 10) -> List[str]:
+        if kind not in COMPLETION_KINDS:
+            raise RepositoryException(f'Unknown completion kind {kind}')
+        # -- an index is replaced rather than changed, so the threads sharing it need no lock
+        version = self._completions_version(kind)
+        loaded_version, completions = self.__completions.get(kind, (None, None))
+        if loaded_version != version:
+            completions = self._load_completions(kind)
+            self.__completions[kind] = (version, completions)
+        return completions.complete(prefix, limit)
+
+    def _completions_version(self, kind: str) -> tuple:
+        # One query for the number of rows of each table of the kind, their highest id and the total of the column
+        # telling which name a row counts for. Any insert or delete changes the count or the highest id, but for a
+        # delete of the row with the highest id followed by an insert taking its id, which the total tells unless
+        # the new row counts for the same name as the old one did, leaving every popularity as it was.
+        values = []
+        for table, column in COMPLETION_TABLES[kind]:
+            primary_key = table.primary_key.columns.values()[0]
+            for aggregate in (func.count(), func.max(primary_key), func.total(column)):
+                values.append(select(aggregate).select_from(table).scalar_subquery())
+        return tuple(self._session_cm.session.execute(select(*values)).one())
+
+    def _load_completions(self, kind: str) -> PrefixIndex:
+        # One aggregate query reads every name of the kind with its popularity; names shared by several rows (e.g.
+        # two artists with the same name) add up.
+        if kind == 'artist':
+            query = select(artists_table.c.full_name, func.count(tracks_table.c.id)) \
+                .outerjoin(tracks_table, tracks_table.c.artist == artists_table.c.artist_id) \
+                .group_by(artists_table.c.artist_id)
+        elif kind == 'album':
+            query = select(albums_table.c.title, func.count(tracks_table.c.id)) \
+                .outerjoin(tracks_table, tracks_table.c.album == albums_table.c.album_id) \
+                .group_by(albums_table.c.album_id)
+        elif kind == 'genre':
+            query = select(genres_table.c.name, func.count(track_genres_table.c.id)) \
+                .outerjoin(track_genres_table, track_genres_table.c.genre_id == genres_table.c.genre_id) \
+                .group_by(genres_table.c.genre_id)
+        else:
+            query = select(users_table.c.user_name, func.count(playlist_liked_by_table.c.id)) \
+                .outerjoin(playlists_table, playlists_table.c.user_id == users_table.c.id) \
+                .outerjoin(playlist_liked_by_table, playlist_liked_by_table.c.playlist_id == playlists_table.c.id) \
+                .group_by(users_table.c.id)
+        return PrefixIndex(self._session_cm.session.execute(query))
+
+    def _forget_catalogue_indexes(self):
+        # -- the catalogue completions, the recommender, the track features and facets and the leaderboards are
+        # -- reloaded on next use, as the catalogue changes rarely but in bulk
+        for kind in ('artist', 'album', 'genre'):
+            self.__completions.pop(kind, None)
+        self.__recommender = None
+        self.__track_features = None
+        self.__track_facets = None
+        self.__leaderboards = None
+
+    def get_recommendations(self, user_name: str, limit: int = 3) -> List[Track]:
+        # -- only the user's id is read, as loading the User would load every track of their playlists
+        user_id = self._session_cm.session.execute(
+            select(users_table.c.id).where(users_table.c.user_name == user_name)).scalar()
+        if user_id is None:
+            return []
+        track_ids = self._recommender().recommend(user_id, limit)
+        if len(track_ids) == 0:
+            return []
+        tracks = self._tracks_query().filter(Track._Track__track_id.in_(track_ids)).all()
+        tracks_by_id = {track.track_id: track for track in tracks}
+        return [tracks_by_id[track_id] for track_id in track_ids if track_id in tracks_by_id]
+
+    def _recommender(self) -> Recommender:
+        # -- the likes may have been changed by any process sharing the database, and each like or unlike changes the
+        # -- track's counts_version, so the likes of the tracks whose counts_version is above the one last seen are
+        # -- read again, as the leaderboards' counts are
+        with self.__recommender_lock:
+            if self.__recommender is None:
+                self.__recommender, self.__recommender_version = self._load_recommender()
+                return self.__recommender
+            changed = select(tracks_table.c.id, tracks_table.c.counts_version) \
+                .where(tracks_table.c.counts_version > self.__recommender_version)
+            versions = {track_id: counts_version
+                        for track_id, counts_version in self._session_cm.session.execute(changed)}
+            if len(versions) > 0:
+                likes = self._favourites().where(playlist_tracks_table.c.track_id.in_(versions))
+                self.__recommender.set_likes(versions, [(user_id, track_id) for user_id, track_id
+                                                        in self._session_cm.session.execute(likes)])
+                self.__recommender_version = max(self.__recommender_version, *versions.values())
+            return self.__recommender
+
+    def _favourites(self):
+        # -- a user's favourites are their playlists other than the first (see _playlist_id), read in the order the
+        # -- tracks were liked
+        first_playlists = select(func.min(playlists_table.c.id)).group_by(playlists_table.c.user_id)
+        return select(playlists_table.c.user_id, playlist_tracks_table.c.track_id) \
+            .join(playlist_tracks_table, playlist_tracks_table.c.playlist_id == playlists_table.c.id) \
+            .where(playlists_table.c.id.not_in(first_playlists)) \
+            .order_by(playlist_tracks_table.c.id)
+
+    def _load_recommender(self) -> Tuple[Recommender, int]:
+        session = self._session_cm.session
+        # -- read before the likes, so a like made meanwhile is read again on next use rather than missed
+        version = session.execute(select(func.max(tracks_table.c.counts_version))).scalar() or 0
+        pools = dict()
+        artist_names = select(tracks_table.c.id, artists_table.c.full_name) \
+            .join(artists_table, artists_table.c.artist_id == tracks_table.c.artist)
+        genre_names = select(track_genres_table.c.track_id, genres_table.c.name) \
+            .join(genres_table, genres_table.c.genre_id == track_genres_table.c.genre_id) \
+            .order_by(track_genres_table.c.id)
+        for track_id, artist_name in session.execute(artist_names):
+            pools.setdefault(track_id, []).append(('artist', artist_name))
+        for track_id, genre_name in session.execute(genre_names):
+            pools.setdefault(track_id, []).append(('genre', genre_name))
+
+        recommender = Recommender()
+        for track_id in sorted(pools):
+            recommender.add_track(track_id, pools[track_id])
+        for user_id, track_id in session.execute(self._favourites()):
+            recommender.like(user_id, track_id)
+        return recommender, version
+
+    def get_similar_tracks(self, track_ids: List[int], k: int = 5) -> List[List[Track]]:
+        if self.__track_features is None:
+            self.__track_features = self._load_track_features()
+        similar_ids = self.__track_features.similar(track_ids, k)
+        wanted_ids = {track_id for track_ids in similar_ids for track_id in track_ids}
+        tracks_by_id = dict()
+        if len(wanted_ids) > 0:
+            tracks = self._tracks_query().filter(Track._Track__track_id.in_(wanted_ids)).all()
+            tracks_by_id = {track.track_id: track for track in tracks}
+        return [[tracks_by_id[track_id] for track_id in track_ids if track_id in tracks_by_id]
+                for track_ids in similar_ids]
+
+    def _load_track_features(self) -> TrackFeatures:
+        return TrackFeatures(self._feature_rows())
+
+    def _feature_rows(self) -> List[FeatureRow]:
+        # -- read with two Core queries rather than as Track objects, as every track of the catalogue is read
+        session = self._session_cm.session
+        genre_ids = dict()
+        for track_id, genre_id in session.execute(select(track_genres_table.c.track_id, track_genres_table.c.genre_id)):
+            genre_ids.setdefault(track_id, []).append(genre_id)
+        tracks = select(tracks_table.c.id, tracks_table.c.artist, albums_table.c.album_type,
+                        albums_table.c.release_year, tracks_table.c.track_duration) \
+            .outerjoin(albums_table, albums_table.c.album_id == tracks_table.c.album)
+        return [(track_id, artist_id, album_type, release_year, duration, genre_ids.get(track_id, []))
+                for track_id, artist_id, album_type, release_year, duration in session.execute(tracks)]
+
+    def browse_tracks(self, filters: Dict[str, object], limit: int = 20, offset: int = 0) \
+            -> Tuple[List[Track], int, Dict[str, List[tuple]]]:
+        for facet in filters:
+            if facet not in FACETS:
+                raise RepositoryException(f'Unknown facet {facet}')
+        if self.__track_facets is None:
+            self.__track_facets = self._load_track_facets()
+        track_ids, total, counts = self.__track_facets.browse(filters, limit, offset)
+        tracks_by_id = dict()
+        if len(track_ids) > 0:
+            tracks = self._tracks_query().filter(Track._Track__track_id.in_(track_ids)).all()
+            tracks_by_id = {track.track_id: track for track in tracks}
+        return [tracks_by_id[track_id] for track_id in track_ids if track_id in tracks_by_id], total, counts
+
+    def _load_track_facets(self) -> TrackFacets:
+        genre_names = {genre_id: name for genre_id, name
+                       in self._session_cm.session.execute(select(genres_table.c.genre_id, genres_table.c.name))}
+        return TrackFacets(self._feature_rows(), genre_names)
+
+    def get_leaderboard(self, metric: str, scope: Tuple[str, int] = None, k: int = 10) -> List[Tuple[Track, int]]:
+        if metric not in LEADERBOARD_METRICS or (scope is not None and scope[0] not in LEADERBOARD_SCOPES):
+            raise RepositoryException(f'Unknown leaderboard {metric} {scope}')
+        ranking = self._leaderboards().top(metric, scope, k)
+        if len(ranking) == 0:
+            return []
+        tracks = self._tracks_query().filter(Track._Track__track_id.in_([track_id for track_id, _ in ranking])).all()
+        tracks_by_id = {track.track_id: track for track in tracks}
+        return [(tracks_by_id[track_id], count) for track_id, count in ranking if track_id in tracks_by_id]
+
+    def _leaderboards(self) -> Leaderboards:
+        # -- the counts may have been changed by any process sharing the database, so the tracks whose counts_version
+        # -- is above the one last seen are read again (through its index, usually finding none) before ranking
+        with self.__leaderboards_lock:
+            if self.__leaderboards is None:
+                self.__leaderboards, self.__leaderboards_version = self._load_leaderboards()
+                return self.__leaderboards
+            count_columns = [tracks_table.c[f'track_{metric}'] for metric in LEADERBOARD_METRICS]
+            changed = select(tracks_table.c.id, tracks_table.c.counts_version, *count_columns) \
+                .where(tracks_table.c.counts_version > self.__leaderboards_version)
+            for track_id, counts_version, *counts in self._session_cm.session.execute(changed):
+                self.__leaderboards.set_counts(track_id, dict(zip(LEADERBOARD_METRICS, counts)))
+                self.__leaderboards_version = max(self.__leaderboards_version, counts_version)
+            return self.__leaderboards
+
+    def _load_leaderboards(self) -> Tuple[Leaderboards, int]:
+        # -- read with two Core queries, like the track features
+        session = self._session_cm.session
+        scopes = dict()
+        for track_id, genre_id in session.execute(select(track_genres_table.c.track_id, track_genres_table.c.genre_id)):
+            scopes.setdefault(track_id, []).append(('genre', genre_id))
+        count_columns = [tracks_table.c[f'track_{metric}'] for metric in LEADERBOARD_METRICS]
+        tracks = select(tracks_table.c.id, tracks_table.c.artist, albums_table.c.release_year,
+                        tracks_table.c.counts_version, *count_columns) \
+            .outerjoin(albums_table, albums_table.c.album_id == tracks_table.c.album)
+
+        leaderboards = Leaderboards(LEADERBOARD_METRICS)
+        version = 0
+        for track_id, artist_id, release_year, counts_version, *counts in session.execute(tracks):
+            track_scopes = scopes.get(track_id, [])
+            if artist_id is not None:
+                track_scopes.append(('artist', artist_id))
+            if release_year is not None:
+                track_scopes.append(('year', release_year))
+            leaderboards.add_track(track_id, dict(zip(LEADERBOARD_METRICS, counts)), track_scopes)
+            version = max(version, counts_version)
+        return leaderboards, version
 
     def add_genre(self, genre: Genre):
         with self._session_cm as scm:
             scm.session.add(genre)
             scm.commit()
+        self._forget_catalogue_indexes()
 
     def get_genre(self, id: int) -> Genre:
         genre = None
@@ -197,6 +541,130 @@ class SqlAlchemyRepository(AbstractRepository):
         return genre
 
 
+    def bulk_load(self, albums: Iterable[Album], artists: Iterable[Artist], tracks: Iterable[Track],
+                  genres: Iterable[Genre]):
+        with self._session_cm as scm:
+            session = scm.session
+            # -- one query per table for what is already stored, instead of one per entity
+            albums_by_id = {album.album_id: album for album in session.query(Album)}
+            artists_by_id = {artist.artist_id: artist for artist in session.query(Artist)}
+            genres_by_id = {genre.genre_id: genre for genre in session.query(Genre)}
+            track_ids = {track_id for (track_id,) in session.query(Track._Track__track_id)}
+
+            new_entities = []
+            for album in albums:
+                if albums_by_id.setdefault(album.album_id, album) is album:
+                    new_entities.append(album)
+            for artist in artists:
+                if artists_by_id.setdefault(artist.artist_id, artist) is artist:
+                    new_entities.append(artist)
+            for genre in genres:
+                if genres_by_id.setdefault(genre.genre_id, genre) is genre:
+                    new_entities.append(genre)
+
+            for track in tracks:
+                if track.track_id in track_ids:
+                    continue
+                track_ids.add(track.track_id)
+                # Point the track at the single instance kept for each related entity, otherwise the session
+                # would try to insert equal-but-distinct copies of the same row.
+                if track.artist is not None:
+                    track.artist = artists_by_id.setdefault(track.artist.artist_id, track.artist)
+                if track.album is not None:
+                    track.album = albums_by_id.setdefault(track.album.album_id, track.album)
+                track.genres[:] = [genres_by_id.setdefault(genre.genre_id, genre) for genre in track.genres]
+                new_entities.append(track)
+
+            session.add_all(new_entities)
+            session.flush()
+            index_tracks_for_search(session)
+            scm.commit()
+        self._forget_catalogue_indexes()
+        # -- the feature matrix is built now rather than by the first request for similar tracks
+        self.__track_features = self._load_track_features()
+
+    def bulk_insert(self, albums: Iterable[Album], artists: Iterable[Artist], tracks: Iterable[Track],
+                    genres: Iterable[Genre]):
+        # Fast ingest path for populating the database: rows are written with Core executemany inserts inside a
+        # single transaction, bypassing the ORM unit of work. Ids that are already stored are skipped. tracks may be
+        # a generator; its rows are inserted every INGEST_CHUNK_SIZE tracks, so they are never all held at once.
+        with self._session_cm as scm:
+            session = scm.session
+            album_ids = set(session.execute(select(albums_table.c.album_id)).scalars())
+            artist_ids = set(session.execute(select(artists_table.c.artist_id)).scalars())
+            genre_ids = set(session.execute(select(genres_table.c.genre_id)).scalars())
+            track_ids = set(session.execute(select(tracks_table.c.id)).scalars())
+
+            album_rows, artist_rows, genre_rows, track_rows, track_genre_rows = [], [], [], [], []
+
+            def add_album_row(album: Album):
+                if album.album_id not in album_ids:
+                    album_ids.add(album.album_id)
+                    album_rows.append({'album_id': album.album_id, 'title': album.title,
+                                       'album_url': album.album_url, 'album_type': album.album_type,
+                                       'release_year': album.release_year})
+
+            def add_artist_row(artist: Artist):
+                if artist.artist_id not in artist_ids:
+                    artist_ids.add(artist.artist_id)
+                    artist_rows.append({'artist_id': artist.artist_id, 'full_name': artist.full_name})
+
+            def add_genre_row(genre: Genre):
+                if genre.genre_id not in genre_ids:
+                    genre_ids.add(genre.genre_id)
+                    genre_rows.append({'genre_id': genre.genre_id, 'name': genre.name})
+
+            related = dict()
+
+            def insert_rows():
+                # -- referenced rows first; the lists are emptied for the next chunk
+                for table, rows in ((albums_table, album_rows), (artists_table, artist_rows),
+                                    (genres_table, genre_rows), (tracks_table, track_rows),
+                                    (track_genres_table, track_genre_rows)):
+                    if len(rows) > 0:
+                        session.execute(table.insert(), rows)
+                        rows.clear()
+                _forget_backref_tracks(related.values())
+                related.clear()
+
+            for album in albums:
+                add_album_row(album)
+            for artist in artists:
+                add_artist_row(artist)
+            for genre in genres:
+                add_genre_row(genre)
+
+            for track in tracks:
+                if track.track_id in track_ids:
+                    continue
+                track_ids.add(track.track_id)
+                # -- related entities missing from the given collections are still written, as the ORM cascade would
+                if track.artist is not None:
+                    add_artist_row(track.artist)
+                if track.album is not None:
+                    add_album_row(track.album)
+                for entity in (track.artist, track.album, *track.genres):
+                    if entity is not None:
+                        related[id(entity)] = entity
+                track_rows.append({'id': track.track_id, 'title': track.title,
+                                   'artist': track.artist.artist_id if track.artist is not None else None,
+                                   'album': track.album.album_id if track.album is not None else None,
+                                   'track_url': track.track_url, 'track_duration': track.track_duration,
+                                   'track_listens': track.track_listens, 'track_favorites': track.track_favorites,
+                                   'track_interest': track.track_interest})
+                for genre in track.genres:
+                    add_genre_row(genre)
+                    track_genre_rows.append({'track_id': track.track_id, 'genre_id': genre.genre_id})
+                if len(track_rows) >= INGEST_CHUNK_SIZE:
+                    insert_rows()
+
+            insert_rows()
+            index_tracks_for_search(session)
+            scm.commit()
+        self._forget_catalogue_indexes()
+        # -- as bulk_load does
+        self.__track_features = self._load_track_features()
+
     def add_review(self, review: Review, user: User):
         super().add_review(review, user)
         matching_user = self._session_cm.session.query(User).filter(User._User__user_name == user.user_name).one()
@@ -204,12 +672,47 @@ class SqlAlchemyRepository(AbstractRepository):
 
         with self._session_cm as scm:
             scm.session.merge(review)
+            # -- the track's rating summary changes in the same transaction as its reviews
+            self._count_rating(scm.session, review.track.track_id, review.rating)
             scm.commit()
 
+    def _count_rating(self, session, track_id: int, rating: int):
+        rating_column = track_ratings_table.c[f'rating_{rating}']
+        counted = session.execute(track_ratings_table.update()
+                                  .where(track_ratings_table.c.track_id == track_id)
+                                  .values({track_ratings_table.c.rating_count: track_ratings_table.c.rating_count + 1,
+                                           track_ratings_table.c.rating_total:
+                                               track_ratings_table.c.rating_total + rating,
+                                           rating_column: rating_column + 1}))
+        if counted.rowcount == 0:
+            session.execute(track_ratings_table.insert().values(
+                {'track_id': track_id, 'rating_count': 1, 'rating_total': rating, rating_column.name: 1}))
+
     def get_reviews(self):
         comments = self._session_cm.session.query(Review).all()
         return comments
 
+    def get_reviews_for_track(self, track_id: int) -> List[Tuple[Review, User]]:
+        rows = self._session_cm.session.query(Review, User) \
+            .outerjoin(User, User._User__user_id == Review._Review__user_id) \
+            .filter(reviews_table.c.track_id == track_id) \
+            .order_by(reviews_table.c.id) \
+            .all()
+        return [(review, user) for review, user in rows]
+
+    def get_rating_summary(self, track_ids: Iterable[int]) -> Dict[int, RatingSummary]:
+        track_ids = list(dict.fromkeys(track_ids))
+        summaries = {track_id: RatingSummary() for track_id in track_ids}
+        if len(track_ids) == 0:
+            return summaries
+        histogram_columns = [track_ratings_table.c[f'rating_{rating}'] for rating in range(1, 6)]
+        rows = self._session_cm.session.execute(
+            select(track_ratings_table.c.track_id, *histogram_columns)
+            .where(track_ratings_table.c.track_id.in_(track_ids)))
+        for track_id, *histogram in rows:
+            summaries[track_id] = RatingSummary(histogram)
+        return summaries
+
 
     def add_user(self, user: User):
         with self._session_cm as scm:
@@ -219,7 +722,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user(self, user_name:str) -> User:
         user = None
         try:
-            user = self._session_cm.session.query(User).filter(User._User__user_name == user_name).one()
+            user = self._users_query().filter(User._User__user_name == user_name).one()
         except NoResultFound:
             # Ignore any exception and return None.
             #user = "result not found"
@@ -236,7 +739,7 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_user_by_id(self, user_id: int) -> User:
         user = None
         try:
-            user = self._session_cm.session.query(User).filter(User._User__user_id == user_id).one()
+            user = self._users_query().filter(User._User__user_id == user_id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
@@ -244,72 +747,72 @@ class SqlAlchemyRepository(AbstractRepository):
         return user
 
 
-    def add_to_playlist(self, track: Track, current_user: User):
-        user = None
-        result = False
-        try:
-            user = self._session_cm.session.query(User).filter(User._User__user_id == current_user.user_id).one()
-        except NoResultFound:
-            # Ignore any exception and return None.
-            pass
-        if user != None:
-            playlist = user.playlist
-            result = playlist.add_track(track)
-            with self._session_cm as scm:
-                scm.session.merge(playlist)
-                scm.commit()
-        return result
+    def _playlist_id(self, user: User, position: int):
+        # -- a user's playlist is their first playlists row and their favourites the second (see User.__init__)
+        return select(playlists_table.c.id) \
+            .where(playlists_table.c.user_id == _primary_key(user)) \
+            .order_by(playlists_table.c.id) \
+            .limit(1).offset(position) \
+            .scalar_subquery()
+
+    def _add_playlist_track(self, track: Track, current_user: User, position: int, metric: str) -> bool:
+        # A single INSERT ... SELECT of the new row; the unique index on (playlist_id, track_id) rejects duplicates,
+        # so the tracks already in the playlist are never loaded. The track's count of metric goes up with it.
+        if not isinstance(track, Track) or current_user is None:
+            return False
+        insert = playlist_tracks_table.insert().from_select(
+            ['playlist_id', 'track_id'],
+            select(self._playlist_id(current_user, position), literal(_primary_key(track)))
+            .where(self._playlist_id(current_user, position).is_not(None))
+        )
+        with self._session_cm as scm:
+            if inspect(track).transient:
+                # -- a track that was never stored is saved with its playlist entry, as merging the playlist did
+                scm.session.merge(track)
+                scm.session.flush()
+            try:
+                added = scm.session.execute(insert).rowcount > 0
+            except IntegrityError:
+                return False
+            if added:
+                self._count(scm.session, _primary_key(track), metric, 1)
+            scm.commit()
+        return added
+
+    def _remove_playlist_track(self, track: Track, current_user: User, position: int, metric: str) -> bool:
+        if not isinstance(track, Track) or current_user is None:
+            return False
+        delete = playlist_tracks_table.delete() \
+            .where(playlist_tracks_table.c.playlist_id == self._playlist_id(current_user, position)) \
+            .where(playlist_tracks_table.c.track_id == _primary_key(track))
+        with self._session_cm as scm:
+            removed = scm.session.execute(delete).rowcount > 0
+            if removed:
+                self._count(scm.session, _primary_key(track), metric, -1)
+            scm.commit()
+        return removed
+
+    def _count(self, session, track_id: int, metric: str, change: int):
+        # -- the stored count changes in the caller's transaction, and never goes below 0. The new counts_version is
+        # -- above every other, as writers to the database take turns, so every process's leaderboards pick it up
+        count_column = tracks_table.c[f'track_{metric}']
+        latest_version = select(func.max(tracks_table.c.counts_version)).scalar_subquery()
+        session.execute(tracks_table.update()
+                        .where(tracks_table.c.id == track_id)
+                        .values({count_column: case((count_column + change > 0, count_column + change), else_=0),
+                                 tracks_table.c.counts_version: latest_version + 1}))
 
+    def add_to_playlist(self, track: Track, current_user: User):
+        return self._add_playlist_track(track, current_user, 0, 'interest')
 
     def remove_from_playlist(self, track: Track, current_user: User):
-        user = None
-        result = False
-        try:
-            user = self._session_cm.session.query(User).filter(User._User__user_id == current_user.user_id).one()
-        except NoResultFound:
-            pass
-        if user != None:
-            playlist = user.playlist
-            result = playlist.remove_track(track)
-            with self._session_cm as scm:
-                #scm.session.query(User).filter(User.name == "squidward").delete(synchronize_session="fetch")
-                scm.session.merge(playlist)
-                scm.commit()
-        return result
-
+        return self._remove_playlist_track(track, current_user, 0, 'interest')
 
     def add_to_favourite(self, track, current_user: User):
-        user = None
-        result = False
-        try:
-            user = self._session_cm.session.query(User).filter(User._User__user_id == current_user.user_id).one()
-        except NoResultFound:
-            # Ignore any exception and return None.
-            pass
-        if user != None:
-            #playlist = user.liked_playlist
-            result = user.add_liked_track(track)
-            with self._session_cm as scm:
-                scm.session.merge(user.liked_playlist)
-                scm.commit()
-        return result
-
+        return self._add_playlist_track(track, current_user, 1, 'favorites')
 
     def remove_liked_track(self, track, current_user: User):
-        user = None
-        result = False
-        try:
-            user = self._session_cm.session.query(User).filter(User._User__user_id == current_user.user_id).one()
-        except NoResultFound:
-            pass
-        if user != None:
-            #playlist = user.liked_playlist
-            result = user.remove_liked_track(track)
-            with self._session_cm as scm:
-                # scm.session.query(User).filter(User.name == "squidward").delete(synchronize_session="fetch")
-                scm.session.merge(user.liked_playlist)
-                scm.commit()
-        return result
+        return self._remove_playlist_track(track, current_user, 1, 'favorites')
 
     def like_playlist(self, friend: User, user_who_likes: User):
 
@@ -0,0 +1,132 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from music.adapters.similarity import FeatureRow
+
+# The facets tracks are browsed by; a filter on each is a genre id, a decade (e.g. 1990), a release year, an album
+# type or a (shortest, longest) duration range in seconds, with either end None for open
+FACETS = ('genre', 'decade', 'year', 'album_type', 'duration')
+
+# The duration ranges counted for the duration facet, in seconds
+DURATION_BUCKETS = ((0, 120), (120, 240), (240, 360), (360, 600), (600, None))
+
+# (value, label, number of tracks) of one facet value
+FacetCount = Tuple[object, str, int]
+
+
+class TrackFacets:
+    """ Filters tracks by any combination of FACETS and counts the tracks of every facet value, for faceted browsing.
+    Each facet is a column with a code per track (the genres, of which a track may have many, are kept as the sorted
+    positions of the tracks of each genre instead), so a filter is a boolean mask over all tracks, combining filters is
+    a logical and of masks and counting is one np.bincount per facet.
+    The counts of a facet are of the tracks matching the filters on the other facets, so they tell how many tracks
+    each of its values would leave.
+    """
+
+    def __init__(self, rows: Iterable[FeatureRow], genre_names: Dict[int, str]):
+        rows = sorted(rows, key=lambda row: row[0])
+        self.__track_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        track_count = len(rows)
+
+        # -- single valued facets: a code per track (-1 when missing) and the value of each code
+        years = [row[3] for row in rows]
+        self.__values = {
+            'year': sorted({year for year in years if year is not None}),
+            'decade': sorted({year // 10 * 10 for year in years if year is not None}),
+            'album_type': sorted({row[2] for row in rows if row[2]}),
+            'duration': list(DURATION_BUCKETS),
+        }
+        self.__codes = {
+            'year': self.__encode('year', years),
+            'decade': self.__encode('decade', [None if year is None else year // 10 * 10 for year in years]),
+            'album_type': self.__encode('album_type', [row[2] or None for row in rows]),
+        }
+        self.__durations = np.array([-1 if row[4] is None else row[4] for row in rows], dtype=np.int64)
+        edges = np.array([start for start, _ in DURATION_BUCKETS], dtype=np.int64)
+        self.__codes['duration'] = np.where(self.__durations >= 0,
+                                            np.searchsorted(edges, self.__durations, side='right') - 1, -1)
+
+        # -- the genres: (track position, genre code) pairs sorted by genre, so the tracks of a genre are a slice
+        self.__genre_ids = sorted({genre_id for row in rows for genre_id in row[5]})
+        genre_codes = {genre_id: code for code, genre_id in enumerate(self.__genre_ids)}
+        self.__genre_labels = [genre_names.get(genre_id, str(genre_id)) for genre_id in self.__genre_ids]
+        pairs = [(genre_codes[genre_id], position)
+                 for position, row in enumerate(rows) for genre_id in dict.fromkeys(row[5])]
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+        self.__pair_genres = pairs[order, 0]
+        self.__pair_positions = pairs[order, 1]
+        self.__genre_starts = np.searchsorted(self.__pair_genres, np.arange(len(self.__genre_ids) + 1))
+        self.__track_count = track_count
+
+    def __len__(self):
+        return self.__track_count
+
+    def browse(self, filters: Dict[str, object], limit: int, offset: int = 0) \
+            -> Tuple[List[int], int, Dict[str, List[FacetCount]]]:
+        """ Returns the ids of up to limit tracks matching every filter (in track id order, after skipping offset of
+        them), the number of tracks matching and the counts of every facet value that any track would match.
+        A filter of None is no filter; a filter on an unknown value matches no tracks.
+        """
+        masks = {facet: self.__mask(facet, value) for facet, value in filters.items() if value is not None}
+        matching = self.__combine(masks.values())
+        positions = np.flatnonzero(matching) if matching is not None else np.arange(self.__track_count)
+        track_ids = self.__track_ids[positions[offset:offset + limit]].tolist()
+
+        counts = dict()
+        for facet in FACETS:
+            others = self.__combine(mask for other, mask in masks.items() if other != facet)
+            counts[facet] = self.__count(facet, others)
+        return track_ids, len(positions), counts
+
+    def __encode(self, facet: str, values: List[Optional[object]]) -> np.ndarray:
+        codes = {value: code for code, value in enumerate(self.__values[facet])}
+        return np.array([codes.get(value, -1) for value in values], dtype=np.int64)
+
+    def __mask(self, facet: str, value) -> np.ndarray:
+        if facet == 'genre':
+            mask = np.zeros(self.__track_count, dtype=bool)
+            code = np.searchsorted(self.__genre_ids, value)
+            if code < len(self.__genre_ids) and self.__genre_ids[code] == value:
+                mask[self.__pair_positions[self.__genre_starts[code]:self.__genre_starts[code + 1]]] = True
+            return mask
+        if facet == 'duration':
+            shortest, longest = value
+            mask = self.__durations >= (shortest or 0)
+            if longest is not None:
+                mask &= self.__durations < longest
+            return mask
+        if value not in self.__values[facet]:
+            return np.zeros(self.__track_count, dtype=bool)
+        return self.__codes[facet] == self.__values[facet].index(value)
+
+    @staticmethod
+    def __combine(masks: Iterable[np.ndarray]) -> Optional[np.ndarray]:
+        combined = None
+        for mask in masks:
+            combined = mask.copy() if combined is None else np.logical_and(combined, mask, out=combined)
+        return combined
+
+    def __count(self, facet: str, mask: Optional[np.ndarray]) -> List[FacetCount]:
+        if facet == 'genre':
+            pair_genres = self.__pair_genres if mask is None else self.__pair_genres[mask[self.__pair_positions]]
+            counts = np.bincount(pair_genres, minlength=len(self.__genre_ids))
+            # -- most tracks first, as there are many genres
+            return sorted(((self.__genre_ids[code], self.__genre_labels[code], int(count))
+                           for code, count in enumerate(counts) if count > 0), key=lambda item: (-item[2], item[1]))
+        codes = self.__codes[facet] if mask is None else self.__codes[facet][mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.__values[facet]))
+        return [(value, _label(facet, value), int(count))
+                for value, count in zip(self.__values[facet], counts) if count > 0]
+
+
+def _label(facet: str, value) -> str:
+    if facet == 'decade':
+        return f'{value}s'
+    if facet == 'duration':
+        shortest, longest = value
+        if longest is None:
+            return f'{shortest // 60}+ min'
+        return f'{shortest // 60}-{longest // 60} min'
+    return str(value)
@@ -0,0 +1,185 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# The most tracks a leaderboard keeps ranked, and so the most it can show
+LEADERBOARD_DEPTH = 50
+
+# (-count, track id): the order of a leaderboard, highest count first and ties by track id
+BoardKey = Tuple[int, int]
+
+
+class _Board:
+    """ The best ranked tracks of one leaderboard, plus a bound on the rank of every track left off it.
+    Every entry ranks above the bound, so the entries are always the true top of the leaderboard; a board with no
+    bound holds every track it ranks.
+    """
+    __slots__ = ('entries', 'bound')
+
+    def __init__(self, entries: List[BoardKey], bound: BoardKey = None):
+        self.entries = entries
+        self.bound = bound
+
+    def covers(self, k: int) -> bool:
+        return len(self.entries) >= k or self.bound is None
+
+    def move(self, old_key: BoardKey, new_key: BoardKey):
+        """ Re-ranks a track whose key changed from old_key (None for a track new to the board) to new_key. """
+        if old_key is not None:
+            index = bisect_left(self.entries, old_key)
+            if index < len(self.entries) and self.entries[index] == old_key:
+                del self.entries[index]
+                # -- a track that falls below the bound is left off, as the bound already ranks above it
+                if self.bound is None or new_key < self.bound:
+                    self.__insert(new_key)
+                return
+        if self.bound is None or (len(self.entries) > 0 and new_key < self.entries[-1]):
+            self.__insert(new_key)
+        else:
+            self.bound = min(self.bound, new_key)
+
+    def remove(self, key: BoardKey):
+        index = bisect_left(self.entries, key)
+        if index < len(self.entries) and self.entries[index] == key:
+            del self.entries[index]
+
+    def __insert(self, key: BoardKey):
+        insort(self.entries, key)
+        if len(self.entries) > LEADERBOARD_DEPTH:
+            dropped = self.entries.pop()
+            self.bound = dropped if self.bound is None else min(self.bound, dropped)
+
+
+class Leaderboards:
+    """ Ranks tracks by each of a few popularity counts, among all tracks or within a scope such as a genre.
+    The counts are kept in one compact array per metric, indexed by the position of each track. The top
+    LEADERBOARD_DEPTH tracks of a leaderboard are picked the first time it is shown and then kept up to date as counts
+    change, so showing a leaderboard never reads the rest of the catalogue; it is picked again only when enough of
+    its tracks have dropped off it that it can no longer fill the page.
+    Every method holds one lock, as the boards are shared by the threads of the server.
+    """
+
+    def __init__(self, metrics: Sequence[str]):
+        # track id -> position of its counts in the arrays below
+        self.__positions = dict()
+        self.__track_ids = array('q')
+        self.__counts = {metric: array('q') for metric in metrics}
+        # track id -> keys of the scopes the track is ranked in, None (all tracks) first
+        self.__scopes = dict()
+        # scope key -> ids of the tracks in it, and the sorted array of their positions, made when first needed
+        self.__members = {None: set()}
+        self.__member_positions = dict()
+        # (metric, scope key) -> _Board, picked when first shown
+        self.__boards = dict()
+        self.__lock = threading.RLock()
+
+    def __getstate__(self):
+        # -- the lock is not pickled with the memory repository's snapshot; each unpickled copy gets its own
+        state = self.__dict__.copy()
+        del state['_Leaderboards__lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.RLock()
+
+    def add_track(self, track_id: int, counts: Dict[str, int], scope_keys: Iterable[Hashable]):
+        """ Ranks a track with the given counts in all tracks and the given scopes, replacing any ranking it had. """
+        with self.__lock:
+            self.__add_track(track_id, counts, scope_keys)
+
+    def __add_track(self, track_id: int, counts: Dict[str, int], scope_keys: Iterable[Hashable]):
+        if track_id in self.__scopes:
+            self.__remove_track(track_id)
+        position = self.__positions.get(track_id)
+        if position is None:
+            position = self.__positions[track_id] = len(self.__track_ids)
+            self.__track_ids.append(track_id)
+            for metric_counts in self.__counts.values():
+                metric_counts.append(0)
+        for metric, metric_counts in self.__counts.items():
+            metric_counts[position] = counts.get(metric, 0)
+
+        scope_keys = [None] + list(dict.fromkeys(scope_keys))
+        self.__scopes[track_id] = scope_keys
+        for scope_key in scope_keys:
+            self.__members.setdefault(scope_key, set()).add(track_id)
+            self.__member_positions.pop(scope_key, None)
+            if len(self.__boards) > 0:
+                for metric in self.__counts:
+                    board = self.__boards.get((metric, scope_key))
+                    if board is not None:
+                        board.move(None, self.__key(metric, track_id))
+
+    def remove_track(self, track_id: int):
+        with self.__lock:
+            self.__remove_track(track_id)
+
+    def __remove_track(self, track_id: int):
+        for scope_key in self.__scopes.pop(track_id, ()):
+            self.__members[scope_key].discard(track_id)
+            self.__member_positions.pop(scope_key, None)
+            for metric in self.__counts:
+                board = self.__boards.get((metric, scope_key))
+                if board is not None:
+                    board.remove(self.__key(metric, track_id))
+
+    def count(self, track_id: int, metric: str, change: int):
+        """ Changes a count of a ranked track (never below 0) and re-ranks it; unranked tracks are ignored. """
+        with self.__lock:
+            if track_id in self.__scopes:
+                self.__set_count(track_id, metric, self.__counts[metric][self.__positions[track_id]] + change)
+
+    def set_counts(self, track_id: int, counts: Dict[str, int]):
+        """ Replaces the given counts of a ranked track and re-ranks it; unranked tracks are ignored. """
+        with self.__lock:
+            if track_id in self.__scopes:
+                for metric, count in counts.items():
+                    self.__set_count(track_id, metric, count)
+
+    def top(self, metric: str, scope_key: Hashable = None, k: int = 10) -> List[Tuple[int, int]]:
+        """ Returns up to k (at most LEADERBOARD_DEPTH) (track id, count) pairs, highest count first. """
+        k = min(k, LEADERBOARD_DEPTH)
+        with self.__lock:
+            board = self.__boards.get((metric, scope_key))
+            if board is None or not board.covers(k):
+                if scope_key not in self.__members:
+                    return []
+                board = self.__boards[(metric, scope_key)] = self.__pick(metric, scope_key)
+            return [(track_id, -negated_count) for negated_count, track_id in board.entries[:k]]
+
+    def __set_count(self, track_id: int, metric: str, count: int):
+        old_key = self.__key(metric, track_id)
+        self.__counts[metric][self.__positions[track_id]] = max(count, 0)
+        new_key = self.__key(metric, track_id)
+        if new_key == old_key:
+            return
+        for scope_key in self.__scopes[track_id]:
+            board = self.__boards.get((metric, scope_key))
+            if board is not None:
+                board.move(old_key, new_key)
+
+    def __key(self, metric: str, track_id: int) -> BoardKey:
+        return -self.__counts[metric][self.__positions[track_id]], track_id
+
+    def __pick(self, metric: str, scope_key: Hashable) -> _Board:
+        positions = self.__member_positions.get(scope_key)
+        if positions is None:
+            members = self.__members[scope_key]
+            positions = self.__member_positions[scope_key] = np.sort(np.fromiter(
+                map(self.__positions.__getitem__, members), dtype=np.int64, count=len(members)))
+        # -- one more than the board holds, so the best track left off is known. np.partition finds the lowest
+        # -- count that can make it, and only the tracks with at least that count are ranked, with a heap
+        wanted = LEADERBOARD_DEPTH + 1
+        counts = np.array(self.__counts[metric], dtype=np.int64)[positions]
+        if len(counts) > wanted:
+            threshold = np.partition(counts, len(counts) - wanted)[len(counts) - wanted]
+            positions, counts = positions[counts >= threshold], counts[counts >= threshold]
+        track_ids = np.array(self.__track_ids, dtype=np.int64)[positions]
+        entries = heapq.nsmallest(wanted, zip((-counts).tolist(), track_ids.tolist()))
+        bound = entries.pop() if len(entries) > LEADERBOARD_DEPTH else None
+        return _Board(entries, bound)
@@ -2,22 +2,30 @@ from ast import Str
 import csv
 from pathlib import Path
 from datetime import date, datetime
-from typing import List
+from typing import Dict, List, Tuple, Iterable
 
 from bisect import bisect, bisect_left, insort_left
 
 from werkzeug.security import generate_password_hash
 
-from music.adapters.repository import AbstractRepository, RepositoryException
+from music.adapters.repository import (
+    AbstractRepository, RepositoryException, COMPLETION_KINDS, LEADERBOARD_METRICS, LEADERBOARD_SCOPES
+)
 from music.domainmodel.album import Album
 from music.domainmodel.artist import Artist
 from music.domainmodel.genre import Genre
 from music.domainmodel.playlist import PlayList
+from music.domainmodel.rating_summary import RatingSummary
 from music.domainmodel.review import Review
 from music.domainmodel.track import Track
 from music.domainmodel.user import User
 
 from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters.facets import FACETS, TrackFacets
+from music.adapters.leaderboards import Leaderboards
+from music.adapters.recommendations import Recommender
+from music.adapters.similarity import TrackFeatures, feature_row
+from music.adapters.text_search import InvertedIndex, PrefixIndex
 
 class MemoryRepository(AbstractRepository):
     def __init__(self):
@@ -32,6 +40,43 @@ class MemoryRepository(AbstractRepository):
         self.__reviews = []
         self.__users = set()
 
+        # -- id-keyed indexes kept in step with the collections above by the add_* methods
+        self.__tracks_by_id = dict()
+        self.__artists_by_id = dict()
+        self.__albums_by_id = dict()
+        self.__genres_by_id = dict()
+        self.__users_by_id = dict()
+        self.__users_by_name = dict()
+
+        # -- sorted array of every track id, plus name-keyed sorted arrays of the matching track ids
+        self.__track_ids = []
+        self.__track_ids_by_artist_name = dict()
+        self.__track_ids_by_album_title = dict()
+        self.__track_ids_by_genre_name = dict()
+
+        # -- (review, author) pairs keyed by track id
+        self.__reviews_by_track_id = dict()
+        # -- running RatingSummary of the reviews of each reviewed track, keyed by track id
+        self.__rating_summaries = dict()
+
+        # -- inverted index of the searchable text of every track, keyed by track id
+        self.__search_index = InvertedIndex()
+
+        # -- prefix index of the names of every kind in COMPLETION_KINDS, with their popularity
+        self.__completions = {kind: PrefixIndex() for kind in COMPLETION_KINDS}
+
+        # -- artist and genre candidate pools and co-liked tracks, for suggestions
+        self.__recommender = Recommender()
+
+        # -- feature matrix of every track for get_similar_tracks, a row added with each track
+        self.__track_features = TrackFeatures([])
+
+        # -- facet columns of every track for browse_tracks, built by bulk_load or on first use after a change
+        self.__track_facets = None
+
+        # -- popularity counts of every track, ranked overall and by genre, artist and release year
+        self.__leaderboards = Leaderboards(LEADERBOARD_METRICS)
+
     @property
     def tracks(self) -> list:
         return self.__tracks
@@ -60,72 +105,142 @@ class MemoryRepository(AbstractRepository):
 
     def add_album(self, album: Album):
         self.__albums.add(album)
+        self.__albums_by_id.setdefault(album.album_id, album)
+        self.__completions['album'].add(album.title)
 
     def get_album(self, id: int) -> Album:
-        target_album = None
-        for album in self.__albums:
-            #print(album)
-            if album.album_id == id:
-                target_album = album
-
-        return target_album
+        return self.__albums_by_id.get(id)
 
 
 
     def add_artist(self, artist: Artist):
         self.__artists.add(artist)
+        self.__artists_by_id.setdefault(artist.artist_id, artist)
+        self.__completions['artist'].add(artist.full_name)
 
     def get_artist(self, id: int) -> Artist:
-        target_artist = None
-        for artist in self.__artists:
-            if artist.artist_id == id:
-                target_artist= artist
-
-        return target_artist
+        return self.__artists_by_id.get(id)
 
 
 
     def get_tracks_by_album(self, album_name: Str) -> List[Track]:
-        matching_tracks = []
-        try:
-            for track in self.__tracks:
-                if track.album is not None:                  # -- check if tracks have album
-                    if track.album.title == album_name:
-                        matching_tracks.append(track)
-        except ValueError:
-            pass
-        return matching_tracks
+        return self.__tracks_for_ids(self.__track_ids_by_album_title.get(album_name, []))
 
     def get_tracks_by_artist(self, artist_name: Str) -> List[Track]:
-        matching_tracks = []
-        try:
-            for track in self.__tracks:
-                if track.artist.full_name == artist_name:
-                    matching_tracks.append(track)
-        except ValueError:
-            pass
-        return matching_tracks
+        return self.__tracks_for_ids(self.__track_ids_by_artist_name.get(artist_name, []))
 
     def get_tracks_by_genre(self, genre: Genre) -> List[Track]:
-        matching_tracks = []
-        try:
-            for track in self.__tracks:
-                for g in track.genres:
-                    if g.name == genre:
-                        matching_tracks.append(track)
-        except ValueError:
-            pass
-        return matching_tracks
-    
+        return self.__tracks_for_ids(self.__track_ids_by_genre_name.get(genre, []))
+
+    def get_tracks_page(self, after_id: int = None, limit: int = 20, track_filter: tuple = None,
+                        before_id: int = None, from_end: bool = False) -> List[Track]:
+        track_ids = self.__filtered_track_ids(track_filter)
+        if before_id is not None or from_end:
+            end = bisect_left(track_ids, before_id) if before_id is not None else len(track_ids)
+            start = max(0, end - limit)
+        else:
+            start = bisect(track_ids, after_id) if after_id is not None else 0
+            end = start + limit
+        return self.__tracks_for_ids(track_ids[start:end])
+
+    def count_tracks(self, track_filter: tuple = None) -> int:
+        return len(self.__filtered_track_ids(track_filter))
+
+    def search_tracks(self, query: str, limit: int = 20, offset: int = 0) -> List[Track]:
+        return self.__tracks_for_ids(self.__search_index.search(query, limit, offset))
+
+    def complete_names(self, kind: str, prefix: str, limit: int = 10) -> List[str]:
+        if kind not in self.__completions:
+            raise RepositoryException(f'Unknown completion kind {kind}')
+        return self.__completions[kind].complete(prefix, limit)
+
+    def get_recommendations(self, user_name: str, limit: int = 3) -> List[Track]:
+        user = self.get_user(user_name)
+        if user is None:
+            return []
+        return self.__tracks_for_ids(self.__recommender.recommend(user.user_id, limit))
+
+    def get_similar_tracks(self, track_ids: List[int], k: int = 5) -> List[List[Track]]:
+        return [self.__tracks_for_ids(similar_ids) for similar_ids in self.__track_features.similar(track_ids, k)]
+
+    def get_leaderboard(self, metric: str, scope: tuple = None, k: int = 10) -> List[Tuple[Track, int]]:
+        if metric not in LEADERBOARD_METRICS or (scope is not None and scope[0] not in LEADERBOARD_SCOPES):
+            raise RepositoryException(f'Unknown leaderboard {metric} {scope}')
+        return [(self.__tracks_by_id[track_id], count)
+                for track_id, count in self.__leaderboards.top(metric, scope, k)]
+
+    def browse_tracks(self, filters: Dict[str, object], limit: int = 20, offset: int = 0) \
+            -> Tuple[List[Track], int, Dict[str, List[tuple]]]:
+        for facet in filters:
+            if facet not in FACETS:
+                raise RepositoryException(f'Unknown facet {facet}')
+        track_ids, total, counts = self.__facets().browse(filters, limit, offset)
+        return self.__tracks_for_ids(track_ids), total, counts
+
+    def __count(self, track: Track, metric: str, change: int):
+        # -- a like or playlist add counts towards the track's popularity, and undoing it no longer does
+        attribute = f'track_{metric}'
+        setattr(track, attribute, max(getattr(track, attribute) + change, 0))
+        self.__leaderboards.count(track.track_id, metric, change)
+
+    def __facets(self) -> TrackFacets:
+        if self.__track_facets is None:
+            genre_names = {genre_id: genre.name for genre_id, genre in self.__genres_by_id.items()}
+            self.__track_facets = TrackFacets((feature_row(track) for track in self.__tracks_by_id.values()),
+                                              genre_names)
+        return self.__track_facets
+
+    def __filtered_track_ids(self, track_filter: tuple) -> list:
+        if track_filter is None:
+            return self.__track_ids
+        field, key = track_filter
+        if field == 'artist':
+            return self.__track_ids_by_artist_name.get(key, [])
+        elif field == 'album':
+            return self.__track_ids_by_album_title.get(key, [])
+        elif field == 'genre':
+            return self.__track_ids_by_genre_name.get(key, [])
+        raise RepositoryException(f'Unknown track filter {field}')
+
+    def __tracks_for_ids(self, track_ids) -> List[Track]:
+        return [self.__tracks_by_id[track_id] for track_id in track_ids]
+
+    def __index_track(self, track: Track, add: bool):
+        # -- adds (or removes) the track's id in every sorted id array it belongs to
+        # -- and counts the track towards the popularity of its artist, album and genres (or stops counting it)
+        update = _insert_sorted if add else _remove_sorted
+        count = 1 if add else -1
+        update(self.__track_ids, track.track_id)
+        if track.artist is not None:
+            update(self.__track_ids_by_artist_name.setdefault(track.artist.full_name, []), track.track_id)
+            self.__completions['artist'].add(track.artist.full_name, count)
+        if track.album is not None:                  # -- check if tracks have album
+            update(self.__track_ids_by_album_title.setdefault(track.album.title, []), track.track_id)
+            self.__completions['album'].add(track.album.title, count)
+        for genre in track.genres:
+            update(self.__track_ids_by_genre_name.setdefault(genre.name, []), track.track_id)
+            self.__completions['genre'].add(genre.name, count)
+        if add:
+            self.__search_index.add(track.track_id, _search_fields(track))
+            self.__recommender.add_track(track.track_id, _recommendation_pools(track))
+            self.__leaderboards.add_track(track.track_id, _popularity_counts(track), _leaderboard_scopes(track))
+        else:
+            self.__search_index.remove(track.track_id)
+            self.__recommender.remove_track(track.track_id)
+            self.__leaderboards.remove_track(track.track_id)
+
     def add_track(self, track: Track):
         self.__tracks.append(track)
+        previous_track = self.__tracks_by_id.get(track.track_id)
+        if previous_track is not None:
+            self.__index_track(previous_track, False)
+        self.__tracks_by_id[track.track_id] = track
+        self.__index_track(track, True)
+        self.__track_features.add(feature_row(track))
+        self.__track_facets = None
 
     def get_track(self, id: int) -> Track:
-        target_track = None
-        for track in self.__tracks:
-            if track.track_id== id:
-                target_track = track
-        return target_track
+        return self.__tracks_by_id.get(id)
     
     def get_all_tracks(self):
         return self.__tracks
@@ -134,34 +249,68 @@ class MemoryRepository(AbstractRepository):
 
     def add_genre(self, genre: Genre):
         self.__genres.add(genre)
+        self.__genres_by_id.setdefault(genre.genre_id, genre)
+        self.__completions['genre'].add(genre.name)
+        self.__track_facets = None
 
     def get_genre(self, id: int) -> Genre:
-        target_genre = None
-        for genre in self.__genres:
-            if genre.genre_id == id:
-                target_genre = genre
+        return self.__genres_by_id.get(id)
+
 
-        return target_genre
+
+    def bulk_load(self, albums: Iterable[Album], artists: Iterable[Artist], tracks: Iterable[Track],
+                  genres: Iterable[Genre]):
+        for album in albums:
+            if album.album_id not in self.__albums_by_id:
+                self.add_album(album)
+        for artist in artists:
+            if artist.artist_id not in self.__artists_by_id:
+                self.add_artist(artist)
+        for track in tracks:
+            if track.track_id not in self.__tracks_by_id:
+                self.add_track(track)
+        for genre in genres:
+            if genre.genre_id not in self.__genres_by_id:
+                self.add_genre(genre)
+        self.__facets()
 
 
 
     def add_review(self, review: Review, user: User):
-        for u in self.__users:
-            if u == user:
-                user.add_review(review)
+        if user in self.__users:
+            user.add_review(review)
         super().add_review(review, user)
         self.__reviews.append(review)
+        self.__reviews_by_track_id.setdefault(review.track.track_id, []).append((review, user))
+        self.__rating_summaries.setdefault(review.track.track_id, RatingSummary()).add_rating(review.rating)
 
     def get_reviews(self):
         return self.__reviews
 
+    def get_reviews_for_track(self, track_id: int) -> List[Tuple[Review, User]]:
+        return list(self.__reviews_by_track_id.get(track_id, []))
+
+    def get_rating_summary(self, track_ids: Iterable[int]) -> Dict[int, RatingSummary]:
+        return {track_id: RatingSummary(self.__rating_summaries[track_id].histogram)
+                if track_id in self.__rating_summaries else RatingSummary() for track_id in track_ids}
+
 
 
     def add_user(self, user: User):
+        if user in self.__users:
+            return
         self.__users.add(user)
+        self.__users_by_id[user.user_id] = user
+        self.__users_by_name.setdefault(user.user_name, user)
+        self.__completions['user'].add(user.user_name)
+        for track in user.liked_tracks:
+            self.__recommender.like(user.user_id, track.track_id)
 
     def get_user(self, user_name) -> User:
-        return next((user for user in self.__users if user.user_name == user_name), None)
+        # -- apply the same normalisation as User.__init__ so lookups are case-insensitive
+        if type(user_name) is not str:
+            return None
+        return self.__users_by_name.get(user_name.lower().strip())
 
     def get_users_playlist(self, user_name) -> PlayList:
         user = self.get_user(user_name)
@@ -169,34 +318,96 @@ class MemoryRepository(AbstractRepository):
             return user.playlist
 
     def get_user_by_id(self, user_id: int) -> User:
-        target_user = None
-        for user in self.__users:
-            if user.user_id == user_id:
-                target_user = user
-        return target_user
+        return self.__users_by_id.get(user_id)
 
     def add_to_playlist(self, track: Track, user: User):
         if user != None:
-            return user.add_to_playlist(track)
+            added = user.add_to_playlist(track)
+            if added:
+                self.__count(track, 'interest', 1)
+            return added
 
     def remove_from_playlist(self, track: Track, user: User):
-        return user.remove_from_playlist(track)
+        removed = user.remove_from_playlist(track)
+        if removed:
+            self.__count(track, 'interest', -1)
+        return removed
 
     def add_to_favourite(self, track, user: User):
         if user != None and track not in user.liked_tracks:
             user.add_liked_track(track)
+            if isinstance(track, Track):
+                self.__recommender.like(user.user_id, track.track_id)
+                self.__count(track, 'favorites', 1)
             return True
         return False
 
     def remove_liked_track(self, track, user: User):
+        if isinstance(track, Track):
+            self.__recommender.unlike(user.user_id, track.track_id)
+            if track in user.liked_tracks:
+                self.__count(track, 'favorites', -1)
         return user.remove_liked_track(track)
 
 
     def like_playlist(self, friend: User, user: User):
-        return friend.playlist.like(user)
+        liked = friend.playlist.like(user)
+        if liked:
+            self.__completions['user'].add(friend.user_name, 1)
+        return liked
         
     def unlike_playlist(self, friend: User, user: User):
-        return friend.playlist.unlike(user)
+        unliked = friend.playlist.unlike(user)
+        if unliked:
+            self.__completions['user'].add(friend.user_name, -1)
+        return unliked
+
+
+def _insert_sorted(sorted_ids: list, item_id: int):
+    index = bisect_left(sorted_ids, item_id)
+    if index == len(sorted_ids) or sorted_ids[index] != item_id:
+        sorted_ids.insert(index, item_id)
+
+
+def _remove_sorted(sorted_ids: list, item_id: int):
+    index = bisect_left(sorted_ids, item_id)
+    if index < len(sorted_ids) and sorted_ids[index] == item_id:
+        del sorted_ids[index]
+
+
+# A title match counts double, as titles are weighted above the other fields in the database's search as well
+SEARCH_FIELD_WEIGHTS = {'title': 2, 'artist': 1, 'album': 1, 'genre': 1}
+
+
+def _search_fields(track: Track) -> List[Tuple[str, int]]:
+    # -- the (text, weight) fields searched by search_tracks
+    fields = [(track.title, SEARCH_FIELD_WEIGHTS['title'])]
+    if track.artist is not None:
+        fields.append((track.artist.full_name, SEARCH_FIELD_WEIGHTS['artist']))
+    if track.album is not None:
+        fields.append((track.album.title, SEARCH_FIELD_WEIGHTS['album']))
+    fields.extend((genre.name, SEARCH_FIELD_WEIGHTS['genre']) for genre in track.genres)
+    return fields
+
+
+def _recommendation_pools(track: Track) -> List[Tuple[str, str]]:
+    # -- the candidate pools of the track's artist and genres
+    pools = []
+    if track.artist is not None:
+        pools.append(('artist', track.artist.full_name))
+    pools.extend(('genre', genre.name) for genre in track.genres)
+    return pools
+
 
+def _popularity_counts(track: Track) -> dict:
+    return {metric: getattr(track, f'track_{metric}') for metric in LEADERBOARD_METRICS}
 
 
+def _leaderboard_scopes(track: Track) -> list:
+    # -- the (kind, value) scopes of LEADERBOARD_SCOPES the track is ranked in
+    scopes = [('genre', genre.genre_id) for genre in track.genres]
+    if track.artist is not None:
+        scopes.append(('artist', track.artist.artist_id))
+    if track.album is not None and track.album.release_year is not None:
+        scopes.append(('year', track.album.release_year))
+    return scopes
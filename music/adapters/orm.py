@@ -1,10 +1,24 @@
+import logging
+from pathlib import Path
+
 from sqlalchemy import (
     Table, MetaData, Column, Integer, String, Date, DateTime,
-    ForeignKey
+    ForeignKey, Index, DDL, bindparam, case, event, func, inspect, literal, select
 )
 from sqlalchemy.orm import mapper, relationship, synonym
+from sqlalchemy.schema import CreateColumn
+from music.adapters.csvdatareader import POPULARITY_COLUMNS, TrackCSVReader, popularity_counts
 from music.domainmodel import model
 
+logger = logging.getLogger(__name__)
+
+# The most duplicate values a SchemaUpgradeException lists
+LISTED_DUPLICATES = 20
+
+
+class SchemaUpgradeException(Exception):
+    pass
+
 # global variable giving access to the MetaData (schema) information of the database
 metadata = MetaData()
 
@@ -12,41 +26,51 @@ users_table = Table('users', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('user_name', String(255), nullable=False),
     Column('password', String(225), nullable=False),
-
+    Index('ix_users_user_name', 'user_name', unique=True)
 )
 
 playlists_table = Table('playlists', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('user_id', ForeignKey('users.id'))
+    Column('user_id', ForeignKey('users.id'), index=True)
 )
 playlist_tracks_table = Table('playlist_tracks', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('playlist_id', ForeignKey('playlists.id')),
-    Column('track_id', ForeignKey('tracks.id'))
+    Column('track_id', ForeignKey('tracks.id')),
+    # -- unique, as adding a track that is already in the playlist relies on this index rejecting it
+    Index('ix_playlist_tracks_playlist_id_track_id', 'playlist_id', 'track_id', unique=True)
 )
 playlist_liked_by_table = Table('playlist_liked_by', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('playlist_id', ForeignKey('playlists.id'), unique=False),
+    Column('playlist_id', ForeignKey('playlists.id'), unique=False, index=True),
     Column('user_name', ForeignKey('users.user_name'), unique=False)
 )
 
 tracks_table = Table('tracks', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('title', String(255), nullable=False),
-    Column('artist', ForeignKey('artists.artist_id')),
-    Column('album', ForeignKey('albums.album_id')),
+    Column('artist', ForeignKey('artists.artist_id'), index=True),
+    Column('album', ForeignKey('albums.album_id'), index=True),
     Column('track_url', String(255), nullable=True),
-    Column('track_duration', Integer, nullable=True)
+    Column('track_duration', Integer, nullable=True),
+    # -- popularity counts; the server defaults let upgrade_schema add them to an existing table
+    Column('track_listens', Integer, nullable=False, default=0, server_default='0'),
+    Column('track_favorites', Integer, nullable=False, default=0, server_default='0'),
+    Column('track_interest', Integer, nullable=False, default=0, server_default='0'),
+    # -- raised above every other track's whenever a count changes, so each process can read the counts changed since
+    # -- it last looked (see SqlAlchemyRepository.get_leaderboard)
+    Column('counts_version', Integer, nullable=False, default=0, server_default='0'),
+    Index('ix_tracks_counts_version', 'counts_version')
 )
 
 artists_table = Table('artists', metadata,
     Column('artist_id', Integer, primary_key=True, autoincrement=True),
-    Column('full_name', String(255), nullable=False)
+    Column('full_name', String(255), nullable=False, index=True)
 )
 
 albums_table = Table('albums', metadata,
     Column('album_id', Integer, primary_key=True, autoincrement=True),
-    Column('title', String(255), nullable=False),
+    Column('title', String(255), nullable=False, index=True),
     Column('album_url', String(255), nullable=True),
     Column('album_type', String(255), nullable=True),
     Column('release_year', Integer, nullable=True)
@@ -54,24 +78,184 @@ albums_table = Table('albums', metadata,
 
 genres_table = Table('genres', metadata,
     Column('genre_id', Integer, primary_key=True, autoincrement=True),
-    Column('name', String(255), nullable=False)
+    Column('name', String(255), nullable=False, index=True)
 )
 
+# Both column orders are indexed: track -> genres when loading a track, genre -> tracks when searching by genre
 track_genres_table = Table('track_genres', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('track_id', ForeignKey('tracks.id')),
-    Column('genre_id', ForeignKey('genres.genre_id'))
+    Column('genre_id', ForeignKey('genres.genre_id')),
+    Index('ix_track_genres_track_id_genre_id', 'track_id', 'genre_id', unique=True),
+    Index('ix_track_genres_genre_id_track_id', 'genre_id', 'track_id')
 )
 
 reviews_table = Table('reviews', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('user_id', ForeignKey('users.id')),
-    Column('track_id', ForeignKey('tracks.id')),
+    Column('user_id', ForeignKey('users.id'), index=True),
+    Column('track_id', ForeignKey('tracks.id'), index=True),
     Column('review_text', String(1024), nullable=False),
     Column('rating', Integer, nullable=False),
     Column('timestamp', DateTime, nullable=False)
 )
 
+# Running aggregate of the ratings of each reviewed track, kept in step with reviews by the repository, so pages
+# of tracks read their ratings by primary key instead of aggregating reviews. rating_<n> counts the ratings of n.
+track_ratings_table = Table('track_ratings', metadata,
+    Column('track_id', ForeignKey('tracks.id'), primary_key=True),
+    Column('rating_count', Integer, nullable=False, default=0),
+    Column('rating_total', Integer, nullable=False, default=0),
+    *[Column(f'rating_{rating}', Integer, nullable=False, default=0) for rating in range(1, 6)]
+)
+
+
+# Full-text index of the title, artist name, album title and genre names of every track, one row per track with the
+# track id as its rowid. An FTS5 table cannot be created by create_all, so it is created and dropped along with the
+# metadata and described by a Table of its own for building statements.
+tracks_search_table = Table('tracks_search', MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('title', String),
+    Column('artist', String),
+    Column('album', String),
+    Column('genres', String)
+)
+event.listen(metadata, 'after_create', DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tracks_search USING fts5(title, artist, album, genres, "
+    "tokenize='unicode61 remove_diacritics 2')").execute_if(dialect='sqlite'))
+event.listen(metadata, 'before_drop', DDL('DROP TABLE IF EXISTS tracks_search').execute_if(dialect='sqlite'))
+
+
+def index_tracks_for_search(connection, track_ids=None):
+    """ Writes the tracks_search rows of the given tracks (of all tracks if track_ids is None) from the tracks,
+    artists, albums and genres tables, replacing any rows they had.
+    """
+    genre_names = select(func.group_concat(genres_table.c.name, literal(' '))) \
+        .join(track_genres_table, track_genres_table.c.genre_id == genres_table.c.genre_id) \
+        .where(track_genres_table.c.track_id == tracks_table.c.id) \
+        .scalar_subquery()
+    rows = select(tracks_table.c.id, tracks_table.c.title, artists_table.c.full_name, albums_table.c.title,
+                  genre_names) \
+        .select_from(tracks_table) \
+        .outerjoin(artists_table, artists_table.c.artist_id == tracks_table.c.artist) \
+        .outerjoin(albums_table, albums_table.c.album_id == tracks_table.c.album)
+    delete = tracks_search_table.delete()
+    if track_ids is not None:
+        rows = rows.where(tracks_table.c.id.in_(track_ids))
+        delete = delete.where(tracks_search_table.c.rowid.in_(track_ids))
+    connection.execute(delete)
+    connection.execute(tracks_search_table.insert().from_select(
+        ['rowid', 'title', 'artist', 'album', 'genres'], rows))
+
+
+def summarise_ratings(connection):
+    """ Rebuilds every track_ratings row from the reviews table. """
+    summaries = select(reviews_table.c.track_id, func.count(), func.sum(reviews_table.c.rating),
+                       *[func.sum(case((reviews_table.c.rating == rating, 1), else_=0)) for rating in range(1, 6)]) \
+        .group_by(reviews_table.c.track_id)
+    connection.execute(track_ratings_table.delete())
+    connection.execute(track_ratings_table.insert().from_select(
+        [column.name for column in track_ratings_table.columns], summaries))
+
+
+def upgrade_schema(database_engine, data_path: Path = None):
+    """ Brings the schema of an existing database up to date with metadata.
+    create_all only creates missing tables, so columns and indexes added to tables that already exist are created here.
+    An index that has since become unique is rebuilt: the duplicate playlist_tracks rows it would reject are dropped,
+    with a warning logged, while duplicates in any other table (e.g. two users with the same name) are user data only
+    an operator can resolve, so the upgrade stops with a SchemaUpgradeException listing them, leaving the index as it
+    was; once they are renamed or deleted, the next upgrade succeeds. An empty search index or rating summary is
+    filled in, and popularity count columns added to tracks are filled in from the tracks csv file in data_path.
+    """
+    metadata.create_all(database_engine)
+    inspector = inspect(database_engine)
+    added_count_columns = []
+    for table in metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_definition = CreateColumn(column).compile(dialect=database_engine.dialect)
+                with database_engine.begin() as connection:
+                    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column_definition}')
+                if table is tracks_table and column.name in POPULARITY_COLUMNS:
+                    added_count_columns.append(column.name)
+
+        existing = {index['name']: bool(index['unique']) for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing and existing[index.name] != index.unique:
+                with database_engine.begin() as connection:
+                    if index.unique and table.name != playlist_tracks_table.name:
+                        check_no_duplicates(connection, table, index)
+                    index.drop(bind=connection)
+                    if index.unique and table.name == playlist_tracks_table.name:
+                        # -- a track listed twice in a playlist is listed once; keep the first row of each duplicate
+                        # -- group
+                        first_rows = select(func.min(table.c.id)).group_by(*index.columns)
+                        removed = connection.execute(table.delete().where(table.c.id.not_in(first_rows))).rowcount
+                        if removed > 0:
+                            logger.warning('Removed %d duplicate rows from %s to make %s unique',
+                                           removed, table.name, index.name)
+                    index.create(bind=connection)
+            else:
+                index.create(bind=database_engine, checkfirst=True)
+
+    with database_engine.begin() as connection:
+        if connection.execute(select(tracks_search_table.c.rowid).limit(1)).first() is None:
+            index_tracks_for_search(connection)
+        if connection.execute(select(track_ratings_table.c.track_id).limit(1)).first() is None:
+            summarise_ratings(connection)
+        if added_count_columns and data_path is not None:
+            fill_popularity_counts(connection, data_path, added_count_columns)
+
+
+def check_no_duplicates(connection, table, index):
+    """ Raises a SchemaUpgradeException naming the table, the index and the duplicate values if the rows of table
+    have any the unique index would reject.
+    """
+    duplicates = connection.execute(select(*index.columns, func.count())
+                                    .group_by(*index.columns)
+                                    .having(func.count() > 1)
+                                    .order_by(*index.columns)).all()
+    if len(duplicates) > 0:
+        columns = ', '.join(column.name for column in index.columns)
+        values = ', '.join(f'{", ".join(repr(value) for value in values)} ({count} rows)'
+                           for *values, count in duplicates[:LISTED_DUPLICATES])
+        if len(duplicates) > LISTED_DUPLICATES:
+            values += f' and {len(duplicates) - LISTED_DUPLICATES} more'
+        raise SchemaUpgradeException(
+            f'Cannot make index {index.name} unique: table {table.name} has rows with the same {columns}: {values}. '
+            f'Rename or delete the duplicates, then start the app again')
+
+
+def fill_popularity_counts(connection, data_path: Path, columns):
+    """ Sets the given popularity count columns of every track to its counts in the tracks csv file of data_path, with
+    one executemany UPDATE.
+    """
+    reader = TrackCSVReader(str(data_path / 'raw_albums_excerpt.csv'), str(data_path / 'raw_tracks_excerpt.csv'))
+    rows = []
+    for track_row in reader.iter_track_rows():
+        if track_row['track_id'].isdigit():
+            counts = popularity_counts(track_row)
+            rows.append(dict({f'new_{column}': counts[column] for column in columns},
+                             track=int(track_row['track_id'])))
+    if len(rows) > 0:
+        update = tracks_table.update().where(tracks_table.c.id == bindparam('track')) \
+            .values({column: bindparam(f'new_{column}') for column in columns})
+        connection.execute(update, rows)
+
+def set_sqlite_pragmas(database_engine, pragmas: dict):
+    """ Runs PRAGMA name=value for each of pragmas on every connection the engine opens to an SQLite database.
+    Other databases are left alone.
+    """
+    if database_engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(database_engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
 def map_model_to_tables():
     mapper(model.User, users_table, properties={
         '_User__user_id': users_table.c.id,
@@ -95,6 +279,9 @@ def map_model_to_tables():
         '_Track__album_id': tracks_table.c.album,
         '_Track__track_url': tracks_table.c.track_url,
         '_Track__track_duration': tracks_table.c.track_duration,
+        '_Track__track_listens': tracks_table.c.track_listens,
+        '_Track__track_favorites': tracks_table.c.track_favorites,
+        '_Track__track_interest': tracks_table.c.track_interest,
         
         '_Track__genres': relationship(model.Genre, secondary=track_genres_table, back_populates='_Genre__tracks'),
 
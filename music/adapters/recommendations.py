@@ -0,0 +1,172 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Iterable, List, Tuple
+
+# The latest likes of a user that suggestions are based on
+SEED_TRACKS = 5
+# The most co-liked tracks kept ready for every track
+NEIGHBOURS_PER_TRACK = 20
+
+
+class Recommender:
+    """ Suggests tracks to users from the tracks they liked: first the tracks other users most often liked along with
+    their latest likes, then the most liked tracks by the same artists or of the same genres.
+    Everything suggestions are ranked by is kept up to date as tracks and likes are added and removed, so a suggestion
+    costs a few steps per track suggested, however many tracks the user or the catalogue holds.
+    Every method holds one lock, as the recommender is shared by the threads of the server.
+    """
+
+    def __init__(self):
+        # track id -> keys of the candidate pools the track is in, as ('artist', name) or ('genre', name)
+        self.__pool_keys = dict()
+        # pool key -> sorted (-number of likes, track id) pairs, most liked track first
+        self.__pools = dict()
+        # track id -> number of users who liked it
+        self.__likes = dict()
+        # user id -> ids of the tracks they liked in the order they liked them, as the keys of a dict
+        self.__liked_tracks = dict()
+        # track id -> ids of the users who liked it, as the keys of a dict
+        self.__likers = dict()
+        # track id -> {other track id: number of users who liked both}
+        self.__co_likes = dict()
+        # track id -> its NEIGHBOURS_PER_TRACK most co-liked tracks, computed when first needed after a change
+        self.__neighbours = dict()
+        self.__lock = threading.RLock()
+
+    def __getstate__(self):
+        # -- the lock is not pickled with the memory repository's snapshot; each unpickled copy gets its own
+        state = self.__dict__.copy()
+        del state['_Recommender__lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.RLock()
+
+    def add_track(self, track_id: int, pool_keys: Iterable[Tuple[str, str]]):
+        """ Puts a track into the candidate pools of its artist and genres, taking it out of any it was in before. """
+        with self.__lock:
+            self.__remove_track(track_id)
+            pool_keys = list(dict.fromkeys(pool_keys))
+            self.__pool_keys[track_id] = pool_keys
+            for key in pool_keys:
+                insort(self.__pools.setdefault(key, []), self.__pool_entry(track_id))
+
+    def remove_track(self, track_id: int):
+        with self.__lock:
+            self.__remove_track(track_id)
+
+    def like(self, user_id: int, track_id: int) -> bool:
+        """ Records that the user liked the track; returns False if they already did. """
+        with self.__lock:
+            return self.__like(user_id, track_id)
+
+    def unlike(self, user_id: int, track_id: int) -> bool:
+        """ Forgets that the user liked the track; returns False if they did not. """
+        with self.__lock:
+            return self.__unlike(user_id, track_id)
+
+    def set_likes(self, track_ids: Iterable[int], likes: Iterable[Tuple[int, int]]):
+        """ Makes likes, (user id, track id) pairs in the order they were made, the only likes of the given tracks,
+        for likes recorded elsewhere; the likes already held keep their place in the order.
+        """
+        with self.__lock:
+            likes = list(likes)
+            kept = set(likes)
+            for track_id in track_ids:
+                for user_id in list(self.__likers.get(track_id, ())):
+                    if (user_id, track_id) not in kept:
+                        self.__unlike(user_id, track_id)
+            for user_id, track_id in likes:
+                self.__like(user_id, track_id)
+
+    def recommend(self, user_id: int, limit: int) -> List[int]:
+        """ Returns the ids of up to limit tracks the user has not liked, best suggestion first. """
+        with self.__lock:
+            return self.__recommend(user_id, limit)
+
+    def __remove_track(self, track_id: int):
+        for key in self.__pool_keys.pop(track_id, ()):
+            pool = self.__pools[key]
+            del pool[bisect_left(pool, self.__pool_entry(track_id))]
+
+    def __like(self, user_id: int, track_id: int) -> bool:
+        liked = self.__liked_tracks.setdefault(user_id, dict())
+        if track_id in liked:
+            return False
+        self.__count_co_likes(track_id, liked, 1)
+        liked[track_id] = None
+        self.__likers.setdefault(track_id, dict())[user_id] = None
+        self.__count_like(track_id, 1)
+        return True
+
+    def __unlike(self, user_id: int, track_id: int) -> bool:
+        liked = self.__liked_tracks.get(user_id, dict())
+        if track_id not in liked:
+            return False
+        del liked[track_id]
+        del self.__likers[track_id][user_id]
+        self.__count_co_likes(track_id, liked, -1)
+        self.__count_like(track_id, -1)
+        return True
+
+    def __recommend(self, user_id: int, limit: int) -> List[int]:
+        liked = self.__liked_tracks.get(user_id, dict())
+        seeds = list(islice(reversed(liked), SEED_TRACKS))
+
+        scores = dict()
+        for seed in seeds:
+            for other_id, count in self.__neighbours_of(seed):
+                if other_id not in liked:
+                    scores[other_id] = scores.get(other_id, 0) + count
+        suggestions = heapq.nsmallest(limit, scores, key=lambda track_id: (-scores[track_id], track_id))
+
+        # -- then one track from each of the seeds' artist and genre pools in turn, most liked first
+        chosen = set(suggestions)
+        pool_keys = dict.fromkeys(key for seed in seeds for key in self.__pool_keys.get(seed, ()))
+        candidates = [iter(self.__pools[key]) for key in pool_keys]
+        while len(suggestions) < limit and len(candidates) > 0:
+            for pool in list(candidates):
+                track_id = next((track_id for _, track_id in pool
+                                 if track_id not in liked and track_id not in chosen), None)
+                if track_id is None:
+                    candidates.remove(pool)
+                elif len(suggestions) < limit:
+                    suggestions.append(track_id)
+                    chosen.add(track_id)
+        return suggestions
+
+    def __pool_entry(self, track_id: int) -> Tuple[int, int]:
+        return -self.__likes.get(track_id, 0), track_id
+
+    def __count_like(self, track_id: int, change: int):
+        # -- the track moves within every pool it is in
+        for key in self.__pool_keys.get(track_id, ()):
+            pool = self.__pools[key]
+            del pool[bisect_left(pool, self.__pool_entry(track_id))]
+        self.__likes[track_id] = self.__likes.get(track_id, 0) + change
+        for key in self.__pool_keys.get(track_id, ()):
+            insort(self.__pools[key], self.__pool_entry(track_id))
+
+    def __count_co_likes(self, track_id: int, other_ids: Iterable[int], change: int):
+        co_likes = self.__co_likes.setdefault(track_id, dict())
+        for other_id in other_ids:
+            other_co_likes = self.__co_likes.setdefault(other_id, dict())
+            count = co_likes.get(other_id, 0) + change
+            if count == 0:
+                del co_likes[other_id]
+                del other_co_likes[track_id]
+            else:
+                co_likes[other_id] = other_co_likes[track_id] = count
+            self.__neighbours.pop(other_id, None)
+        self.__neighbours.pop(track_id, None)
+
+    def __neighbours_of(self, track_id: int) -> List[Tuple[int, int]]:
+        neighbours = self.__neighbours.get(track_id)
+        if neighbours is None:
+            co_likes = self.__co_likes.get(track_id, dict())
+            neighbours = self.__neighbours[track_id] = heapq.nsmallest(
+                NEIGHBOURS_PER_TRACK, co_likes.items(), key=lambda item: (-item[1], item[0]))
+        return neighbours
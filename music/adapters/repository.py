@@ -1,17 +1,25 @@
 import abc
-from typing import List
+from typing import Dict, List, Tuple, Iterable
 from datetime import date
 
 from music.domainmodel.album import Album
 from music.domainmodel.artist import Artist
 from music.domainmodel.genre import Genre
 from music.domainmodel.playlist import PlayList
+from music.domainmodel.rating_summary import RatingSummary
 from music.domainmodel.review import Review
 from music.domainmodel.track import Track
 from music.domainmodel.user import User
 
 repo_instance = None
 
+# The kinds of names complete_names can complete
+COMPLETION_KINDS = ('artist', 'album', 'genre', 'user')
+
+# The counts get_leaderboard ranks tracks by, and the kinds of scope it ranks them within
+LEADERBOARD_METRICS = ('listens', 'favorites', 'interest')
+LEADERBOARD_SCOPES = ('genre', 'artist', 'year')
+
 class RepositoryException(Exception):
 
     def __init__(self, message=None):
@@ -48,6 +56,73 @@ class AbstractRepository(abc.ABC):
     def get_tracks_by_genre(self, genre: Genre) -> List[Track]:
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_tracks_page(self, after_id: int = None, limit: int = 20, track_filter: Tuple[str, str] = None,
+                        before_id: int = None, from_end: bool = False) -> List[Track]:
+        """ Returns up to limit tracks in track id order, for keyset pagination.
+        Without before_id or from_end, these are the first tracks with an id greater than after_id (or the first
+        tracks overall); with before_id, the last tracks with an id less than before_id; with from_end, the last
+        tracks overall.
+        track_filter restricts the tracks to one search, as ('artist', artist name), ('album', album title) or
+        ('genre', genre name).
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_tracks(self, track_filter: Tuple[str, str] = None) -> int:
+        """ Returns the number of tracks matching track_filter (see get_tracks_page). """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search_tracks(self, query: str, limit: int = 20, offset: int = 0) -> List[Track]:
+        """ Returns up to limit tracks whose title, artist name, album title or genre names contain every term of
+        query (a term also matches words it is the start of), best matches first, skipping the first offset.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete_names(self, kind: str, prefix: str, limit: int = 10) -> List[str]:
+        """ Returns up to limit artist names, album titles, genre names or user names (kind is one of
+        COMPLETION_KINDS) with a word starting with prefix, most popular first: artists, albums and genres by their
+        number of tracks, users by the number of likes of their playlist.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_recommendations(self, user_name: str, limit: int = 3) -> List[Track]:
+        """ Returns up to limit tracks the User named user_name has not liked, best suggestion first: the tracks other
+        users most often liked along with the User's latest liked tracks, then popular tracks by the same artists or
+        of the same genres. If there is no such User or they have not liked any tracks, this method returns an empty
+        list.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_similar_tracks(self, track_ids: List[int], k: int = 5) -> List[List[Track]]:
+        """ Returns, for each of track_ids, up to k other tracks most like it by genres, artist, album type, release
+        year and duration, most similar first. A track id that is not in the repository gets an empty list.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_leaderboard(self, metric: str, scope: Tuple[str, int] = None, k: int = 10) -> List[Tuple[Track, int]]:
+        """ Returns up to k (track, count) pairs of the tracks with the highest count of metric (one of
+        LEADERBOARD_METRICS), highest first and ties by track id. Tracks are ranked among all tracks, or, given a scope
+        of (kind, value) with a kind in LEADERBOARD_SCOPES, among the tracks of that genre id, artist id or release
+        year. Counts include the likes (favorites) and playlist adds (interest) made through the repository.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def browse_tracks(self, filters: Dict[str, object], limit: int = 20, offset: int = 0) \
+            -> Tuple[List[Track], int, Dict[str, List[tuple]]]:
+        """ Returns the tracks matching every filter, keyed by a facet of music.adapters.facets.FACETS: up to limit of
+        them in track id order after skipping offset of them, the number of them and, for every facet, the (value,
+        label, number of tracks) of each of its values, counting the tracks matching the filters on the other facets.
+        An unknown facet raises RepositoryException.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_genre(self, genre: Genre):
         raise NotImplementedError
@@ -64,6 +139,14 @@ class AbstractRepository(abc.ABC):
     def get_track(self, id: int) -> Track:
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def bulk_load(self, albums: Iterable[Album], artists: Iterable[Artist], tracks: Iterable[Track],
+                  genres: Iterable[Genre]):
+        """ Adds many entities in one pass, e.g. when populating the repository from the csv files.
+        Entities whose id is already in the repository (or earlier in the same call) are skipped.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_review(self, review: Review, user : User):
 
@@ -75,6 +158,20 @@ class AbstractRepository(abc.ABC):
     def get_reviews(self):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_reviews_for_track(self, track_id: int) -> List[Tuple[Review, User]]:
+        """ Returns (review, author) pairs for the Track with the given id, in the order they were added.
+        If the Track has no reviews, this method returns an empty list.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_rating_summary(self, track_ids: Iterable[int]) -> Dict[int, RatingSummary]:
+        """ Returns the RatingSummary of the reviews of each of track_ids, keyed by track id, in one lookup.
+        A track without reviews (or not in the repository) gets an empty RatingSummary.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_user(self, user: User):
         """" Adds a User to the repository. """
@@ -12,9 +12,9 @@ from pathlib import Path
 from music.adapters.repository import AbstractRepository
 from music.adapters.csvdatareader import load_data, load_user, load_review
 
-def populate(data_path: Path, repo: AbstractRepository, database_mode: bool):
-
-    load_data(data_path, repo)
+def populate(data_path: Path, repo: AbstractRepository, database_mode: bool, fast_ingest: bool = False):
+    # fast_ingest is only supported in database mode
+    load_data(data_path, repo, fast_ingest and database_mode)
     if (database_mode == True):
         load_user(data_path, repo)
         load_review(data_path, repo)
@@ -0,0 +1,84 @@
+import os
+import pickle
+import hashlib
+from pathlib import Path
+
+from music.adapters.memory_repository import MemoryRepository
+
+# Bump when the layout of the snapshot file changes.
+SNAPSHOT_FORMAT_VERSION = 1
+
+DATA_FILE_NAMES = ("raw_albums_excerpt.csv", "raw_tracks_excerpt.csv")
+
+# Directories of the Python sources behind a snapshot's contents: the repository and its indexes, and the domain model
+CODE_DIRECTORIES = (Path(__file__).parent, Path(__file__).parent.parent / 'domainmodel')
+
+
+def data_files_key(data_path: Path, previous_key: dict = None) -> dict:
+    """ Describes the csv files a snapshot is built from by their size, mtime and sha256.
+    The hash is only recomputed when a file's size or mtime differs from previous_key.
+    """
+    key = dict()
+    for file_name in DATA_FILE_NAMES:
+        stat = os.stat(data_path / file_name)
+        previous = previous_key.get(file_name) if previous_key is not None else None
+        if previous is not None and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime_ns:
+            digest = previous['sha256']
+        else:
+            with open(data_path / file_name, 'rb') as data_file:
+                digest = hashlib.sha256(data_file.read()).hexdigest()
+        key[file_name] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': digest}
+    return key
+
+
+def code_key() -> str:
+    """ The sha256 of the sources in CODE_DIRECTORIES, so a snapshot built by other code (such as other search weights,
+    similarity features or facets) is not loaded even when it holds the same attributes.
+    """
+    digest = hashlib.sha256()
+    for directory in CODE_DIRECTORIES:
+        for source_path in sorted(Path(directory).glob('*.py')):
+            digest.update(source_path.name.encode())
+            digest.update(source_path.read_bytes())
+    return digest.hexdigest()
+
+
+def _same_data(stored_key: dict, current_key: dict) -> bool:
+    # -- a touched but unchanged file (same size and hash) still matches
+    return stored_key.keys() == current_key.keys() and all(
+        stored_key[name]['size'] == current_key[name]['size'] and
+        stored_key[name]['sha256'] == current_key[name]['sha256'] for name in current_key)
+
+
+def save_snapshot(repo: MemoryRepository, snapshot_path: Path, data_path: Path):
+    """ Writes the populated repository to snapshot_path, keyed by the csv files in data_path. """
+    header = {'version': SNAPSHOT_FORMAT_VERSION, 'code': code_key(), 'data': data_files_key(data_path)}
+    snapshot_path = Path(snapshot_path)
+    temporary_path = snapshot_path.with_name(snapshot_path.name + '.tmp')
+    with open(temporary_path, 'wb') as snapshot_file:
+        pickle.dump(header, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(repo, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    # -- replace in one step so concurrently booting workers never read a half-written file
+    os.replace(temporary_path, snapshot_path)
+
+
+def load_snapshot(snapshot_path: Path, data_path: Path):
+    """ Returns the MemoryRepository stored at snapshot_path, or None if there is no usable snapshot
+    (missing, unreadable, written by another format version or other code, or built from different csv files).
+    Snapshots are only ever written by save_snapshot, so they are trusted input for pickle.
+    """
+    try:
+        with open(snapshot_path, 'rb') as snapshot_file:
+            header = pickle.load(snapshot_file)
+            if header.get('version') != SNAPSHOT_FORMAT_VERSION or header.get('code') != code_key():
+                return None
+            if not _same_data(header['data'], data_files_key(data_path, header['data'])):
+                return None
+            repo = pickle.load(snapshot_file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError, TypeError, ImportError):
+        return None
+
+    # A snapshot taken before MemoryRepository gained or lost an index is stale as well.
+    if not isinstance(repo, MemoryRepository) or vars(repo).keys() != vars(MemoryRepository()).keys():
+        return None
+    return repo
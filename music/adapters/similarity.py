@@ -0,0 +1,217 @@
+import threading
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from music.domainmodel.track import Track
+
+# How much each feature counts towards the similarity of two tracks
+FEATURE_WEIGHTS = {
+    'genres': 1.0,
+    'artist': 1.0,
+    'album_type': 0.5,
+    'release_year': 0.5,
+    'duration': 0.5,
+}
+
+# The most seeds scored by one matrix product, which takes a row of scores per seed
+SEEDS_PER_BATCH = 64
+
+# (track id, artist id, album type, release year, duration in seconds, genre ids); everything but the id may be missing
+FeatureRow = Tuple[int, Optional[int], Optional[str], Optional[int], Optional[int], Iterable[int]]
+
+
+def feature_row(track: Track) -> FeatureRow:
+    album = track.album
+    return (track.track_id,
+            track.artist.artist_id if track.artist is not None else None,
+            album.album_type if album is not None else None,
+            album.release_year if album is not None else None,
+            track.track_duration,
+            [genre.genre_id for genre in track.genres])
+
+
+class TrackFeatures:
+    """ Encodes every track as a row of one feature matrix, for finding the most similar tracks (by the cosine of
+    their feature vectors) to many tracks at once.
+    Genres and album types are one column per value; a track's genre columns share the genre weight, so tracks with
+    many genres do not outweigh the other features. Release years and durations (on a log scale) are standardised
+    columns, 0 when missing. Artists would need a column per artist, so they are kept as one array of artist codes and
+    their part of the dot product is the weight squared wherever two codes are equal.
+    Tracks are added a row at a time into spare rows and columns, so adding one costs a few steps rather than a new
+    matrix; the standardised columns, which depend on every track, are worked out again on the next search after one.
+    Every method holds one lock, as the features are shared by the threads of the server.
+    """
+
+    def __init__(self, rows: Iterable[FeatureRow]):
+        rows = list({row[0]: row for row in rows}.values())
+        # -- track id -> its row, ('genre', id) or ('album_type', name) -> its one-hot column, artist id -> its code
+        self.__positions = {row[0]: position for position, row in enumerate(rows)}
+        self.__columns = dict()
+        self.__artist_codes_by_id = dict()
+
+        # -- the one-hot entries are gathered first and written with a single fancy-indexed assignment
+        positions, columns, values = [], [], []
+        for position, row in enumerate(rows):
+            for column, value in self.__one_hot(row):
+                positions.append(position)
+                columns.append(column)
+                values.append(value)
+        self.__size = len(rows)
+        self.__matrix = np.zeros((self.__size, len(self.__columns)), dtype=np.float32)
+        self.__matrix[positions, columns] = values
+        self.__track_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.__artist_codes = np.array([self.__artist_code(row[1]) for row in rows], dtype=np.int64)
+        self.__years = np.array([_year(row) for row in rows], dtype=np.float64)
+        self.__durations = np.array([_log_duration(row) for row in rows], dtype=np.float64)
+
+        # -- the weighted standardised year and duration columns and the norm of every row, None after a change
+        self.__standardised = None
+        self.__norms = None
+        self.__lock = threading.RLock()
+
+    def __getstate__(self):
+        # -- the lock is not pickled with the memory repository's snapshot; each unpickled copy gets its own
+        state = self.__dict__.copy()
+        del state['_TrackFeatures__lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.RLock()
+
+    def __len__(self):
+        return self.__size
+
+    def add(self, row: FeatureRow):
+        """ Adds a track, or replaces the features of one already added. """
+        with self.__lock:
+            position = self.__positions.get(row[0])
+            if position is None:
+                position = self.__positions[row[0]] = self.__size
+                self.__size += 1
+            one_hot = list(self.__one_hot(row))
+            self.__reserve(self.__size, len(self.__columns))
+            self.__matrix[position] = 0
+            for column, value in one_hot:
+                self.__matrix[position, column] = value
+            self.__track_ids[position] = row[0]
+            self.__artist_codes[position] = self.__artist_code(row[1])
+            self.__years[position] = _year(row)
+            self.__durations[position] = _log_duration(row)
+            self.__standardised = None
+            self.__norms = None
+
+    def similar(self, track_ids: Sequence[int], k: int) -> List[List[int]]:
+        """ Returns, for each of track_ids, the ids of the up to k other tracks most similar to it, most similar first.
+        Tracks sharing no feature with it are left out, as are all of them for an unknown track id.
+        """
+        with self.__lock:
+            k = min(k, len(self) - 1)
+            if k <= 0:
+                return [[] for _ in track_ids]
+            if self.__norms is None:
+                self.__standardise()
+            similar = []
+            # -- the scores of a batch take a row per seed, so large batches are scored a slice at a time
+            for start in range(0, len(track_ids), SEEDS_PER_BATCH):
+                similar.extend(self.__similar(track_ids[start:start + SEEDS_PER_BATCH], k))
+            return similar
+
+    def __one_hot(self, row: FeatureRow) -> Iterator[Tuple[int, float]]:
+        # -- (column, value) of the genre and album type entries of a track's row, adding any column not seen before
+        genre_ids = list(dict.fromkeys(row[5]))
+        for genre_id in genre_ids:
+            yield self.__columns.setdefault(('genre', genre_id), len(self.__columns)), \
+                FEATURE_WEIGHTS['genres'] / np.sqrt(len(genre_ids))
+        if row[2]:
+            yield self.__columns.setdefault(('album_type', row[2]), len(self.__columns)), FEATURE_WEIGHTS['album_type']
+
+    def __artist_code(self, artist_id: Optional[int]) -> int:
+        if artist_id is None:
+            return -1
+        return self.__artist_codes_by_id.setdefault(artist_id, len(self.__artist_codes_by_id))
+
+    def __reserve(self, row_count: int, column_count: int):
+        # -- grows the arrays by at least a quarter when full, so adding tracks one by one copies them rarely
+        rows, columns = self.__matrix.shape
+        if row_count <= rows and column_count <= columns:
+            return
+        if row_count > rows:
+            rows = max(row_count, rows + rows // 4 + 16)
+        if column_count > columns:
+            columns = max(column_count, columns + columns // 4 + 4)
+        matrix = np.zeros((rows, columns), dtype=np.float32)
+        matrix[:self.__matrix.shape[0], :self.__matrix.shape[1]] = self.__matrix
+        self.__matrix = matrix
+        self.__track_ids = _resized(self.__track_ids, rows, 0)
+        self.__artist_codes = _resized(self.__artist_codes, rows, -1)
+        self.__years = _resized(self.__years, rows, np.nan)
+        self.__durations = _resized(self.__durations, rows, np.nan)
+
+    def __standardise(self):
+        size = self.__size
+        standardised = np.empty((size, 2), dtype=np.float32)
+        standardised[:, 0] = FEATURE_WEIGHTS['release_year'] * _standardised(self.__years[:size])
+        standardised[:, 1] = FEATURE_WEIGHTS['duration'] * _standardised(self.__durations[:size])
+        matrix = self.__matrix[:size]
+        squared_norms = np.einsum('ij,ij->i', matrix, matrix) + np.einsum('ij,ij->i', standardised, standardised)
+        squared_norms += (self.__artist_codes[:size] >= 0) * FEATURE_WEIGHTS['artist'] ** 2
+        # -- a track without any feature is similar to nothing rather than dividing by zero
+        self.__norms = np.where(squared_norms > 0, np.sqrt(squared_norms), np.inf).astype(np.float32)
+        self.__standardised = standardised
+
+    def __similar(self, track_ids: Sequence[int], k: int) -> List[List[int]]:
+        size = self.__size
+        positions = np.array([self.__positions.get(track_id, -1) for track_id in track_ids], dtype=np.int64)
+        known = positions >= 0
+        seeds = np.where(known, positions, 0)
+        matrix = self.__matrix[:size]
+        track_ids = self.__track_ids[:size]
+        artist_codes = self.__artist_codes[:size]
+
+        # -- cosine similarity of every seed (rows) to every track (columns) in one matrix product
+        scores = matrix[seeds] @ matrix.T
+        scores += self.__standardised[seeds] @ self.__standardised.T
+        seed_artists = artist_codes[seeds]
+        same_artist = (seed_artists[:, None] == artist_codes[None, :]) & (seed_artists[:, None] >= 0)
+        scores += same_artist * np.float32(FEATURE_WEIGHTS['artist'] ** 2)
+        scores /= self.__norms[seeds][:, None] * self.__norms[None, :]
+        scores[np.arange(len(seeds)), seeds] = -np.inf
+
+        # -- argpartition finds the k best of each row without sorting the rest; only those k are then ordered
+        best = np.argpartition(scores, -k, axis=1)[:, -k:]
+        similar = []
+        for row, is_known in enumerate(known):
+            if not is_known:
+                similar.append([])
+                continue
+            positions = best[row]
+            row_scores = scores[row, positions]
+            order = np.lexsort((track_ids[positions], -row_scores))
+            similar.append([int(track_ids[positions[index]]) for index in order if row_scores[index] > 0])
+        return similar
+
+
+def _year(row: FeatureRow) -> float:
+    return np.nan if row[3] is None else row[3]
+
+
+def _log_duration(row: FeatureRow) -> float:
+    return np.nan if not row[4] else np.log(row[4])
+
+
+def _resized(values: np.ndarray, size: int, fill) -> np.ndarray:
+    resized = np.full(size, fill, dtype=values.dtype)
+    resized[:len(values)] = values
+    return resized
+
+
+def _standardised(values: np.ndarray) -> np.ndarray:
+    # -- z-scores, with missing (nan) values at the mean
+    present = ~np.isnan(values)
+    if not present.any():
+        return np.zeros(len(values))
+    deviation = values[present].std()
+    standardised = (values - values[present].mean()) / (deviation if deviation > 0 else 1)
+    return np.where(present, standardised, 0)
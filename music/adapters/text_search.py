@@ -0,0 +1,190 @@
+import re
+import math
+import heapq
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Iterable, List, Tuple
+
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """ Splits text into lower case alphanumeric terms with accents removed, the way SQLite's unicode61 tokenizer
+    (with remove_diacritics) does, so both repositories agree on what a search term is.
+    """
+    if not text:
+        return []
+    decomposed = unicodedata.normalize('NFKD', text)
+    without_accents = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _TOKEN_PATTERN.findall(without_accents.casefold())
+
+
+class InvertedIndex:
+    """ Maps every term to the sorted ids of the documents containing it, for multi-term AND queries ranked by TF-IDF.
+    Documents are added and removed one at a time, so the index is kept up to date incrementally.
+    """
+
+    def __init__(self):
+        # term -> sorted list of the ids of the documents containing it
+        self.__postings = dict()
+        # document id -> {term: 1 + log of its weighted number of occurrences}, the TF part of every score
+        self.__term_frequencies = dict()
+        # every indexed term in sorted order, so the terms starting with a query term are one slice of it
+        self.__terms = []
+
+    def __len__(self):
+        return len(self.__term_frequencies)
+
+    def add(self, document_id: int, fields: Iterable[Tuple[str, float]]):
+        """ Indexes the (text, weight) fields of a document, replacing whatever was indexed for it before.
+        Each occurrence of a term counts weight (at least 1) towards its term frequency.
+        """
+        self.remove(document_id)
+        frequencies = dict()
+        for text, weight in fields:
+            for term in tokenize(text):
+                frequencies[term] = frequencies.get(term, 0) + weight
+        frequencies = {term: 1 + math.log(frequency) for term, frequency in frequencies.items()}
+        self.__term_frequencies[document_id] = frequencies
+
+        for term in frequencies:
+            postings = self.__postings.get(term)
+            if postings is None:
+                postings = self.__postings[term] = []
+                insort(self.__terms, term)
+            position = bisect_left(postings, document_id)
+            postings.insert(position, document_id)
+
+    def remove(self, document_id: int):
+        frequencies = self.__term_frequencies.pop(document_id, None)
+        if frequencies is None:
+            return
+        for term in frequencies:
+            postings = self.__postings[term]
+            del postings[bisect_left(postings, document_id)]
+            if len(postings) == 0:
+                del self.__postings[term]
+                del self.__terms[bisect_left(self.__terms, term)]
+
+    def search(self, query: str, limit: int, offset: int = 0) -> List[int]:
+        """ Returns the ids of the documents containing every term of query (a term also matches the indexed terms it
+        is the start of), highest TF-IDF score first and then by id, skipping the first offset.
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if len(query_terms) == 0:
+            return []
+        expansions = [self.__terms_starting_with(term) for term in query_terms]
+        if any(len(expansion) == 0 for expansion in expansions):
+            return []
+
+        # -- intersect from the shortest posting list, so every step costs at most the length of the previous result
+        candidates = sorted((self.__postings_of(expansion) for expansion in expansions), key=len)
+        matches = candidates[0]
+        for postings in candidates[1:]:
+            matches = _intersect(matches, postings)
+            if len(matches) == 0:
+                return []
+
+        document_count = len(self.__term_frequencies)
+        weights = [(term, math.log(document_count / len(self.__postings[term])) + 1)
+                   for expansion in expansions for term in expansion]
+        if sum(len(self.__postings[term]) for term, _ in weights) < len(matches) * len(weights):
+            # -- fewer postings than (match, term) pairs, e.g. for a short prefix: add the scores up term by term
+            scores = dict.fromkeys(matches, 0.0)
+            for term, idf in weights:
+                for document_id in self.__postings[term]:
+                    if document_id in scores:
+                        scores[document_id] += self.__term_frequencies[document_id][term] * idf
+            ranked = [(-score, document_id) for document_id, score in scores.items()]
+        else:
+            ranked = [(-self.__score(document_id, weights), document_id) for document_id in matches]
+        return [document_id for _, document_id in heapq.nsmallest(offset + limit, ranked)[offset:]]
+
+    def __score(self, document_id: int, weights: List[Tuple[str, float]]) -> float:
+        frequencies = self.__term_frequencies[document_id]
+        return sum(frequencies.get(term, 0) * idf for term, idf in weights)
+
+    def __terms_starting_with(self, prefix: str) -> List[str]:
+        start = bisect_left(self.__terms, prefix)
+        end = bisect_left(self.__terms, prefix + _LAST_CHARACTER, start)
+        return self.__terms[start:end]
+
+    def __postings_of(self, terms: List[str]) -> List[int]:
+        if len(terms) == 1:
+            return self.__postings[terms[0]]
+        return sorted(set().union(*(self.__postings[term] for term in terms)))
+
+
+class PrefixIndex:
+    """ Completes prefixes to the most popular names, e.g. of artists for type-ahead. Every word of a name starts a
+    key in one sorted array, so the keys starting with a prefix are one slice of it found with bisect.
+    """
+
+    def __init__(self, names: Iterable[Tuple[str, int]] = ()):
+        """ Indexes the given (name, popularity) pairs with a single sort; the popularity of repeated names adds up. """
+        # name -> popularity, the order completions are returned in
+        self.__popularity = dict()
+        for name, popularity in names:
+            self.__popularity[name] = self.__popularity.get(name, 0) + popularity
+        # sorted (key, name) pairs, where key is the terms of the name from one of its words onwards joined by spaces
+        self.__keys = sorted(key for name in self.__popularity for key in _prefix_keys(name))
+        # (key, limit) -> completions of the keys short enough to match a large part of the index
+        self.__cached_completions = dict()
+
+    def __len__(self):
+        return len(self.__popularity)
+
+    def add(self, name: str, popularity: int = 0):
+        """ Adds popularity to name (it can be negative), indexing name first if it is new. """
+        self.__cached_completions.clear()
+        if name in self.__popularity:
+            self.__popularity[name] += popularity
+            return
+        self.__popularity[name] = popularity
+        for key in _prefix_keys(name):
+            insort(self.__keys, key)
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        """ Returns up to limit names with a word starting with prefix (compared like search terms), most popular
+        first and then by name.
+        """
+        key = ' '.join(tokenize(prefix))
+        if key == '':
+            return []
+        if len(key) > _CACHED_KEY_LENGTH:
+            return self.__complete(key, limit)
+        completions = self.__cached_completions.get((key, limit))
+        if completions is None:
+            completions = self.__cached_completions[(key, limit)] = self.__complete(key, limit)
+        return list(completions)
+
+    def __complete(self, key: str, limit: int) -> List[str]:
+        start = bisect_left(self.__keys, (key,))
+        end = bisect_left(self.__keys, (key + _LAST_CHARACTER,), start)
+        names = {name for _, name in self.__keys[start:end]}
+        popularity = self.__popularity
+        return heapq.nsmallest(limit, names, key=lambda name: (-popularity[name], name))
+
+
+def _prefix_keys(name: str) -> List[Tuple[str, str]]:
+    terms = tokenize(name)
+    return [(' '.join(terms[start:]), name) for start in range(len(terms))]
+
+
+# The first keystrokes match the most names, so their completions are kept until the index changes
+_CACHED_KEY_LENGTH = 2
+
+_LAST_CHARACTER = chr(0x10FFFF)
+
+
+def _intersect(shorter: List[int], longer: List[int]) -> List[int]:
+    # -- each id of the shorter list is looked up in the longer one by binary search, resuming from the last match
+    result = []
+    position = 0
+    for document_id in shorter:
+        position = bisect_left(longer, document_id, position)
+        if position == len(longer):
+            break
+        if longer[position] == document_id:
+            result.append(document_id)
+    return result
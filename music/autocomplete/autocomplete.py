@@ -0,0 +1,25 @@
+from flask import Blueprint
+from flask import request, jsonify
+
+import music.adapters.repository as repo
+import music.autocomplete.services as services
+
+
+autocomplete_blueprint = Blueprint(
+    'autocomplete_bp', __name__)
+
+MAX_COMPLETIONS = 50
+
+
+@autocomplete_blueprint.route('/autocomplete', methods=['GET'])
+def autocomplete():
+    # Called on every keystroke of the search forms, so it only reads the repository's prefix index.
+    kind = request.args.get('kind', '')
+    prefix = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_COMPLETIONS)
+
+    try:
+        names = services.complete_names(kind, prefix, limit, repo.repo_instance)
+    except services.UnknownKindException:
+        return jsonify(error=f'Unknown kind {kind}'), 400
+    return jsonify(kind=kind, q=prefix, results=names)
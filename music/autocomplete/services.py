@@ -0,0 +1,13 @@
+from typing import List
+
+from music.adapters.repository import AbstractRepository, COMPLETION_KINDS
+
+
+class UnknownKindException(Exception):
+    pass
+
+
+def complete_names(kind: str, prefix: str, limit: int, repo: AbstractRepository) -> List[str]:
+    if kind not in COMPLETION_KINDS:
+        raise UnknownKindException
+    return repo.complete_names(kind, prefix, limit)
@@ -0,0 +1,106 @@
+from flask import Blueprint
+from flask import abort, request, render_template, url_for, jsonify
+
+import music.adapters.repository as repo
+import music.browse.services as services
+from music.adapters.facets import FACETS
+
+
+browse_blueprint = Blueprint(
+    'browse_bp', __name__)
+
+FACET_TITLES = {
+    'genre': 'Genre',
+    'decade': 'Decade',
+    'year': 'Release year',
+    'album_type': 'Album type',
+    'duration': 'Duration',
+}
+
+# The query string arguments each facet is filtered by
+FACET_ARGS = {
+    'genre': ('genre',),
+    'decade': ('decade',),
+    'year': ('year',),
+    'album_type': ('album_type',),
+    'duration': ('min_duration', 'max_duration'),
+}
+
+
+def browse_filters() -> dict:
+    shortest = request.args.get('min_duration', type=int)
+    longest = request.args.get('max_duration', type=int)
+    return {
+        'genre': request.args.get('genre', type=int),
+        'decade': request.args.get('decade', type=int),
+        'year': request.args.get('year', type=int),
+        'album_type': request.args.get('album_type') or None,
+        'duration': (shortest, longest) if shortest is not None or longest is not None else None,
+    }
+
+
+def facet_args(facet, value) -> dict:
+    if facet == 'duration':
+        shortest, longest = value
+        return {'min_duration': shortest, 'max_duration': longest}
+    return {facet: value}
+
+
+@browse_blueprint.route('/browse', methods=['GET'])
+def browse():
+    # Every page is counted from the repository's facet index; only the tracks shown are read.
+    tracks_per_page = 20
+    page = max(request.args.get('page', 1, type=int), 1)
+    filters = browse_filters()
+
+    try:
+        tracks, total, counts = services.browse_tracks(filters, tracks_per_page, (page - 1) * tracks_per_page,
+                                                       repo.repo_instance)
+    except services.InvalidFilterException:
+        abort(400)
+
+    # -- the current filters, for links that change one of them and go back to the first page
+    current_args = {name: value for name, value in request.args.items() if name != 'page'}
+    facets = dict()
+    for facet in FACETS:
+        links = []
+        without_facet = {name: value for name, value in current_args.items() if name not in FACET_ARGS[facet]}
+        for value, label, count in counts[facet]:
+            selected = filters[facet] == value
+            # -- choosing the selected value again clears the filter
+            args = without_facet if selected else dict(without_facet, **facet_args(facet, value))
+            links.append((label, count, url_for('browse_bp.browse', **args), selected))
+        facets[facet] = links
+
+    prev_page_url = url_for('browse_bp.browse', page=page - 1, **current_args) if page > 1 else None
+    next_page_url = url_for('browse_bp.browse', page=page + 1, **current_args) \
+        if page * tracks_per_page < total else None
+
+    return render_template('browse.html',
+                           tracks = tracks,
+                           total = total,
+                           facets = facets,
+                           facet_titles = FACET_TITLES,
+                           filtered = len(current_args) > 0,
+                           prev_page_url = prev_page_url,
+                           next_page_url = next_page_url)
+
+
+@browse_blueprint.route('/browse/json', methods=['GET'])
+def browse_json():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    try:
+        tracks, total, counts = services.browse_tracks(browse_filters(), limit, offset, repo.repo_instance)
+    except services.InvalidFilterException:
+        return jsonify(error='Invalid filters'), 400
+    return jsonify(total=total,
+                   offset=offset,
+                   tracks=[dict(track_id=track.track_id,
+                                title=track.title,
+                                artist=track.artist.full_name if track.artist is not None else None,
+                                album=track.album.title if track.album is not None else None)
+                           for track in tracks],
+                   facets={facet: [dict(value=value, label=label, count=count) for value, label, count in values]
+                           for facet, values in counts.items()})
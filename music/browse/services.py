@@ -0,0 +1,23 @@
+from typing import Dict, List, Tuple
+
+from music.adapters.facets import FACETS
+from music.adapters.repository import AbstractRepository
+from music.domainmodel.track import Track
+
+
+class InvalidFilterException(Exception):
+    pass
+
+
+def browse_tracks(filters: Dict[str, object], limit: int, offset: int,
+                  repo: AbstractRepository) -> Tuple[List[Track], int, Dict[str, List[tuple]]]:
+    filters = {facet: value for facet, value in filters.items() if value is not None}
+    for facet in filters:
+        if facet not in FACETS:
+            raise InvalidFilterException
+    if 'duration' in filters:
+        shortest, longest = filters['duration']
+        if (shortest is not None and shortest < 0) or \
+                (shortest is not None and longest is not None and longest <= shortest):
+            raise InvalidFilterException
+    return repo.browse_tracks(filters, limit, offset)
@@ -0,0 +1,45 @@
+class RatingSummary:
+    """ The number, total and histogram of the 1-5 ratings of a track's reviews. """
+
+    def __init__(self, histogram=None):
+        # -- histogram[i] is the number of ratings of i + 1
+        self.__histogram = [0] * 5
+        self.__count = 0
+        self.__total = 0
+        for index, count in enumerate(histogram or []):
+            self.__histogram[index] = count
+            self.__count += count
+            self.__total += (index + 1) * count
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def total(self) -> int:
+        return self.__total
+
+    @property
+    def histogram(self) -> tuple:
+        return tuple(self.__histogram)
+
+    @property
+    def average(self) -> float:
+        if self.__count == 0:
+            return None
+        return self.__total / self.__count
+
+    def add_rating(self, rating: int):
+        if not isinstance(rating, int) or not 1 <= rating <= 5:
+            raise ValueError('Invalid value for the rating.')
+        self.__histogram[rating - 1] += 1
+        self.__count += 1
+        self.__total += rating
+
+    def __repr__(self) -> str:
+        return f'<RatingSummary {self.histogram}>'
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, self.__class__):
+            return False
+        return self.histogram == other.histogram
@@ -21,6 +21,10 @@ class Track:
         # duration in seconds
         self.__track_duration: int | None = None
         self.__genres: list = []
+        # popularity counts, from the csv file plus the likes and playlist adds made in the app
+        self.__track_listens: int = 0
+        self.__track_favorites: int = 0
+        self.__track_interest: int = 0
 
     @property
     def track_id(self) -> int:
@@ -81,6 +85,30 @@ class Track:
         else:
             raise ValueError
 
+    @property
+    def track_listens(self) -> int:
+        return self.__track_listens
+
+    @track_listens.setter
+    def track_listens(self, new_listens: int):
+        self.__track_listens = _count(new_listens)
+
+    @property
+    def track_favorites(self) -> int:
+        return self.__track_favorites
+
+    @track_favorites.setter
+    def track_favorites(self, new_favorites: int):
+        self.__track_favorites = _count(new_favorites)
+
+    @property
+    def track_interest(self) -> int:
+        return self.__track_interest
+
+    @track_interest.setter
+    def track_interest(self, new_interest: int):
+        self.__track_interest = _count(new_interest)
+
     @property
     def genres(self) -> list:
         return self.__genres
@@ -105,3 +133,9 @@ class Track:
 
     def __hash__(self):
         return hash(self.track_id)
+
+
+def _count(value: int) -> int:
+    if type(value) is not int or value < 0:
+        raise ValueError
+    return value
@@ -0,0 +1,41 @@
+from flask import Blueprint
+from flask import abort, request, render_template
+
+import music.adapters.repository as repo
+import music.leaderboards.services as services
+from music.adapters.leaderboards import LEADERBOARD_DEPTH
+from music.adapters.repository import LEADERBOARD_METRICS
+
+
+leaderboards_blueprint = Blueprint(
+    'leaderboards_bp', __name__)
+
+METRIC_TITLES = {
+    'listens': 'Most listened',
+    'favorites': 'Most favourited',
+    'interest': 'Most popular',
+}
+
+
+@leaderboards_blueprint.route('/leaderboards', defaults={'metric': 'listens'})
+@leaderboards_blueprint.route('/leaderboards/<metric>')
+@leaderboards_blueprint.route('/leaderboards/<metric>/<scope_kind>/<int:scope_value>')
+def leaderboard(metric, scope_kind=None, scope_value=None):
+    # Served from the repository's precomputed leaderboards; only the tracks shown are read.
+    limit = min(max(request.args.get('limit', 20, type=int), 1), LEADERBOARD_DEPTH)
+    scope = (scope_kind, scope_value) if scope_kind is not None else None
+
+    try:
+        ranking = services.get_leaderboard(metric, scope, limit, repo.repo_instance)
+        scope_name = services.get_scope_name(scope, repo.repo_instance) if scope is not None else None
+    except services.UnknownLeaderboardException:
+        abort(404)
+
+    return render_template('leaderboard.html',
+                           ranking = ranking,
+                           metric = metric,
+                           metric_titles = METRIC_TITLES,
+                           metrics = LEADERBOARD_METRICS,
+                           scope_kind = scope_kind,
+                           scope_value = scope_value,
+                           scope_name = scope_name)
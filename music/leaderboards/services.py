@@ -0,0 +1,31 @@
+from typing import List, Optional, Tuple
+
+from music.adapters.repository import AbstractRepository, LEADERBOARD_METRICS, LEADERBOARD_SCOPES
+from music.domainmodel.track import Track
+
+
+class UnknownLeaderboardException(Exception):
+    pass
+
+
+def get_leaderboard(metric: str, scope: Optional[Tuple[str, int]], k: int,
+                    repo: AbstractRepository) -> List[Tuple[Track, int]]:
+    if metric not in LEADERBOARD_METRICS or (scope is not None and scope[0] not in LEADERBOARD_SCOPES):
+        raise UnknownLeaderboardException
+    return repo.get_leaderboard(metric, scope, k)
+
+
+def get_scope_name(scope: Tuple[str, int], repo: AbstractRepository) -> str:
+    # -- the genre name, artist name or release year a scope stands for
+    kind, value = scope
+    if kind == 'genre':
+        genre = repo.get_genre(value)
+        if genre is None:
+            raise UnknownLeaderboardException
+        return genre.name
+    if kind == 'artist':
+        artist = repo.get_artist(value)
+        if artist is None:
+            raise UnknownLeaderboardException
+        return artist.full_name
+    return str(value)
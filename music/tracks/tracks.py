@@ -15,44 +15,86 @@ import datetime
 tracks_blueprint = Blueprint(
     'tracks_bp', __name__)
 
-@tracks_blueprint.route('/all_tracks', methods=['GET'])
-def tracks_list():
+def paginate_tracks(endpoint, track_filter, **url_args):
+    # Keyset pagination: pages are addressed by the track id they start after (or end before), never by an offset,
+    # so only one page of tracks is read from the repository per request.
     tracks_per_page = 20
-    cursor = request.args.get('cursor')
-
-    if cursor is None:
-        cursor = 0
-    else:
-        cursor = int(cursor)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    last = request.args.get('last') is not None
 
     first_track_url = None
     last_track_url = None
     next_track_url = None
     prev_track_url = None
 
-    track_ids = services.get_all_tracks(repo.repo_instance)
+    if last:
+        # -- the last page holds the remainder, so going back from it lines up with the pages from the start
+        number_of_tracks = services.count_tracks(track_filter, repo.repo_instance)
+        last_page_size = number_of_tracks % tracks_per_page or tracks_per_page
+        tracks = services.get_tracks_page(None, last_page_size, track_filter, repo.repo_instance, from_end=True)
+        has_prev = number_of_tracks > len(tracks)
+        has_next = False
+    elif before is not None:
+        # one extra track tells us whether there is a page before this one
+        tracks = services.get_tracks_page(None, tracks_per_page + 1, track_filter, repo.repo_instance,
+                                          before_id=before)
+        has_prev = len(tracks) > tracks_per_page
+        tracks = tracks[-tracks_per_page:]
+        has_next = True
+    else:
+        tracks = services.get_tracks_page(after, tracks_per_page + 1, track_filter, repo.repo_instance)
+        has_next = len(tracks) > tracks_per_page
+        tracks = tracks[:tracks_per_page]
+        has_prev = after is not None
+
+    if has_prev and len(tracks) > 0:
+        first_track_url = url_for(endpoint, **url_args)
+        prev_track_url = url_for(endpoint, before=tracks[0].track_id, **url_args)
+    if has_next and len(tracks) > 0:
+        next_track_url = url_for(endpoint, after=tracks[-1].track_id, **url_args)
+        last_track_url = url_for(endpoint, last=1, **url_args)
+
+    return tracks, dict(first_track_url=first_track_url,
+                        last_track_url=last_track_url,
+                        next_track_url=next_track_url,
+                        prev_track_url=prev_track_url)
+
+
+def paginate_search(endpoint, query, **url_args):
+    # Ranked results have no key to continue from, so pages of a text search are numbered instead.
+    tracks_per_page = 20
+    page = max(request.args.get('page', 1, type=int), 1)
 
-    if cursor > 0:
-        prev_track_url = url_for('tracks_bp.tracks_list', cursor=cursor - tracks_per_page)
-        first_track_url = url_for('tracks_bp.tracks_list')
-    if cursor + tracks_per_page < len(track_ids):
-        next_track_url = url_for('tracks_bp.tracks_list', cursor=cursor + tracks_per_page)
+    # one extra track tells us whether there is a next page
+    tracks = services.search_tracks(query, tracks_per_page + 1, (page - 1) * tracks_per_page, repo.repo_instance)
+    has_next = len(tracks) > tracks_per_page
+    tracks = tracks[:tracks_per_page]
 
-        last_cursor = tracks_per_page * int(len(track_ids) / tracks_per_page)
-        if len(track_ids) % tracks_per_page == 0:
-            last_cursor -= tracks_per_page
-        last_track_url = url_for('tracks_bp.tracks_list', cursor=last_cursor)
+    first_track_url = None
+    prev_track_url = None
+    next_track_url = None
+    if page > 1:
+        first_track_url = url_for(endpoint, **url_args)
+        prev_track_url = url_for(endpoint, page=page - 1, **url_args)
+    if has_next:
+        next_track_url = url_for(endpoint, page=page + 1, **url_args)
+
+    return tracks, dict(first_track_url=first_track_url,
+                        last_track_url=None,
+                        next_track_url=next_track_url,
+                        prev_track_url=prev_track_url)
 
-    #all_tracks = services.get_all_tracks(repo.repo_instance)
-    tracks = track_ids[cursor:cursor + tracks_per_page]
 
+@tracks_blueprint.route('/all_tracks', methods=['GET'])
+def tracks_list():
+    tracks, navigation = paginate_tracks('tracks_bp.tracks_list', None)
 
     return render_template('tracks_list.html',
                            tracks = tracks,
-                           first_track_url=first_track_url,
-                            last_track_url = last_track_url,
-                            next_track_url = next_track_url,
-                            prev_track_url = prev_track_url
+                           ratings = services.get_rating_summary([track.track_id for track in tracks],
+                                                                 repo.repo_instance),
+                           **navigation
                            )
 
 
@@ -63,18 +105,10 @@ def view_track(track_id):
     track_to_show_reviews = request.args.get('view_comments_for')
 
 
-    all_reviews = services.get_all_reviews(repo.repo_instance)
-    track_review = []
-    user_review = {}
-    for review in all_reviews:
-        if review.track.track_id == track_id:
-            track_review.append(review)
-    all_users = services.get_all_users(repo.repo_instance)
-
-    for user in all_users:
-        for review in track_review:
-            if review in user.reviews:
-                user_review[track_id] = user.user_name
+    # -- (review, author) pairs for this track only
+    track_review = services.get_reviews_for_track(track_id, repo.repo_instance)
+    rating = services.get_rating_summary([track_id], repo.repo_instance)[track_id]
+    similar_tracks = services.similar_tracks(track_id, services.SIMILAR_TRACKS_LIMIT, repo.repo_instance)
 
     if 'user_name' in session:
         user_name = session['user_name']
@@ -94,7 +128,8 @@ def view_track(track_id):
                                     album=(track.album).title, 
                                     url=track.track_url,
                                     all_reviews = track_review,
-                                    user_review = user_review
+                                    rating = rating,
+                                    similar_tracks = similar_tracks
                                     )
 
 
@@ -103,11 +138,7 @@ def search():
     interests = []
 
     if 'user_name' in session:
-        user_name = session['user_name']
-        user = services.get_user(user_name, repo.repo_instance)
-
-        if user != None:
-            interests = services.get_user_interests(user, repo.repo_instance)
+        interests = services.get_user_interests(session['user_name'], repo.repo_instance)
 
 
     form = SearchForm()
@@ -120,60 +151,35 @@ def search():
 def search_result():
     key = request.args.get('key')
     chose = request.args.get('chose')
-    cursor = request.args.get('cursor')
-    results = []
 
-    if chose == 'Artist':
-        results = services.get_tracks_by_artist(key, repo.repo_instance)
-    elif chose == 'Album':
-        results = services.get_tracks_by_album(key, repo.repo_instance)
+    if chose == 'Any field':
+        tracks, navigation = paginate_search('tracks_bp.search_result', key, key = key, chose = chose)
     else:
-        results = services.get_tracks_by_genre(key, repo.repo_instance)
+        if chose == 'Artist':
+            track_filter = ('artist', key)
+        elif chose == 'Album':
+            track_filter = ('album', key)
+        else:
+            track_filter = ('genre', key)
 
-    if len(results) == 0:
+        tracks, navigation = paginate_tracks('tracks_bp.search_result', track_filter, key = key, chose = chose)
+
+    if len(tracks) == 0:
         flash('No results found')
         #flash(key)
         # return render_template('tracks_list.html', tracks=services.get_all_tracks(repo.repo_instance))
         return redirect(url_for('tracks_bp.search'))
     else:
-        tracks_per_page = 20
-        cursor = request.args.get('cursor')
-
-        if cursor is None:
-            cursor = 0
-        else:
-            cursor = int(cursor)
-
-        first_track_url = None
-        last_track_url = None
-        next_track_url = None
-        prev_track_url = None
-
-        track_ids = results
-
-        if cursor > 0:
-            prev_track_url = url_for('tracks_bp.search_result', cursor=cursor - tracks_per_page, key = key, chose = chose)
-            first_track_url = url_for('tracks_bp.search_result', key = key, chose = chose)
-        if cursor + tracks_per_page < len(track_ids):
-            next_track_url = url_for('tracks_bp.search_result', cursor=cursor + tracks_per_page, key = key, chose = chose)
-
-            last_cursor = tracks_per_page * int(len(track_ids) / tracks_per_page)
-            if len(track_ids) % tracks_per_page == 0:
-                last_cursor -= tracks_per_page
-            last_track_url = url_for('tracks_bp.search_result', cursor=last_cursor, key = key, chose = chose)
-
-        tracks = track_ids[cursor:cursor + tracks_per_page]
-
         return render_template('tracks_list.html',
                                tracks=tracks,
-                               first_track_url=first_track_url,
-                               last_track_url=last_track_url,
-                               next_track_url=next_track_url,
-                               prev_track_url=prev_track_url)
+                               ratings=services.get_rating_summary([track.track_id for track in tracks],
+                                                                   repo.repo_instance),
+                               **navigation)
 
 
 class SearchForm(FlaskForm):
-    select = SelectField('Search by: ', choices=[('Artist', 'Artist'), ('Album', 'Album'), ('Genre', 'Genre')])
+    select = SelectField('Search by: ', choices=[('Artist', 'Artist'), ('Album', 'Album'), ('Genre', 'Genre'),
+                                                 ('Any field', 'Any field')])
     search = StringField('search', [DataRequired('Search key must not be empty')])
     submit = SubmitField('Search')
 
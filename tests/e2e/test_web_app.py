@@ -2,6 +2,9 @@ import pytest
 
 from flask import session
 
+import music.adapters.repository as repo
+from music.domainmodel.track import Track
+
 def test_register(client):
     # Check that we retrieve the register page.
     response_code = client.get('/authentication/register').status_code
@@ -107,6 +110,25 @@ def test_review(client, auth):
     )
     assert response.headers['Location'] == '/track/2'
 
+    # Check that the review is shown on the track page together with its author.
+    response = client.get('/track/2')
+    assert b'REVIEW: nice, RATING: 5, BY thorke' in response.data
+
+
+def test_track_lists_show_the_average_rating(client, auth):
+    response = client.get('/all_tracks')
+    assert 'No ratings' in response.data.decode()
+
+    auth.register()
+    auth.login()
+    client.post('/review/2', data={'review_text': 'nice', 'rating': 5})
+    client.post('/review/2', data={'review_text': 'not bad', 'rating': 2})
+
+    response = client.get('/all_tracks')
+    assert '★★★★☆ 3.5 (2)' in response.data.decode()
+    response = client.get('/track/2')
+    assert b'AVERAGE RATING: 3.5 from 2 reviews' in response.data
+
 
 
 @pytest.mark.parametrize(('comment', 'messages'), (
@@ -202,7 +224,123 @@ def test_search_a_non_existing_or_invalid_user(client):
     assert b'input user id contains invalid character' in response.data
 
 
+def test_all_tracks_pages(client):
+    for track_id in range(1000, 1030):
+        repo.repo_instance.add_track(Track(track_id, f'Paged track {track_id}'))
+
+    response = client.get('/all_tracks')
+    assert b'Paged track 1009' in response.data
+    assert b'Paged track 1010' not in response.data
+    assert b'/all_tracks?after=1009' in response.data
+    assert b'/all_tracks?last=1' in response.data
+
+    response = client.get('/all_tracks?after=1009')
+    assert b'Paged track 1010' in response.data
+    assert b'Paged track 1029' in response.data
+    assert b'/all_tracks?before=1010' in response.data
+    assert b'?after=' not in response.data
+
+    response = client.get('/all_tracks?before=1010')
+    assert b'Paged track 1009' in response.data
+    assert b'Paged track 1010' not in response.data
+
+    response = client.get('/all_tracks?last=1')
+    assert b'Paged track 1029' in response.data
+    assert b'Paged track 1009' not in response.data
+
+
+def test_search_any_field(client):
+    response = client.post('/search', data={'select': 'Any field', 'search': 'awol street'})
+    assert response.headers['Location'].endswith('/search_result?key=awol+street&chose=Any+field')
+
+    response = client.get('/search_result?key=awol+street&chose=Any+field')
+    assert b'Street Music' in response.data
+    assert b'Electric Ave' not in response.data
+
+    for track_id in range(1000, 1030):
+        repo.repo_instance.add_track(Track(track_id, f'Paged track {track_id}'))
+    response = client.get('/search_result?key=paged&chose=Any+field')
+    assert b'Paged track 1019' in response.data
+    assert b'Paged track 1020' not in response.data
+    assert b'page=2' in response.data
 
+    response = client.get('/search_result?key=paged&chose=Any+field&page=2')
+    assert b'Paged track 1020' in response.data
+    assert b'Paged track 1019' not in response.data
 
 
+def test_autocomplete(client, auth):
+    response = client.get('/autocomplete?kind=artist&q=a')
+    assert response.get_json() == {'kind': 'artist', 'q': 'a',
+                                   'results': ['AWOL', 'Airway', 'Alec K. Redfearn & the Eyesores']}
+    assert client.get('/autocomplete?kind=genre&q=exp&limit=1').get_json()['results'] == ['Experimental Pop']
+    assert client.get('/autocomplete?kind=album&q=').get_json()['results'] == []
 
+    auth.register()
+    assert client.get('/autocomplete?kind=user&q=tho').get_json()['results'] == ['thorke']
+
+    response = client.get('/autocomplete?kind=track&q=a')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Unknown kind track'}
+
+    assert b'<datalist id="completions">' in client.get('/search').data
+    assert b'<datalist id="completions">' in client.get('/search_user').data
+
+
+def test_view_track_shows_similar_tracks(client):
+    response = client.get('/track/137')
+    assert b'More like this' in response.data
+    assert b'Side B' in response.data
+
+
+def test_leaderboards(client):
+    response = client.get('/leaderboards')
+    assert response.status_code == 200
+    assert b'Most listened tracks' in response.data
+    assert response.data.index(b'Freeway') < response.data.index(b'Food')
+
+    response = client.get('/leaderboards/interest/genre/21')
+    assert b'Most popular tracks' in response.data and b'in Hip-Hop' in response.data
+    assert b'Freeway' not in response.data
+    response = client.get('/leaderboards/favorites/artist/1')
+    assert b'Most favourited tracks' in response.data and b'by AWOL' in response.data
+
+    for url in ('/leaderboards/downloads', '/leaderboards/listens/genre/99999', '/leaderboards/listens/decade/2000'):
+        assert client.get(url).status_code == 404
+
+
+def test_leaderboards_count_likes(client, auth):
+    def favourites_page():
+        return client.get('/leaderboards/favorites/artist/1').data
+
+    assert favourites_page().index(b'Street Music') < favourites_page().index(b'Electric Ave')
+    for user_name in ('thorke', 'fmercury'):
+        auth.register(user_name)
+        auth.login(user_name)
+        client.get('/playlist/add_favourite/3', headers={'Referer': '/all_tracks'})
+        auth.logout()
+
+    # -- 3 favourites each, so the tie goes to the lower track id
+    assert favourites_page().index(b'Electric Ave') < favourites_page().index(b'Street Music')
+
+
+
+def test_browse(client):
+    response = client.get('/browse')
+    assert response.status_code == 200
+    assert b'10 tracks' in response.data
+    assert b'Hip-Hop</a> (4)' in response.data
+
+    response = client.get('/browse?genre=21&max_duration=240')
+    assert b'4 tracks' in response.data and b'Street Music' in response.data and b'Freeway' not in response.data
+    # -- the chosen values link back to the page without them
+    assert b'<strong>Hip-Hop</strong>' in response.data
+    assert b'href="/browse?max_duration=240"' in response.data
+
+    response = client.get('/browse/json?album_type=Live+Performance&limit=1')
+    assert response.json['total'] == 2
+    assert [track['title'] for track in response.json['tracks']] == ['Side A']
+    assert {'value': 2006, 'label': '2006', 'count': 2} in response.json['facets']['year']
+
+    assert client.get('/browse?min_duration=300&max_duration=120').status_code == 400
+    assert client.get('/browse/json?min_duration=-1').status_code == 400
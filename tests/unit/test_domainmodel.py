@@ -6,8 +6,9 @@ from music.domainmodel.track import Track
 from music.domainmodel.genre import Genre
 from music.domainmodel.review import Review
 from music.domainmodel.album import Album
+from music.domainmodel.rating_summary import RatingSummary
 from music.domainmodel.user import User
-from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters.csvdatareader import TrackCSVReader, TRACK_COLUMNS, parse_genres, extract_genres
 
 
 class TestArtist:
@@ -442,6 +443,24 @@ class TestTrack:
         assert len(track_set) == 0
 
 
+class TestTrackPopularity:
+
+    def test_popularity_counts(self):
+        track = Track(1, 'Shivers')
+        assert (track.track_listens, track.track_favorites, track.track_interest) == (0, 0, 0)
+
+        track.track_listens = 120
+        track.track_favorites = 3
+        track.track_interest = 0
+        assert (track.track_listens, track.track_favorites, track.track_interest) == (120, 3, 0)
+
+        with pytest.raises(ValueError):
+            track.track_listens = -1
+        with pytest.raises(ValueError):
+            track.track_favorites = '3'
+        assert track.track_favorites == 3
+
+
 class TestReview:
 
     def test_construction(self):
@@ -514,6 +533,45 @@ class TestReview:
         assert review1 != 2
 
 
+class TestRatingSummary:
+
+    def test_construction(self):
+        summary = RatingSummary()
+        assert summary.count == 0
+        assert summary.total == 0
+        assert summary.histogram == (0, 0, 0, 0, 0)
+        assert summary.average is None
+
+        summary = RatingSummary([1, 0, 0, 2, 1])
+        assert summary.count == 4
+        assert summary.total == 1 + 4 + 4 + 5
+        assert summary.average == 3.5
+
+    def test_add_rating(self):
+        summary = RatingSummary()
+        summary.add_rating(5)
+        summary.add_rating(2)
+        summary.add_rating(5)
+
+        assert summary.histogram == (0, 1, 0, 0, 2)
+        assert summary.count == 3
+        assert summary.average == 4
+
+        with pytest.raises(ValueError):
+            summary.add_rating(0)
+        with pytest.raises(ValueError):
+            summary.add_rating('5')
+        assert summary.count == 3
+
+    def test_equality(self):
+        summary = RatingSummary()
+        summary.add_rating(3)
+
+        assert summary == RatingSummary([0, 0, 1, 0, 0])
+        assert summary != RatingSummary()
+        assert summary != (0, 0, 1, 0, 0)
+
+
 class TestUser:
 
     def test_construction(self):
@@ -744,3 +802,58 @@ class TestCSVReader:
         # Expected output: [<Genre Avant-Garde, genre id = 1>, <Genre Pop, genre id = 10>, <Genre Folk, genre id = 17>]
         sorted_genre_sample = str(sorted_genres[:3])
         assert sorted_genre_sample == '[<Genre Avant-Garde, genre id = 1>, <Genre Pop, genre id = 10>, <Genre Folk, genre id = 17>]'
+
+    def test_track_rows_hold_only_used_columns(self):
+        reader = create_csv_reader()
+        rows = reader.read_tracks_file()
+
+        assert len(rows) == 10
+        assert all(tuple(row.keys()) == TRACK_COLUMNS for row in rows)
+        assert rows[0]['track_title'] == 'Food'
+
+    def test_tracks_keep_their_popularity_counts(self):
+        reader = create_csv_reader()
+        tracks_by_id = {track.track_id: track for track in reader.dataset_of_tracks}
+
+        assert tracks_by_id[10].track_listens == 50135
+        assert tracks_by_id[10].track_favorites == 178
+        assert tracks_by_id[10].track_interest == 54881
+        assert tracks_by_id[20].track_favorites == 0
+
+    def test_iter_tracks_streams_tracks(self):
+        reader = create_csv_reader()
+        tracks = reader.iter_tracks()
+
+        first_track = next(tracks)
+        assert first_track == Track(2, 'Food')
+        assert first_track.artist is not None
+        assert [first_track] + list(tracks) == reader.dataset_of_tracks
+
+    def test_tracks_share_artist_album_and_genre_instances(self):
+        reader = create_csv_reader()
+
+        artists = {artist.artist_id: artist for artist in reader.dataset_of_artists}
+        albums = {album.album_id: album for album in reader.dataset_of_albums}
+        genres = {genre.genre_id: genre for genre in reader.dataset_of_genres}
+        for track in reader.dataset_of_tracks:
+            assert track.artist is artists[track.artist.artist_id]
+            assert track.album is albums[track.album.album_id]
+            for genre in track.genres:
+                assert genre is genres[genre.genre_id]
+
+        # Reading the files again keeps referencing the same instances.
+        reader.read_csv_files()
+        assert all(track.artist is artists[track.artist.artist_id] for track in reader.dataset_of_tracks)
+
+    def test_parse_genres(self):
+        assert parse_genres("[]") == ()
+        assert parse_genres("[{'genre_id': '12', 'genre_title': 'Rock', 'genre_url': 'http://x/Rock/'}, "
+                            "{'genre_id': '5', 'genre_title': \"Children's\"}]") == ((12, 'Rock'), (5, "Children's"))
+
+    def test_parse_genres_falls_back_to_literal_eval(self):
+        assert parse_genres("[{'genre_id': '5', 'genre_title': 'It\\'s'}]") == ((5, "It's"),)
+
+    def test_extract_genres_ignores_malformed_genres(self):
+        assert extract_genres({'track_genres': "[{'genre_id': "}) == []
+        assert extract_genres({'track_genres': None}) == []
+
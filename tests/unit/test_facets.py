@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from music.adapters.facets import FACETS, DURATION_BUCKETS, TrackFacets
+
+GENRE_NAMES = {21: 'Hip-Hop', 10: 'Pop', 17: 'Folk'}
+
+
+@pytest.fixture
+def facets():
+    # -- (track id, artist id, album type, release year, duration, genre ids)
+    return TrackFacets([
+        (5, 1, 'Album', 2009, 200, [21]),
+        (2, 1, 'Album', 2009, 170, [21, 10]),
+        (10, 2, 'Album', 2008, 300, [10]),
+        (137, 3, 'Live Performance', 1996, 700, [17, 99]),
+        (138, 3, None, None, None, []),
+    ], GENRE_NAMES)
+
+
+def counts_of(counts, facet):
+    return {value: count for value, _, count in counts[facet]}
+
+
+def test_browse_without_filters_counts_every_track(facets):
+    track_ids, total, counts = facets.browse({}, 10)
+    assert (track_ids, total) == ([2, 5, 10, 137, 138], 5)
+    assert counts['genre'] == [(21, 'Hip-Hop', 2), (10, 'Pop', 2), (99, '99', 1), (17, 'Folk', 1)]
+    assert counts['decade'] == [(1990, '1990s', 1), (2000, '2000s', 3)]
+    assert counts_of(counts, 'year') == {1996: 1, 2008: 1, 2009: 2}
+    assert counts['album_type'] == [('Album', 'Album', 3), ('Live Performance', 'Live Performance', 1)]
+    assert counts['duration'] == [((120, 240), '2-4 min', 2), ((240, 360), '4-6 min', 1), ((600, None), '10+ min', 1)]
+
+
+def test_filters_combine(facets):
+    track_ids, total, counts = facets.browse({'genre': 10, 'decade': 2000, 'duration': (None, 240)}, 10)
+    assert (track_ids, total) == ([2], 1)
+
+    # -- the counts of a facet ignore its own filter, so they show what choosing another value would leave
+    assert counts_of(counts, 'genre') == {21: 2, 10: 1}
+    assert counts_of(counts, 'duration') == {(120, 240): 1, (240, 360): 1}
+    assert counts_of(counts, 'decade') == {2000: 1}
+    assert counts_of(counts, 'album_type') == {'Album': 1}
+
+
+def test_browse_pages_and_unknown_values(facets):
+    assert facets.browse({}, 2, 2)[0] == [10, 137]
+    assert facets.browse({'album_type': 'Album'}, 10, 1)[:2] == ([5, 10], 3)
+    for filters in ({'genre': 1}, {'year': 1850}, {'album_type': 'Single'}, {'duration': (5000, None)}):
+        track_ids, total, counts = facets.browse(filters, 10)
+        assert (track_ids, total) == ([], 0)
+        assert all(counts[facet] == [] for facet in FACETS if facet not in filters)
+
+
+def test_browse_matches_filtering_every_track():
+    random.seed(25)
+    rows = [(track_id, None, random.choice(['Album', 'Single', None]), random.choice([1979, 1985, 1991, 2009, None]),
+             random.choice([None, 30, 130, 250, 400, 900]), random.sample(range(1, 6), random.randint(0, 2)))
+            for track_id in random.sample(range(1000), 300)]
+    facets = TrackFacets(rows, {})
+
+    def matches(row, facet, value):
+        if facet == 'genre':
+            return value in row[5]
+        if facet == 'decade':
+            return row[3] is not None and row[3] // 10 * 10 == value
+        if facet == 'year':
+            return row[3] == value
+        if facet == 'album_type':
+            return row[2] == value
+        shortest, longest = value
+        return row[4] is not None and row[4] >= (shortest or 0) and (longest is None or row[4] < longest)
+
+    choices = {'genre': [1, 3, 5], 'decade': [1970, 2000], 'year': [1985, 2009], 'album_type': ['Album', 'Single'],
+               'duration': [(100, 300), (None, 200), (240, None)] + list(DURATION_BUCKETS)}
+    for _ in range(200):
+        filters = {facet: random.choice(values) for facet, values in choices.items() if random.random() < 0.4}
+        track_ids, total, counts = facets.browse(filters, 20, 5)
+        expected = sorted(row[0] for row in rows
+                          if all(matches(row, facet, value) for facet, value in filters.items()))
+        assert (track_ids, total) == (expected[5:25], len(expected))
+        for facet, values in counts.items():
+            others = [row for row in rows if all(matches(row, other, value) for other, value in filters.items()
+                                                 if other != facet)]
+            for value, _, count in values:
+                assert count == sum(1 for row in others if matches(row, facet, value))
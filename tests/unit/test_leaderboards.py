@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+import music.adapters.leaderboards as leaderboards_module
+from music.adapters.leaderboards import Leaderboards
+
+METRICS = ('listens', 'favorites')
+
+
+@pytest.fixture
+def leaderboards():
+    leaderboards = Leaderboards(METRICS)
+    leaderboards.add_track(1, {'listens': 30, 'favorites': 1}, [('genre', 21), ('artist', 1)])
+    leaderboards.add_track(2, {'listens': 50, 'favorites': 0}, [('genre', 21), ('artist', 1)])
+    leaderboards.add_track(3, {'listens': 30, 'favorites': 4}, [('genre', 10), ('artist', 2)])
+    leaderboards.add_track(4, {'listens': 10, 'favorites': 2}, [('genre', 10), ('genre', 21), ('artist', 2)])
+    return leaderboards
+
+
+def test_top_ranks_by_count_then_track_id(leaderboards):
+    assert leaderboards.top('listens', None, 10) == [(2, 50), (1, 30), (3, 30), (4, 10)]
+    assert leaderboards.top('favorites', None, 2) == [(3, 4), (4, 2)]
+
+
+def test_top_within_a_scope(leaderboards):
+    assert leaderboards.top('listens', ('genre', 21), 10) == [(2, 50), (1, 30), (4, 10)]
+    assert leaderboards.top('favorites', ('artist', 2), 10) == [(3, 4), (4, 2)]
+    assert leaderboards.top('listens', ('genre', 99), 10) == []
+
+
+def test_count_re_ranks_a_track(leaderboards):
+    assert leaderboards.top('favorites', ('genre', 21), 1) == [(4, 2)]
+
+    leaderboards.count(1, 'favorites', 2)
+    assert leaderboards.top('favorites', ('genre', 21), 2) == [(1, 3), (4, 2)]
+    assert leaderboards.top('favorites', None, 10) == [(3, 4), (1, 3), (4, 2), (2, 0)]
+
+    leaderboards.count(1, 'favorites', -10)
+    assert leaderboards.top('favorites', None, 10) == [(3, 4), (4, 2), (1, 0), (2, 0)]
+
+    # -- unknown tracks are ignored
+    leaderboards.count(99, 'favorites', 1)
+    assert len(leaderboards.top('favorites', None, 10)) == 4
+
+
+def test_set_counts_replaces_counts(leaderboards):
+    leaderboards.top('listens', ('genre', 10), 10)
+
+    leaderboards.set_counts(4, {'listens': 60, 'favorites': 0})
+    assert leaderboards.top('listens', ('genre', 10), 10) == [(4, 60), (3, 30)]
+    assert leaderboards.top('favorites', None, 2) == [(3, 4), (1, 1)]
+    leaderboards.set_counts(99, {'listens': 60})
+    assert len(leaderboards.top('listens', None, 10)) == 4
+
+
+def test_add_and_remove_tracks(leaderboards):
+    leaderboards.top('listens', None, 10)
+
+    leaderboards.add_track(5, {'listens': 40}, [('genre', 10)])
+    leaderboards.remove_track(2)
+    assert leaderboards.top('listens', None, 10) == [(5, 40), (1, 30), (3, 30), (4, 10)]
+    assert leaderboards.top('listens', ('genre', 10), 10) == [(5, 40), (3, 30), (4, 10)]
+
+    # -- adding a track again replaces its counts and scopes
+    leaderboards.add_track(1, {'listens': 5}, [('genre', 10)])
+    assert leaderboards.top('listens', ('genre', 21), 10) == [(4, 10)]
+    assert leaderboards.top('listens', None, 10) == [(5, 40), (3, 30), (4, 10), (1, 5)]
+
+
+def test_top_stays_exact_as_counts_change(monkeypatch):
+    # -- small boards, so tracks keep dropping off and coming back onto them
+    monkeypatch.setattr(leaderboards_module, 'LEADERBOARD_DEPTH', 5)
+    random.seed(235)
+    leaderboards = Leaderboards(METRICS)
+    counts = dict()
+    scopes = dict()
+    for track_id in range(60):
+        counts[track_id] = random.randint(0, 20)
+        scopes[track_id] = [('genre', random.randint(1, 3))]
+        leaderboards.add_track(track_id, {'listens': counts[track_id]}, scopes[track_id])
+
+    def expected(scope, k):
+        ranked = sorted((-count, track_id) for track_id, count in counts.items()
+                        if scope is None or scope in scopes[track_id])
+        return [(track_id, -negated_count) for negated_count, track_id in ranked[:k]]
+
+    for _ in range(2000):
+        track_id = random.randrange(60)
+        change = random.choice([-3, -1, 1, 2])
+        leaderboards.count(track_id, 'listens', change)
+        counts[track_id] = max(counts[track_id] + change, 0)
+        scope = random.choice([None, ('genre', 1), ('genre', 2), ('genre', 3)])
+        k = random.randint(1, 5)
+        assert leaderboards.top('listens', scope, k) == expected(scope, k)
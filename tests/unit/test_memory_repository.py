@@ -1,3 +1,5 @@
+import os
+import shutil
 from datetime import date, datetime
 from typing import List
 
@@ -6,6 +8,7 @@ from music.domainmodel.album import Album
 from music.domainmodel.artist import Artist
 from music.domainmodel.genre import Genre
 from music.domainmodel.playlist import PlayList
+from music.domainmodel.rating_summary import RatingSummary
 from music.domainmodel.review import Review
 from music.domainmodel.track import Track
 from music.domainmodel.user import User
@@ -13,6 +16,10 @@ from music.domainmodel.user import User
 from music.adapters.repository import AbstractRepository, RepositoryException
 from music.adapters.memory_repository import MemoryRepository
 from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters import repository_snapshot
+from music.adapters.repository_snapshot import save_snapshot, load_snapshot
+
+from utils import get_project_root
 
 
 
@@ -38,6 +45,13 @@ def test_repository_can_retrieve_a_user_by_id(in_memory_repo):
     user = in_memory_repo.get_user_by_id(1)
     assert user == User(1, 'dave', '123456789')
 
+def test_repository_retrieves_a_user_regardless_of_case(in_memory_repo):
+    user = User(1, 'Dave', '123456789')
+    in_memory_repo.add_user(user)
+
+    assert in_memory_repo.get_user(' DAVE ') is user
+
+
 def test_repository_does_not_retrieve_a_non_existent_user(in_memory_repo):
     user = in_memory_repo.get_user('prince')
     assert user is None
@@ -59,6 +73,14 @@ def test_repository_does_not_retrieve_a_non_existent_album(in_memory_repo):
     album = in_memory_repo.get_album(2)
     assert album is None
 
+def test_repository_keeps_first_album_added_with_same_id(in_memory_repo):
+    album = Album(2, 'International')
+    in_memory_repo.add_album(album)
+    in_memory_repo.add_album(Album(2, 'Duplicate'))
+
+    assert in_memory_repo.get_album(2) is album
+    assert len([a for a in in_memory_repo.albums if a.album_id == 2]) == 1
+
 def test_repository_can_add_an_artist(in_memory_repo):
     artist = Artist(2, 'Artist name')
     in_memory_repo.add_artist(artist)
@@ -132,6 +154,27 @@ def test_repository_can_get_tracks_by_genre(in_memory_repo):
     assert tracks == tracks_in_genre
 
 
+def test_repository_returns_searched_tracks_sorted_by_id(in_memory_repo):
+    artist = Artist(4, 'Nicky Cook')
+    album = Album(4, 'Niris')
+    genre = Genre(1, 'Avant-Garde')
+    track = Track(1, 'Track name')
+    track.artist = artist
+    track.album = album
+    track.add_genre(genre)
+    in_memory_repo.add_track(track)
+
+    for tracks in (in_memory_repo.get_tracks_by_artist(artist.full_name),
+                   in_memory_repo.get_tracks_by_album(album.title),
+                   in_memory_repo.get_tracks_by_genre(genre.name)):
+        assert tracks[0] is track
+        assert tracks == sorted(tracks)
+
+
+def test_repository_does_not_retrieve_tracks_for_unknown_artist(in_memory_repo):
+    assert in_memory_repo.get_tracks_by_artist('Nobody') == []
+
+
 def test_repository_can_get_all_tracks(in_memory_repo):
     all_tracks_function = in_memory_repo.get_all_tracks()
 
@@ -173,6 +216,26 @@ def test_repository_does_not_retrieve_a_non_existent_track(in_memory_repo):
     track = in_memory_repo.get_track(100)
     assert track is None
 
+def test_repository_can_retrieve_every_track_by_id(in_memory_repo):
+    for track in in_memory_repo.tracks:
+        assert in_memory_repo.get_track(track.track_id) is track
+
+
+def test_repository_bulk_load_skips_duplicate_ids(in_memory_repo):
+    existing_track = in_memory_repo.get_track(2)
+    track = Track(1, 'Track name')
+    number_of_tracks = len(in_memory_repo.tracks)
+
+    in_memory_repo.bulk_load([Album(2, 'International')], [Artist(2, 'Artist name')],
+                             [track, Track(1, 'Duplicate'), Track(2, 'Track name')], [Genre(100, 'International')])
+
+    assert len(in_memory_repo.tracks) == number_of_tracks + 1
+    assert in_memory_repo.get_track(1) is track
+    assert in_memory_repo.get_track(2) is existing_track
+    assert in_memory_repo.get_album(2) == Album(2, 'International')
+    assert in_memory_repo.get_artist(2) == Artist(2, 'Artist name')
+    assert in_memory_repo.get_genre(100) == Genre(100, 'International')
+
 
 def test_repository_can_add_review(in_memory_repo):
     user = User(1, 'dave', '123456789')
@@ -195,6 +258,35 @@ def test_repository_can_retrieve_review(in_memory_repo):
 
     assert in_memory_repo.get_reviews() == user.reviews
 
+def test_repository_can_retrieve_reviews_for_a_track(in_memory_repo):
+    user = User(1, 'dave', '123456789')
+    in_memory_repo.add_user(user)
+
+    track = in_memory_repo.get_track(2)
+    review = Review(track, 'review', 1)
+    user.add_review(review)
+    in_memory_repo.add_review(review, user)
+
+    assert in_memory_repo.get_reviews_for_track(2) == [(review, user)]
+    assert in_memory_repo.get_reviews_for_track(3) == []
+
+def test_repository_summarises_the_ratings_of_tracks(in_memory_repo):
+    user = User(1, 'dave', '123456789')
+    in_memory_repo.add_user(user)
+    for track_id, rating in [(2, 4), (2, 5), (3, 1), (2, 4)]:
+        review = Review(in_memory_repo.get_track(track_id), 'review', rating)
+        user.add_review(review)
+        in_memory_repo.add_review(review, user)
+
+    summaries = in_memory_repo.get_rating_summary([2, 3, 5, 99999999])
+
+    assert list(summaries) == [2, 3, 5, 99999999]
+    assert summaries[2].histogram == (0, 0, 0, 2, 1)
+    assert summaries[2].average == 13 / 3
+    assert summaries[3] == RatingSummary([1, 0, 0, 0, 0])
+    assert summaries[5].count == 0
+    assert summaries[99999999].average is None
+
 def test_repository_can_get_users_playlist(in_memory_repo):
     user = User(1, 'dave', '123456789')
     track = Track(1, 'Track name')
@@ -212,8 +304,264 @@ def test_repository_can_get_user_by_id(in_memory_repo):
     assert in_memory_repo.get_user_by_id(1) is user
 
 
+@pytest.fixture
+def snapshot_data_path(tmp_path):
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    for file_name in ('raw_albums_excerpt.csv', 'raw_tracks_excerpt.csv'):
+        shutil.copy(get_project_root() / 'tests' / 'data' / file_name, data_path / file_name)
+    return data_path
+
+
+def test_repository_can_be_restored_from_a_snapshot(in_memory_repo, snapshot_data_path, tmp_path):
+    snapshot_path = tmp_path / 'repo.snapshot'
+    save_snapshot(in_memory_repo, snapshot_path, snapshot_data_path)
+
+    repo = load_snapshot(snapshot_path, snapshot_data_path)
+
+    assert repo is not in_memory_repo
+    assert repo.tracks == in_memory_repo.tracks
+    assert repo.get_track(2).artist == in_memory_repo.get_track(2).artist
+    assert repo.get_tracks_by_genre('Avant-Garde') == in_memory_repo.get_tracks_by_genre('Avant-Garde')
+
+
+def test_repository_snapshot_is_stale_when_csv_files_change(in_memory_repo, snapshot_data_path, tmp_path):
+    snapshot_path = tmp_path / 'repo.snapshot'
+    save_snapshot(in_memory_repo, snapshot_path, snapshot_data_path)
+
+    # Touching a file without changing it keeps the snapshot usable.
+    os.utime(snapshot_data_path / 'raw_tracks_excerpt.csv', ns=(0, 0))
+    assert load_snapshot(snapshot_path, snapshot_data_path) is not None
+
+    with open(snapshot_data_path / 'raw_tracks_excerpt.csv', 'a') as tracks_file:
+        tracks_file.write('\n')
+    assert load_snapshot(snapshot_path, snapshot_data_path) is None
+
+
+def test_repository_snapshot_is_stale_when_the_code_changes(in_memory_repo, snapshot_data_path, tmp_path,
+                                                           monkeypatch):
+    code_path = tmp_path / 'code'
+    code_path.mkdir()
+    (code_path / 'similarity.py').write_text("FEATURE_WEIGHTS = {'genres': 1.0}\n")
+    monkeypatch.setattr(repository_snapshot, 'CODE_DIRECTORIES', (code_path,))
+    snapshot_path = tmp_path / 'repo.snapshot'
+    save_snapshot(in_memory_repo, snapshot_path, snapshot_data_path)
+    assert load_snapshot(snapshot_path, snapshot_data_path) is not None
+
+    # -- the same attributes, built with other weights
+    (code_path / 'similarity.py').write_text("FEATURE_WEIGHTS = {'genres': 2.0}\n")
+    assert load_snapshot(snapshot_path, snapshot_data_path) is None
+
+
+def test_repository_snapshot_missing_or_corrupt(snapshot_data_path, tmp_path):
+    snapshot_path = tmp_path / 'repo.snapshot'
+    assert load_snapshot(snapshot_path, snapshot_data_path) is None
+
+    snapshot_path.write_bytes(b'not a snapshot')
+    assert load_snapshot(snapshot_path, snapshot_data_path) is None
+
+
+def add_numbered_tracks(repo, track_ids, artist):
+    for track_id in track_ids:
+        track = Track(track_id, f'Track {track_id}')
+        track.artist = artist
+        repo.add_track(track)
+
 
+def test_repository_can_get_pages_of_tracks(in_memory_repo):
+    add_numbered_tracks(in_memory_repo, range(100, 130), Artist(4, 'Nicky Cook'))
+    all_ids = sorted(track.track_id for track in in_memory_repo.tracks)
 
+    first_page = in_memory_repo.get_tracks_page(None, 20)
+    assert [track.track_id for track in first_page] == all_ids[:20]
 
+    second_page = in_memory_repo.get_tracks_page(first_page[-1].track_id, 20)
+    assert [track.track_id for track in second_page] == all_ids[20:]
 
+    assert in_memory_repo.get_tracks_page(None, 20, before_id=second_page[0].track_id) == first_page
+    assert [track.track_id for track in in_memory_repo.get_tracks_page(None, 5, from_end=True)] == all_ids[-5:]
+    assert in_memory_repo.get_tracks_page(all_ids[-1], 20) == []
+    assert in_memory_repo.count_tracks() == len(all_ids)
+
+
+def test_repository_can_get_pages_of_filtered_tracks(in_memory_repo):
+    add_numbered_tracks(in_memory_repo, range(100, 130), Artist(4, 'Nicky Cook'))
+    artist_tracks = in_memory_repo.get_tracks_by_artist('Nicky Cook')
+
+    assert in_memory_repo.count_tracks(('artist', 'Nicky Cook')) == len(artist_tracks)
+    page = in_memory_repo.get_tracks_page(artist_tracks[4].track_id, 3, ('artist', 'Nicky Cook'))
+    assert page == artist_tracks[5:8]
+    assert in_memory_repo.get_tracks_page(None, 20, ('genre', 'Not a genre')) == []
+    assert in_memory_repo.count_tracks(('album', 'Not an album')) == 0
+
+    with pytest.raises(RepositoryException):
+        in_memory_repo.count_tracks(('title', 'Food'))
+
+
+def test_repository_reindexes_a_track_added_again(in_memory_repo):
+    track = Track(2, 'Food')
+    track.artist = Artist(1000, 'Somebody else')
+    in_memory_repo.add_track(track)
+
+    assert track in in_memory_repo.get_tracks_by_artist('Somebody else')
+    assert Track(2, 'Food') not in in_memory_repo.get_tracks_by_artist('AWOL')
+    assert in_memory_repo.count_tracks() == len(set(in_memory_repo.tracks))
+
+
+def test_repository_can_search_tracks(in_memory_repo):
+    def search(query, limit=20, offset=0):
+        return [track.track_id for track in in_memory_repo.search_tracks(query, limit, offset)]
+
+    assert search('awol') == [2, 3, 5, 134]
+    assert search('ÁWOL') == [2, 3, 5, 134]
+    assert search('nicky pop') == [20, 30]
+    assert search('hip hop food') == [2]
+    assert search('side') == [137, 138]
+    assert search('awol', 2, 1) == [3, 5]
+    assert search('awol rock') == []
+    assert search('  ') == []
+
+
+def test_repository_ranks_title_matches_first(in_memory_repo):
+    in_artist = Track(1001, 'Tune')
+    in_artist.artist = Artist(1001, 'Quux')
+    in_title = Track(1002, 'Quux tune')
+    in_title.artist = Artist(1002, 'Somebody')
+    in_memory_repo.add_track(in_artist)
+    in_memory_repo.add_track(in_title)
+
+    assert in_memory_repo.search_tracks('quux') == [in_title, in_artist]
+
+    renamed = Track(1002, 'Renamed tune')
+    renamed.artist = Artist(1002, 'Somebody')
+    in_memory_repo.add_track(renamed)
+    assert in_memory_repo.search_tracks('quux') == [in_artist]
+    assert in_memory_repo.search_tracks('renamed') == [renamed]
+
+
+def test_repository_completes_names_by_popularity(in_memory_repo):
+    assert in_memory_repo.complete_names('artist', 'a') == ['AWOL', 'Airway', 'Alec K. Redfearn & the Eyesores']
+    assert in_memory_repo.complete_names('artist', 'eyes') == ['Alec K. Redfearn & the Eyesores']
+    assert in_memory_repo.complete_names('album', 'a', 1) == ['AWOL - A Way Of Life']
+    assert in_memory_repo.complete_names('genre', 'pop') == ['Experimental Pop', 'Pop']
+    assert in_memory_repo.complete_names('genre', 'exp') == ['Experimental Pop']
+
+    for track_id, artist_name in [(1001, 'Airway'), (1002, 'Airway'), (1003, 'Airway'), (1004, 'Aardvark')]:
+        track = Track(track_id, 'New track')
+        track.artist = Artist(track_id, artist_name)
+        in_memory_repo.add_track(track)
+    assert in_memory_repo.complete_names('artist', 'a') == ['Airway', 'AWOL', 'Aardvark',
+                                                            'Alec K. Redfearn & the Eyesores']
+
+
+def test_repository_completes_user_names_by_playlist_likes(in_memory_repo):
+    dave = User(1, 'dave', '123456789')
+    daisy = User(2, 'daisy', '123456789')
+    joe = User(3, 'joe', '123456789')
+    for user in (dave, daisy, joe):
+        in_memory_repo.add_user(user)
+    assert in_memory_repo.complete_names('user', 'da') == ['daisy', 'dave']
+
+    in_memory_repo.like_playlist(dave, joe)
+    in_memory_repo.like_playlist(dave, joe)
+    assert in_memory_repo.complete_names('user', 'da') == ['dave', 'daisy']
+
+    in_memory_repo.unlike_playlist(dave, joe)
+    assert in_memory_repo.complete_names('user', 'da') == ['daisy', 'dave']
+
+    with pytest.raises(RepositoryException):
+        in_memory_repo.complete_names('track', 'da')
+
+
+def test_repository_recommends_tracks_liked_together(in_memory_repo):
+    dave = User(1, 'dave', '123456789')
+    joe = User(2, 'joe', '123456789')
+    in_memory_repo.add_user(dave)
+    in_memory_repo.add_user(joe)
+    assert in_memory_repo.get_recommendations('dave') == []
+
+    in_memory_repo.add_to_favourite(in_memory_repo.get_track(2), joe)
+    in_memory_repo.add_to_favourite(in_memory_repo.get_track(137), joe)
+    in_memory_repo.add_to_favourite(in_memory_repo.get_track(2), dave)
+    assert [track.track_id for track in in_memory_repo.get_recommendations('dave')] == [137, 3, 5]
+
+    in_memory_repo.remove_liked_track(in_memory_repo.get_track(137), joe)
+    assert [track.track_id for track in in_memory_repo.get_recommendations('dave')] == [3, 5, 134]
+
+
+def test_repository_finds_similar_tracks(in_memory_repo):
+    similar = in_memory_repo.get_similar_tracks([137, 2, 999], 3)
+    assert similar[0] == [in_memory_repo.get_track(138)]
+    assert [track.artist.full_name for track in similar[1]] == ['AWOL', 'AWOL', 'AWOL']
+    assert similar[2] == []
+
+    track = Track(1001, 'Side C')
+    track.artist = in_memory_repo.get_track(137).artist
+    track.album = in_memory_repo.get_track(137).album
+    in_memory_repo.add_track(track)
+    assert in_memory_repo.get_similar_tracks([137], 3)[0][-1] == track
+
+
+def test_repository_ranks_tracks_on_leaderboards(in_memory_repo):
+    ranking = in_memory_repo.get_leaderboard('listens', None, 3)
+    assert [(track.track_id, count) for track, count in ranking] == [(10, 50135), (2, 1293), (137, 1278)]
+
+    ranking = in_memory_repo.get_leaderboard('listens', ('genre', 21), 10)
+    assert [track.track_id for track, _ in ranking] == [2, 5, 134, 3]
+    ranking = in_memory_repo.get_leaderboard('favorites', ('artist', 1), 2)
+    assert [(track.track_id, count) for track, count in ranking] == [(5, 6), (134, 3)]
+    ranking = in_memory_repo.get_leaderboard('interest', ('year', 2006), 10)
+    assert [track.track_id for track, _ in ranking] == [137, 138]
+
+    with pytest.raises(RepositoryException):
+        in_memory_repo.get_leaderboard('downloads')
+    with pytest.raises(RepositoryException):
+        in_memory_repo.get_leaderboard('listens', ('decade', 2000))
+
+
+def test_repository_counts_likes_and_playlist_adds_on_leaderboards(in_memory_repo):
+    user = User(1, 'dave', '123456789')
+    other_user = User(2, 'fmercury', '123456789')
+    in_memory_repo.add_user(user)
+    in_memory_repo.add_user(other_user)
+    track = in_memory_repo.get_track(3)
+
+    for liking_user in (user, other_user):
+        in_memory_repo.add_to_favourite(track, liking_user)
+        in_memory_repo.add_to_favourite(track, liking_user)
+    in_memory_repo.add_to_playlist(track, user)
+
+    assert track.track_favorites == 3
+    assert track.track_interest == 1471
+    ranking = in_memory_repo.get_leaderboard('favorites', ('artist', 1), 2)
+    assert [(track.track_id, count) for track, count in ranking] == [(5, 6), (3, 3)]
+
+    in_memory_repo.remove_liked_track(track, user)
+    in_memory_repo.remove_liked_track(track, user)
+    in_memory_repo.remove_from_playlist(track, user)
+    assert (track.track_favorites, track.track_interest) == (2, 1470)
+    ranking = in_memory_repo.get_leaderboard('favorites', ('artist', 1), 2)
+    assert [(track.track_id, count) for track, count in ranking] == [(5, 6), (134, 3)]
+
+
+
+def test_repository_browses_tracks_by_facets(in_memory_repo):
+    tracks, total, counts = in_memory_repo.browse_tracks({'decade': 2000, 'album_type': 'Album'}, 3)
+    assert [track.track_id for track in tracks] == [2, 3, 5]
+    assert total == 8
+    assert [(label, count) for _, label, count in counts['album_type']] == [('Album', 8), ('Live Performance', 2)]
+
+    tracks, total, counts = in_memory_repo.browse_tracks({'genre': 21, 'duration': (240, None)}, 10)
+    assert total == 0
+    assert {value: count for value, _, count in counts['duration']} == {(120, 240): 4}
+
+    # -- new tracks are counted
+    track = Track(1001, 'Side C')
+    track.album = in_memory_repo.get_track(137).album
+    track.add_genre(in_memory_repo.get_genre(21))
+    in_memory_repo.add_track(track)
+    tracks, total, _ = in_memory_repo.browse_tracks({'genre': 21, 'year': 2006}, 10)
+    assert tracks == [track]
 
+    with pytest.raises(RepositoryException):
+        in_memory_repo.browse_tracks({'mood': 'happy'})
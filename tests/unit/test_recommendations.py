@@ -0,0 +1,145 @@
+import heapq
+import pickle
+import threading
+import time
+
+import pytest
+
+from music.adapters.recommendations import Recommender
+
+
+@pytest.fixture
+def recommender():
+    recommender = Recommender()
+    recommender.add_track(1, [('artist', 'AWOL'), ('genre', 'Hip-Hop')])
+    recommender.add_track(2, [('artist', 'AWOL'), ('genre', 'Hip-Hop')])
+    recommender.add_track(3, [('artist', 'AWOL'), ('genre', 'Hip-Hop')])
+    recommender.add_track(4, [('artist', 'Kurt Vile'), ('genre', 'Pop')])
+    recommender.add_track(5, [('artist', 'Nicky Cook'), ('genre', 'Pop')])
+    recommender.add_track(6, [('artist', 'Airway'), ('genre', 'Noise')])
+    return recommender
+
+
+def test_recommend_nothing_without_likes(recommender):
+    assert recommender.recommend(1, 3) == []
+
+
+def test_recommend_from_artist_and_genre_pools_by_popularity(recommender):
+    recommender.like(1, 1)
+    assert recommender.recommend(1, 3) == [2, 3]
+
+    # -- another user liking track 3 makes it more popular than track 2
+    recommender.like(2, 3)
+    assert recommender.recommend(1, 3) == [3, 2]
+
+    recommender.like(1, 4)
+    # -- the latest like comes first; pools take turns
+    assert recommender.recommend(1, 2) == [5, 3]
+
+
+def test_recommend_co_liked_tracks_first(recommender):
+    recommender.like(2, 1)
+    recommender.like(2, 6)
+    recommender.like(3, 1)
+    recommender.like(3, 6)
+    recommender.like(3, 5)
+    recommender.like(1, 1)
+
+    assert recommender.recommend(1, 4) == [6, 5, 2, 3]
+    assert recommender.recommend(1, 1) == [6]
+
+
+def test_likes_can_be_removed(recommender):
+    recommender.like(2, 1)
+    recommender.like(2, 6)
+    recommender.like(1, 1)
+    assert recommender.like(1, 1) is False
+    assert recommender.recommend(1, 1) == [6]
+
+    assert recommender.unlike(2, 6) is True
+    assert recommender.unlike(2, 6) is False
+    assert recommender.recommend(1, 1) == [2]
+
+    recommender.unlike(1, 1)
+    assert recommender.recommend(1, 1) == []
+
+
+def test_set_likes_replaces_the_likes_of_tracks(recommender):
+    recommender.like(2, 1)
+    recommender.like(2, 6)
+    recommender.like(3, 5)
+    recommender.like(1, 1)
+
+    # -- user 2 unliked track 6, and users 3 and 4 liked it
+    recommender.set_likes([6], [(3, 6), (4, 6)])
+    assert recommender.recommend(1, 1) == [2]
+    recommender.like(5, 6)
+    assert recommender.recommend(5, 1) == [5]
+
+    # -- user 3 unliked it again
+    recommender.set_likes([6], [(4, 6), (5, 6)])
+    assert recommender.recommend(5, 1) == []
+
+
+def test_tracks_can_be_moved_between_pools(recommender):
+    recommender.like(1, 1)
+    recommender.add_track(2, [('artist', 'Airway'), ('genre', 'Noise')])
+    assert recommender.recommend(1, 3) == [3]
+
+    recommender.remove_track(3)
+    assert recommender.recommend(1, 3) == []
+
+
+def test_likes_and_recommendations_from_several_threads(recommender, monkeypatch):
+    # -- suggestions that give other threads a turn at every co-liked track, so a like lands in the middle of one
+    # -- unless they take turns
+    nsmallest = heapq.nsmallest
+
+    def yielding(items):
+        for item in items:
+            time.sleep(0)
+            yield item
+
+    monkeypatch.setattr(heapq, 'nsmallest', lambda n, items, key: nsmallest(n, yielding(items), key=key))
+    for track_id in range(7, 200):
+        recommender.add_track(track_id, [('artist', 'AWOL'), ('genre', 'Hip-Hop')])
+    # -- many tracks liked along with track 1, so suggesting from it goes through many co-likes
+    for track_id in range(1, 150):
+        recommender.like(2, track_id)
+    recommender.like(1, 1)
+    stop = threading.Event()
+    errors = []
+
+    def like_and_unlike():
+        # -- other users who liked track 1 liking and unliking more tracks, which changes its co-likes
+        try:
+            while not stop.is_set():
+                for user_id in range(3, 10):
+                    recommender.like(user_id, 1)
+                    recommender.like(user_id, 150 + user_id)
+                for user_id in range(3, 10):
+                    recommender.unlike(user_id, 150 + user_id)
+                    recommender.unlike(user_id, 1)
+        except Exception as error:
+            errors.append(error)
+
+    liker = threading.Thread(target=like_and_unlike)
+    liker.start()
+    try:
+        for _ in range(100):
+            assert recommender.recommend(1, 3) == [2, 3, 4]
+    finally:
+        stop.set()
+        liker.join()
+    assert errors == []
+
+
+def test_recommender_can_be_pickled(recommender):
+    recommender.like(2, 1)
+    recommender.like(2, 6)
+    recommender.like(1, 1)
+
+    copy = pickle.loads(pickle.dumps(recommender))
+    copy.like(1, 5)
+    assert copy.recommend(1, 1) == [6]
+    assert recommender.recommend(1, 2) == [6, 2]
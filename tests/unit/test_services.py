@@ -102,7 +102,7 @@ def test_get_user_interest_return_related_track(in_memory_repo):
     playlists_services.add_to_playlist(track, user, in_memory_repo)
     playlists_services.add_to_favourite(track, user, in_memory_repo)
 
-    interests = tracks_services.get_user_interests(user, in_memory_repo)
+    interests = tracks_services.get_user_interests(user.user_name, in_memory_repo)
     assert len(interests) != 0
 
     for i in interests:
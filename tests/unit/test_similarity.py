@@ -0,0 +1,75 @@
+import pickle
+import random
+
+import pytest
+
+from music.adapters.similarity import TrackFeatures
+
+
+@pytest.fixture
+def features():
+    return TrackFeatures([
+        (1, 10, 'Album', 2008, 240, [1]),
+        (2, 10, 'Album', 2008, 250, [1]),
+        (3, 20, 'Album', 2008, 230, [1]),
+        (4, 20, 'Album', 2008, 235, [1, 2]),
+        (5, 30, 'Live Performance', 1990, 1200, [3]),
+        (6, None, None, None, None, []),
+    ])
+
+
+def test_similar_tracks_share_the_most_features(features):
+    assert features.similar([1], 3) == [[2, 3, 4]]
+    # -- the same artist outweighs a shared genre
+    assert features.similar([3], 1) == [[4]]
+    assert features.similar([1], 1) == [[2]]
+
+
+def test_similar_tracks_leave_out_tracks_sharing_nothing(features):
+    assert 5 not in features.similar([1], 5)[0]
+    assert features.similar([6], 5) == [[]]
+    assert all(6 not in similar for similar in features.similar([1, 2, 3, 4, 5], 5))
+
+
+def test_similar_tracks_for_many_seeds_at_once(features):
+    seeds = [4, 1, 999, 2]
+    assert features.similar(seeds, 2) == [features.similar([seed], 2)[0] for seed in seeds]
+    assert features.similar(seeds, 2)[2] == []
+    assert features.similar([], 2) == []
+
+
+def test_similar_tracks_of_a_small_catalogue():
+    assert TrackFeatures([]).similar([1], 5) == [[]]
+    assert TrackFeatures([(1, 10, 'Album', 2008, 240, [1])]).similar([1], 5) == [[]]
+    assert TrackFeatures([(1, 10, None, None, None, []), (2, 10, None, None, None, [])]).similar([1, 2], 5) == [[2], [1]]
+
+
+def test_added_tracks_are_found_as_if_built_with_them(features):
+    features.add((7, 10, 'EP', 2008, 240, [1, 4]))
+    assert features.similar([7], 2) == [[1, 2]]
+    assert features.similar([1], 3) == [[2, 7, 3]]
+    # -- adding a track again replaces its features
+    features.add((7, 30, 'Live Performance', 1990, 1100, [3]))
+    assert features.similar([7], 1) == [[5]]
+    assert len(features) == 7
+
+
+def test_tracks_added_one_by_one_match_a_matrix_built_at_once():
+    random.seed(235)
+    rows = [(track_id, random.choice([None, 1, 2, 3]), random.choice([None, 'Album', 'EP', 'Single']),
+             random.choice([None, 1990, 2008]), random.choice([None, 120, 240, 600]),
+             random.sample(range(1, 20), random.randint(0, 3)))
+            for track_id in random.sample(range(1, 1000), 200)]
+    built = TrackFeatures(rows)
+    added = TrackFeatures(rows[:5])
+    for row in rows[5:]:
+        added.add(row)
+    seeds = [row[0] for row in rows]
+    assert added.similar(seeds, 5) == built.similar(seeds, 5)
+
+
+def test_track_features_can_be_pickled(features):
+    copy = pickle.loads(pickle.dumps(features))
+    copy.add((7, 10, 'Album', 2008, 240, [1]))
+    assert copy.similar([1], 1) == [[7]]
+    assert features.similar([1], 1) == [[2]]
@@ -0,0 +1,89 @@
+import pytest
+
+from music.adapters.text_search import InvertedIndex, PrefixIndex, tokenize
+
+
+@pytest.fixture
+def index():
+    index = InvertedIndex()
+    index.add(1, [('Rock and Roll', 2), ('The Band', 1)])
+    index.add(2, [('Roll Over', 2), ('Rockers', 1)])
+    index.add(3, [('Quiet Song', 2), ('The Band', 1), ('Rock', 1)])
+    index.add(4, [('Song Song Song', 2), ('Singer', 1)])
+    return index
+
+
+def test_tokenize():
+    assert tokenize('Hip-Hop, Café & Roll_Over 2') == ['hip', 'hop', 'cafe', 'roll', 'over', '2']
+    assert tokenize('') == []
+    assert tokenize(None) == []
+
+
+def test_search_matches_every_term(index):
+    assert sorted(index.search('band', 10)) == [1, 3]
+    assert index.search('roll band', 10) == [1]
+    assert index.search('roll missing', 10) == []
+    assert index.search(' ,', 10) == []
+
+
+def test_search_matches_the_start_of_terms(index):
+    assert sorted(index.search('rock', 10)) == [1, 2, 3]
+    assert sorted(index.search('ro', 10)) == [1, 2, 3]
+    assert index.search('rockers', 10) == [2]
+
+
+def test_search_ranks_by_tf_idf(index):
+    # -- 'song' occurs three times in the title of 4, with twice the weight of the artist field of 3
+    assert index.search('song', 10) == [4, 3]
+    # -- equal scores are ordered by id
+    assert index.search('band', 10) == [1, 3]
+    assert index.search('quiet band', 10) == [3]
+    assert index.search('rock', 2) == index.search('rock', 10)[:2]
+    assert index.search('rock', 2, 1) == index.search('rock', 10)[1:3]
+
+
+def test_documents_can_be_replaced_and_removed(index):
+    index.add(1, [('Jazz', 2)])
+    assert sorted(index.search('band', 10)) == [3]
+    assert index.search('jazz', 10) == [1]
+
+    index.remove(1)
+    index.remove(1)
+    assert index.search('jazz', 10) == []
+    assert len(index) == 3
+
+
+def test_prefix_index_completes_any_word_by_popularity():
+    names = PrefixIndex()
+    names.add('The Rolling Stones', 3)
+    names.add('Roll Over', 5)
+    names.add('Rock Band', 5)
+    names.add('Bob Ross')
+
+    assert names.complete('ro', 10) == ['Rock Band', 'Roll Over', 'The Rolling Stones', 'Bob Ross']
+    assert names.complete('ro', 2) == ['Rock Band', 'Roll Over']
+    assert names.complete('rolling st', 10) == ['The Rolling Stones']
+    assert names.complete('THE  ROLL', 10) == ['The Rolling Stones']
+    assert names.complete('stones the', 10) == []
+    assert names.complete(' -', 10) == []
+
+
+def test_prefix_index_keeps_popularity_up_to_date():
+    names = PrefixIndex()
+    names.add('Rock Band', 1)
+    names.add('Roll Over', 2)
+    names.add('Rock Band', 2)
+    assert names.complete('r', 10) == ['Rock Band', 'Roll Over']
+
+    names.add('Rock Band', -2)
+    assert names.complete('r', 10) == ['Roll Over', 'Rock Band']
+    assert len(names) == 2
+
+
+def test_prefix_index_can_be_built_in_bulk():
+    names = PrefixIndex([('Rock Band', 1), ('Roll Over', 2), ('Rock Band', 2), ('The Rolling Stones', 0)])
+    assert names.complete('ro', 10) == ['Rock Band', 'Roll Over', 'The Rolling Stones']
+    assert len(names) == 3
+
+    names.add('Rockers', 4)
+    assert names.complete('ro', 10) == ['Rockers', 'Rock Band', 'Roll Over', 'The Rolling Stones']
@@ -1,8 +1,10 @@
 import pytest
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, clear_mappers
 
+from music import create_app
 from music.adapters import database_repository, repository_populate
 from music.adapters.orm import metadata, map_model_to_tables
 
@@ -31,6 +33,19 @@ def database_engine():
     yield engine
     metadata.drop_all(engine)
 
+@pytest.fixture
+def fast_ingest_engine():
+    clear_mappers()
+    engine = create_engine(TEST_DATABASE_URI_IN_MEMORY)
+    metadata.create_all(engine)
+    map_model_to_tables()
+    session_factory = sessionmaker(autocommit=False, autoflush=True, bind=engine)
+    repo_instance = database_repository.SqlAlchemyRepository(session_factory)
+    database_mode = True
+    repository_populate.populate(TEST_DATA_PATH_DATABASE_LIMITED, repo_instance, database_mode, fast_ingest=True)
+    yield engine
+    metadata.drop_all(engine)
+
 @pytest.fixture
 def session_factory():
     clear_mappers()
@@ -58,4 +73,72 @@ def empty_session():
     map_model_to_tables()
     session_factory = sessionmaker(bind=engine)
     yield session_factory()
-    metadata.drop_all(engine)
\ No newline at end of file
+    metadata.drop_all(engine)
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = []
+        self.__engine = engine
+        event.listen(engine, 'before_cursor_execute', self.__record)
+
+    def close(self):
+        event.remove(self.__engine, 'before_cursor_execute', self.__record)
+
+    def __record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def reset(self):
+        self.statements = []
+
+
+@pytest.fixture
+def statement_counter(session_factory):
+    return StatementCounter(session_factory.kw['bind'])
+
+
+
+def create_database_app(**config):
+    clear_mappers()
+    test_config = {
+        'TESTING': 'True',                              # Repopulates the database file.
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': TEST_DATABASE_URI_FILE,
+        'TEST_DATA_PATH': TEST_DATA_PATH_DATABASE_FULL,
+        'WTF_CSRF_ENABLED': False
+    }
+    test_config.update(config)
+    return create_app(test_config)
+
+
+@pytest.fixture(params=['joined', 'selectin'])
+def database_client(request):
+    yield create_database_app(TRACK_LOADER_STRATEGY=request.param).test_client()
+    metadata.drop_all(create_engine(TEST_DATABASE_URI_FILE))
+
+
+@pytest.fixture
+def database_app():
+    # -- for tests that build their own app, once; the tables of the test database file are dropped afterwards
+    yield create_database_app
+    metadata.drop_all(create_engine(TEST_DATABASE_URI_FILE))
+
+
+@pytest.fixture(params=[('null', TEST_DATABASE_URI_FILE), ('queue', TEST_DATABASE_URI_FILE),
+                        ('static', TEST_DATABASE_URI_IN_MEMORY)])
+def pooled_client(request):
+    pool_mode, database_uri = request.param
+    yield create_database_app(SQLALCHEMY_POOL=pool_mode, SQLALCHEMY_DATABASE_URI=database_uri).test_client()
+    metadata.drop_all(create_engine(TEST_DATABASE_URI_FILE))
+
+
+@pytest.fixture
+def request_statement_counter():
+    # -- the engine is created inside create_app, so statements of every engine are counted
+    counter = StatementCounter(Engine)
+    yield counter
+    counter.close()
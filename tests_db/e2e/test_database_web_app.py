@@ -0,0 +1,85 @@
+import re
+
+import pytest
+from sqlalchemy import event
+
+import music.adapters.repository as repo
+
+
+def test_all_tracks_pages_cost_a_constant_number_of_statements(database_client, request_statement_counter):
+    request_statement_counter.reset()
+    response = database_client.get('/all_tracks')
+    first_page_statements = request_statement_counter.count
+    assert response.status_code == 200
+
+    last_id_on_page = max(int(track_id) for track_id in re.findall(r'/track/(\d+)', response.data.decode()))
+    request_statement_counter.reset()
+    response = database_client.get(f'/all_tracks?after={last_id_on_page}')
+    assert response.status_code == 200
+
+    # -- the page of tracks and their genres (plus artists and albums for selectin) and their ratings, none per row
+    assert request_statement_counter.count == first_page_statements
+    assert first_page_statements <= 5
+
+
+def test_leaderboard_pages_cost_a_constant_number_of_statements(database_client, request_statement_counter):
+    database_client.get('/leaderboards')
+
+    counts = []
+    for url in ('/leaderboards', '/leaderboards/favorites/genre/21', '/leaderboards/interest/year/2009?limit=50'):
+        request_statement_counter.reset()
+        assert database_client.get(url).status_code == 200
+        counts.append(request_statement_counter.count)
+
+    # -- the leaderboards are loaded by the first request; then only the counts changed since and the tracks shown
+    # -- (with their genres, plus artists and albums for selectin) are read, and the genre named in the heading
+    assert counts[0] == counts[2] == counts[1] - 1
+    assert counts[0] <= 5
+
+
+def test_user_page_costs_a_constant_number_of_statements(database_client, request_statement_counter):
+    database_client.post('/authentication/register', data={'user_name': 'thorke', 'password': 'cLQ^C#oFXloS1'})
+    database_client.post('/authentication/register', data={'user_name': 'fmercury', 'password': 'mvNNbc1eLA$i'})
+    tracks = repo.repo_instance.get_tracks_page(None, 20)
+    repo.repo_instance.add_to_playlist(tracks[0], repo.repo_instance.get_user('thorke'))
+    for track in tracks:
+        repo.repo_instance.add_to_playlist(track, repo.repo_instance.get_user('fmercury'))
+
+    def statements_to_show(user_name):
+        request_statement_counter.reset()
+        response = database_client.post('/search_user', data={'select': 'User name', 'search': user_name})
+        assert response.status_code == 200
+        assert user_name.encode() in response.data
+        return request_statement_counter.count
+
+    assert statements_to_show('thorke') == statements_to_show('fmercury')
+
+
+def test_requests_return_their_connections_to_the_pool(pooled_client):
+    engine = repo.repo_instance._session_cm.session.get_bind()
+    checked_out = []
+    event.listen(engine, 'checkout', lambda *args: checked_out.append(1))
+    event.listen(engine, 'checkin', lambda *args: checked_out.pop())
+
+    for url in ['/all_tracks', '/track/2', '/all_tracks?last=1', '/search_result?key=AWOL&chose=Artist']:
+        response = pooled_client.get(url)
+        assert response.status_code == 200
+        # -- the session of the request is removed at teardown, so no connection stays checked out
+        assert checked_out == []
+
+
+def test_static_pool_is_refused_for_file_databases(database_app):
+    # -- its one shared connection would let one request's teardown roll back another's uncommitted writes
+    with pytest.raises(ValueError):
+        database_app(SQLALCHEMY_POOL='static', SQLALCHEMY_DATABASE_URI='sqlite:///music-test.db')
+
+
+def test_app_connections_use_the_configured_sqlite_pragmas(database_app):
+    # -- the pragmas do not depend on the loading strategy, so the app is built once rather than per database_client
+    database_app()
+    engine = repo.repo_instance._session_cm.session.get_bind()
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+        assert connection.exec_driver_sql('PRAGMA temp_store').scalar() == 2
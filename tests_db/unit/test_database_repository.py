@@ -1,3 +1,5 @@
+import math
+import threading
 import pytest
 from datetime import datetime
 
@@ -10,6 +12,7 @@ from music.domainmodel.album import Album
 from music.domainmodel.artist import Artist
 from music.domainmodel.genre import Genre
 from music.domainmodel.playlist import PlayList
+from music.domainmodel.rating_summary import RatingSummary
 from music.domainmodel.review import Review
 from music.domainmodel.track import Track
 from music.domainmodel.user import User
@@ -109,6 +112,24 @@ def test_repository_does_not_retrieve_a_non_existent_track(session_factory):
     track = repo.get_track(1)
     assert track is None
 
+def test_repository_bulk_load_skips_duplicate_ids(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    artist = Artist(0, 'Dave')
+    track = Track(0, 'title')
+    track.artist = artist
+    duplicate_track = Track(0, 'duplicate')
+    duplicate_track.artist = Artist(0, 'Dave')
+    existing_track = Track(2, 'title')
+
+    repo.bulk_load([], [artist], [track, duplicate_track, existing_track], [])
+
+    assert len(repo.get_all_tracks()) == 2001
+    assert repo.get_track(0).title == 'title'
+    assert repo.get_track(0).artist == artist
+    assert repo.get_track(2).title == 'Food'
+
+
 def test_repository_can_retrieve_track_count(session_factory):
     repo = SqlAlchemyRepository(session_factory)
 
@@ -185,6 +206,40 @@ def test_repository_can_retrieve_track_by_genre(session_factory):
     assert matching_tracks == tracks_in_genre
 
 
+@pytest.mark.parametrize(('method', 'key'), (
+        ('get_tracks_by_album', 'AWOL - A Way Of Life'),
+        ('get_tracks_by_artist', 'AWOL'),
+        ('get_tracks_by_genre', 'Rock'),
+))
+def test_repository_retrieves_tracks_with_relations_in_two_statements(session_factory, statement_counter, method, key):
+    repo = SqlAlchemyRepository(session_factory)
+
+    statement_counter.reset()
+    tracks = getattr(repo, method)(key)
+    for track in tracks:
+        assert track.artist.full_name is not None
+        assert track.album is None or track.album.title is not None
+        assert all(genre.name is not None for genre in track.genres)
+
+    assert len(tracks) > 1
+    assert tracks == sorted(tracks)
+    # -- the tracks with their artist and album, then the genres of up to 500 tracks at a time
+    assert statement_counter.count == 1 + math.ceil(len(tracks) / 500)
+
+
+def test_repository_retrieves_tracks_of_every_genre_with_the_same_name(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    track = repo.get_track(2)
+    genre = Genre(1000, 'Hip-Hop')
+    make_genre_association(track, genre)
+    repo.add_track(track)
+
+    matching_tracks = repo.get_tracks_by_genre('Hip-Hop')
+
+    assert repo.get_track(2) in matching_tracks
+    assert len(matching_tracks) > 1
+
+
 def test_repository_can_add_a_genre(session_factory):
     repo = SqlAlchemyRepository(session_factory)
 
@@ -227,6 +282,45 @@ def test_repository_can_add_or_get_review(session_factory):
     assert len(review2) != 0
 
 
+def test_repository_can_get_reviews_for_a_track(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    reviews = repo.get_reviews_for_track(2)
+
+    assert len(reviews) == 1
+    review, author = reviews[0]
+    assert review.review_text == 'Very good'
+    assert author.user_name == 'testuser'
+    assert repo.get_reviews_for_track(3) == []
+
+
+def test_repository_gets_the_rating_summaries_of_tracks_in_one_statement(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+
+    statement_counter.reset()
+    summaries = repo.get_rating_summary([2, 3, 99999999])
+
+    assert statement_counter.count == 1
+    assert list(summaries) == [2, 3, 99999999]
+    assert summaries[2] == RatingSummary([0, 0, 0, 0, 1])
+    assert summaries[3].count == 0
+    assert summaries[99999999].average is None
+
+
+def test_repository_updates_the_rating_summary_when_a_review_is_added(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    user = repo.get_user('testuser')
+
+    for track_id, rating in [(2, 3), (3, 1), (3, 2)]:
+        review = make_review(repo.get_track(track_id), 'review', rating, user)
+        repo.add_review(review, user)
+
+    summaries = repo.get_rating_summary([2, 3])
+    assert summaries[2].histogram == (0, 0, 1, 0, 1)
+    assert summaries[2].average == 4
+    assert summaries[3].histogram == (1, 1, 0, 0, 0)
+
+
 def test_repository_does_not_add_a_review_without_a_user(session_factory):
     repo = SqlAlchemyRepository(session_factory)
 
@@ -340,3 +434,465 @@ def test_can_unlike_users_playlist(session_factory):
     repo.like_playlist(user1, user2)
     repo.unlike_playlist(user1, user2)
     assert user1.playlist.liked_by == []
+
+
+def test_repository_can_get_pages_of_tracks(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    all_ids = sorted(track.track_id for track in repo.get_all_tracks())
+
+    statement_counter.reset()
+    first_page = repo.get_tracks_page(None, 20)
+    assert statement_counter.count == 2
+    assert [track.track_id for track in first_page] == all_ids[:20]
+
+    second_page = repo.get_tracks_page(first_page[-1].track_id, 20)
+    assert [track.track_id for track in second_page] == all_ids[20:40]
+
+    assert repo.get_tracks_page(None, 20, before_id=second_page[0].track_id) == first_page
+    assert [track.track_id for track in repo.get_tracks_page(None, 5, from_end=True)] == all_ids[-5:]
+    assert repo.count_tracks() == len(all_ids)
+
+
+def test_repository_can_get_pages_of_filtered_tracks(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    for track_filter, tracks in ((('artist', 'AWOL'), repo.get_tracks_by_artist('AWOL')),
+                                 (('album', 'AWOL - A Way Of Life'), repo.get_tracks_by_album('AWOL - A Way Of Life')),
+                                 (('genre', 'Rock'), repo.get_tracks_by_genre('Rock'))):
+        assert repo.count_tracks(track_filter) == len(tracks)
+        assert repo.get_tracks_page(tracks[0].track_id, 2, track_filter) == tracks[1:3]
+        assert repo.get_tracks_page(None, 2, track_filter, before_id=tracks[3].track_id) == tracks[1:3]
+
+    with pytest.raises(RepositoryException):
+        repo.count_tracks(('title', 'Food'))
+
+
+@pytest.mark.parametrize('track_loader, expected_statements', [('joined', 2), ('selectin', 4)])
+def test_repository_loads_a_page_of_tracks_in_a_constant_number_of_statements(session_factory, statement_counter,
+                                                                             track_loader, expected_statements):
+    repo = SqlAlchemyRepository(session_factory, track_loader)
+
+    statement_counter.reset()
+    page = repo.get_tracks_page(None, 20)
+    # -- what tracks_list.html reads for every row
+    rows = [(track.title, track.artist.full_name, track.album.title if track.album else None, track.genres)
+            for track in page]
+    assert len(rows) == 20
+    assert statement_counter.count == expected_statements
+
+
+def test_repository_does_not_accept_an_unknown_track_loader(session_factory):
+    with pytest.raises(RepositoryException):
+        SqlAlchemyRepository(session_factory, 'lazy')
+
+
+@pytest.mark.parametrize('track_loader', ['joined', 'selectin'])
+def test_repository_loads_a_users_playlist_in_a_constant_number_of_statements(session_factory, statement_counter,
+                                                                             track_loader):
+    repo = SqlAlchemyRepository(session_factory, track_loader)
+    repo.add_user(User(1, 'dave', '123456789'))
+    repo.add_user(User(2, 'joe', '123456789'))
+    tracks = repo.get_tracks_page(None, 20)
+    for track in tracks[:2]:
+        repo.add_to_playlist(track, repo.get_user('dave'))
+    for track in tracks:
+        repo.add_to_playlist(track, repo.get_user('joe'))
+
+    def statements_to_show(user_name):
+        repo.reset_session()
+        statement_counter.reset()
+        user = repo.get_user(user_name)
+        # -- what user.html reads
+        rows = [(track.title, track.artist.full_name, track.album.title if track.album else None)
+                for track in user.playlist.list_of_tracks]
+        likes = [liker.user_name for liker in user.playlist.liked_by]
+        return len(rows), statement_counter.count
+
+    assert statements_to_show('dave')[0] == 2
+    assert statements_to_show('joe')[0] == 20
+    assert statements_to_show('dave')[1] == statements_to_show('joe')[1]
+
+
+def test_repository_reuses_its_session_registry(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    registry = repo._session_cm.session
+    first_session = registry()
+    repo.get_track(2)
+
+    repo.reset_session()
+    assert repo._session_cm.session is registry
+    assert registry() is not first_session
+
+    # -- every thread has a session of its own
+    sessions_of_other_threads = []
+    worker = threading.Thread(target=lambda: sessions_of_other_threads.append(registry()))
+    worker.start()
+    worker.join()
+    assert sessions_of_other_threads[0] is not registry()
+
+
+def test_adding_a_track_twice_to_a_playlist_is_rejected(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    repo.add_user(User(1, 'dave', '123456789'))
+    track = repo.get_track(2)
+
+    assert repo.add_to_playlist(track, repo.get_user('dave')) is True
+    assert repo.add_to_playlist(track, repo.get_user('dave')) is False
+    assert repo.add_to_favourite(track, repo.get_user('dave')) is True
+    assert repo.add_to_favourite(track, repo.get_user('dave')) is False
+    assert repo.get_user('dave').playlist.list_of_tracks == [track]
+
+    assert repo.remove_from_playlist(track, repo.get_user('dave')) is True
+    assert repo.remove_from_playlist(track, repo.get_user('dave')) is False
+    assert repo.get_user('dave').liked_tracks == [track]
+
+
+def test_playlist_changes_cost_the_same_for_any_playlist_length(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    repo.add_user(User(1, 'dave', '123456789'))
+    repo.add_user(User(2, 'joe', '123456789'))
+    tracks = repo.get_tracks_page(None, 51)
+    for track in tracks[:50]:
+        repo.add_to_playlist(track, repo.get_user('joe'))
+
+    def statements_to_add_and_remove(user_name):
+        user = repo.get_user(user_name)
+        track = tracks[50]
+        statement_counter.reset()
+        repo.add_to_playlist(track, user)
+        repo.add_to_favourite(track, user)
+        repo.remove_from_playlist(track, user)
+        repo.remove_liked_track(track, user)
+        return list(statement_counter.statements)
+
+    # -- one INSERT or DELETE on playlist_tracks each, however many tracks the playlist holds, and one UPDATE of the
+    # -- track's popularity count
+    short_playlist_statements = statements_to_add_and_remove('dave')
+    assert statements_to_add_and_remove('joe') == short_playlist_statements
+    assert len(short_playlist_statements) == 8
+    assert all('playlist_tracks' in statement for statement in short_playlist_statements[0::2])
+    assert all(statement.startswith('UPDATE tracks') for statement in short_playlist_statements[1::2])
+
+
+def test_repository_can_search_tracks(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    awol_tracks = repo.get_tracks_by_artist('AWOL')
+
+    statement_counter.reset()
+    found = repo.search_tracks('awol', 100)
+    assert statement_counter.count == 2
+    assert set(found) >= set(awol_tracks)
+    assert repo.search_tracks('awol', 3, 2) == found[2:5]
+    assert repo.search_tracks('ÁWOL food', 100) == [repo.get_track(2)]
+    assert repo.search_tracks('  ') == []
+
+
+def test_repository_ranks_title_matches_first_and_keeps_the_search_index_in_sync(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    in_title = Track(100001, 'Quux tune')
+    in_title.artist = Artist(100001, 'Somebody')
+    in_artist = Track(100002, 'Tune')
+    in_artist.artist = Artist(100002, 'Quux')
+    repo.add_track(in_artist)
+    repo.add_track(in_title)
+
+    assert [track.track_id for track in repo.search_tracks('quux')] == [100001, 100002]
+
+    renamed = Track(100001, 'Renamed tune')
+    renamed.artist = Artist(100001, 'Somebody')
+    repo.add_track(renamed)
+    assert [track.track_id for track in repo.search_tracks('quux')] == [100002]
+    assert [track.track_id for track in repo.search_tracks('renamed')] == [100001]
+
+
+def test_repository_completes_names_by_popularity(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+
+    statement_counter.reset()
+    assert repo.complete_names('artist', 'ai') == ['Ai Aso', 'Airway']
+    assert statement_counter.count == 2
+    # -- later completions only check that the artists and tracks are unchanged before using the loaded index
+    assert repo.complete_names('artist', 'eyes') == ['Alec K. Redfearn & the Eyesores']
+    assert statement_counter.count == 3
+
+    assert repo.complete_names('album', 'awol') == ['AWOL - A Way Of Life']
+    assert repo.complete_names('genre', 'exp') == ['Experimental', 'Experimental Pop']
+    assert repo.complete_names('genre', 'pop', 2) == ['Pop', 'Experimental Pop']
+
+    for track_id in (100001, 100002, 100003, 100004):
+        track = Track(track_id, 'New track')
+        track.artist = Artist(track_id, 'Airway')
+        repo.add_track(track)
+    # -- the tracks of the four new artists named Airway add up
+    assert repo.complete_names('artist', 'ai') == ['Airway', 'Ai Aso']
+
+    with pytest.raises(RepositoryException):
+        repo.complete_names('track', 'a')
+
+
+def test_repository_completes_user_names_by_playlist_likes(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    repo.add_user(User(1, 'dave', '123456789'))
+    assert repo.complete_names('user', 'da') == ['dave']
+
+    statement_counter.reset()
+    repo.add_user(User(2, 'daisy', '123456789'))
+    repo.add_user(User(3, 'joe', '123456789'))
+    dave = repo.get_user('dave')
+    joe = repo.get_user('joe')
+    assert repo.complete_names('user', 'da') == ['daisy', 'dave']
+
+    repo.like_playlist(dave, joe)
+    assert repo.complete_names('user', 'da') == ['dave', 'daisy']
+
+    repo.unlike_playlist(dave, joe)
+    assert repo.complete_names('user', 'da') == ['daisy', 'dave']
+    # -- and matches what is stored
+    assert SqlAlchemyRepository(session_factory).complete_names('user', 'da') == ['daisy', 'dave']
+
+
+def test_completions_follow_the_changes_of_other_repositories(session_factory, statement_counter):
+    # -- as two processes sharing the database file would
+    repo, other_repo = SqlAlchemyRepository(session_factory), SqlAlchemyRepository(session_factory)
+    repo.add_user(User(1, 'dave', '123456789'))
+    repo.add_user(User(2, 'joe', '123456789'))
+    assert other_repo.complete_names('user', 'da') == ['dave']
+
+    repo.add_user(User(3, 'daisy', '123456789'))
+    assert other_repo.complete_names('user', 'da') == ['daisy', 'dave']
+    repo.like_playlist(repo.get_user('dave'), repo.get_user('joe'))
+    assert other_repo.complete_names('user', 'da') == ['dave', 'daisy']
+    repo.unlike_playlist(repo.get_user('dave'), repo.get_user('joe'))
+    assert other_repo.complete_names('user', 'da') == ['daisy', 'dave']
+
+    # -- the liked playlist changed, but neither the number of likes nor the highest id did
+    repo.like_playlist(repo.get_user('dave'), repo.get_user('joe'))
+    assert other_repo.complete_names('user', 'da') == ['dave', 'daisy']
+    repo.unlike_playlist(repo.get_user('dave'), repo.get_user('joe'))
+    repo.like_playlist(repo.get_user('daisy'), repo.get_user('joe'))
+    assert other_repo.complete_names('user', 'da') == ['daisy', 'dave']
+
+    assert other_repo.complete_names('artist', 'ai') == ['Ai Aso', 'Airway']
+    for track_id in (100001, 100002, 100003, 100004):
+        track = Track(track_id, 'New track')
+        track.artist = Artist(track_id, 'Airway')
+        repo.add_track(track)
+    assert other_repo.complete_names('artist', 'ai') == ['Airway', 'Ai Aso']
+
+    statement_counter.reset()
+    other_repo.complete_names('user', 'da')
+    # -- nothing changed since, so the loaded index is used
+    assert statement_counter.count == 1
+
+
+def test_repository_recommends_tracks_liked_together(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    repo.add_user(User(1, 'dave', '123456789'))
+    repo.add_user(User(2, 'joe', '123456789'))
+    dave = repo.get_user('dave')
+    joe = repo.get_user('joe')
+    assert repo.get_recommendations('dave') == []
+
+    repo.add_to_favourite(repo.get_track(2), joe)
+    repo.add_to_favourite(repo.get_track(137), joe)
+    repo.add_to_favourite(repo.get_track(2), dave)
+    recommended = [track.track_id for track in repo.get_recommendations('dave')]
+    assert recommended[0] == 137
+    assert all(repo.get_track(track_id).artist.full_name == 'AWOL' for track_id in recommended[1:])
+
+    # -- a new repository loads the same model from the stored favourites
+    loaded = SqlAlchemyRepository(session_factory).get_recommendations('dave')
+    assert [track.track_id for track in loaded] == recommended
+
+    repo.remove_liked_track(repo.get_track(137), joe)
+    assert 137 not in [track.track_id for track in repo.get_recommendations('dave')]
+
+
+def test_recommendations_cost_the_same_for_any_number_of_favourites(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    repo.add_user(User(1, 'dave', '123456789'))
+    dave = repo.get_user('dave')
+    repo.get_recommendations('dave')
+    for track in repo.get_tracks_page(None, 200):
+        repo.add_to_favourite(track, dave)
+    repo.get_recommendations('dave', 5)
+
+    statement_counter.reset()
+    recommended = repo.get_recommendations('dave', 5)
+    # -- the user's id, the tracks liked since (none), then the suggested tracks and their genres
+    assert statement_counter.count == 4
+    assert len(recommended) == 5
+    assert not set(recommended) & set(repo.get_user('dave').liked_tracks)
+
+
+def test_recommendations_follow_the_likes_of_other_repositories(session_factory):
+    # -- as two processes sharing the database file would
+    repo, other_repo = SqlAlchemyRepository(session_factory), SqlAlchemyRepository(session_factory)
+    repo.add_user(User(1, 'dave', '123456789'))
+    repo.add_user(User(2, 'joe', '123456789'))
+    dave = repo.get_user('dave')
+    joe = repo.get_user('joe')
+    repo.add_to_favourite(repo.get_track(2), dave)
+    assert 137 not in [track.track_id for track in other_repo.get_recommendations('dave')]
+
+    repo.add_to_favourite(repo.get_track(2), joe)
+    repo.add_to_favourite(repo.get_track(137), joe)
+    assert other_repo.get_recommendations('dave')[0].track_id == 137
+    repo.remove_liked_track(repo.get_track(137), joe)
+    assert 137 not in [track.track_id for track in other_repo.get_recommendations('dave')]
+    assert [track.track_id for track in other_repo.get_recommendations('dave')] == \
+        [track.track_id for track in SqlAlchemyRepository(session_factory).get_recommendations('dave')]
+
+
+def expected_leaderboard(tracks, metric, in_scope, k):
+    ranked = sorted((track for track in tracks if in_scope(track)),
+                    key=lambda track: (-getattr(track, f'track_{metric}'), track.track_id))
+    return [(track.track_id, getattr(track, f'track_{metric}')) for track in ranked[:k]]
+
+
+def test_repository_ranks_tracks_on_leaderboards(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    tracks = repo.get_all_tracks()
+    leaderboards = [
+        ('listens', None, lambda track: True),
+        ('favorites', ('genre', 21), lambda track: 21 in [genre.genre_id for genre in track.genres]),
+        ('interest', ('artist', 1), lambda track: track.artist is not None and track.artist.artist_id == 1),
+        ('listens', ('year', 2009), lambda track: track.album is not None and track.album.release_year == 2009),
+    ]
+    for metric, scope, in_scope in leaderboards:
+        ranking = repo.get_leaderboard(metric, scope, 10)
+        assert [(track.track_id, count) for track, count in ranking] == expected_leaderboard(tracks, metric,
+                                                                                             in_scope, 10)
+    assert repo.get_leaderboard('listens', ('genre', 99999999)) == []
+    with pytest.raises(RepositoryException):
+        repo.get_leaderboard('downloads')
+
+    statement_counter.reset()
+    repo.get_leaderboard('listens', None, 20)
+    # -- the leaderboards are loaded once; each call reads the counts changed since, the tracks shown and their genres
+    assert statement_counter.count == 3
+
+
+def test_repository_counts_likes_and_playlist_adds_on_leaderboards(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    (top_track, top_count), (track, count) = repo.get_leaderboard('favorites', ('artist', 1), 2)
+    # -- enough users liking the second track to put it on top
+    users = []
+    for user_id in range(1, top_count - count + 2):
+        repo.add_user(User(user_id, f'listener{user_id}', '123456789'))
+        users.append(repo.get_user(f'listener{user_id}'))
+    for user in users:
+        repo.add_to_favourite(track, user)
+    repo.add_to_favourite(track, users[0])
+    repo.add_to_playlist(track, users[0])
+
+    assert repo.get_leaderboard('favorites', ('artist', 1), 1) == [(track, top_count + 1)]
+    # -- the counts are stored, so a new repository ranks the same way
+    stored_track = SqlAlchemyRepository(session_factory).get_track(track.track_id)
+    assert stored_track.track_favorites == top_count + 1
+    assert SqlAlchemyRepository(session_factory).get_leaderboard('favorites', ('artist', 1), 1) == \
+        [(track, top_count + 1)]
+
+    interest = stored_track.track_interest
+    repo.remove_from_playlist(track, users[0])
+    repo.remove_from_playlist(track, users[0])
+    assert repo.get_track(track.track_id).track_interest == interest - 1
+    for user in users:
+        repo.remove_liked_track(track, user)
+    assert repo.get_leaderboard('favorites', ('artist', 1), 2) == [(top_track, top_count), (track, count)]
+
+
+def test_leaderboards_show_the_counts_changed_by_other_repositories(session_factory):
+    # -- as two processes sharing the database file would
+    repo, other_repo = SqlAlchemyRepository(session_factory), SqlAlchemyRepository(session_factory)
+    (top_track, top_count), = other_repo.get_leaderboard('favorites', ('artist', 1), 1)
+    track = repo.get_leaderboard('favorites', ('artist', 1), 2)[1][0]
+    for user_id in range(1, top_count - track.track_favorites + 2):
+        repo.add_user(User(user_id, f'listener{user_id}', '123456789'))
+        repo.add_to_favourite(track, repo.get_user(f'listener{user_id}'))
+
+    assert other_repo.get_leaderboard('favorites', ('artist', 1), 1) == [(track, top_count + 1)]
+    repo.remove_liked_track(track, repo.get_user('listener1'))
+    assert other_repo.get_leaderboard('favorites', ('artist', 1), 2)[1] == (track, top_count)
+
+
+def test_repository_finds_similar_tracks(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    seeds = [137, 2, 99999999]
+    similar = repo.get_similar_tracks(seeds, 3)
+    assert repo.get_track(138) in similar[0]
+    assert all(track.artist.full_name == 'AWOL' for track in similar[1])
+    assert similar[2] == []
+
+    statement_counter.reset()
+    assert repo.get_similar_tracks(seeds, 3) == similar
+    # -- the features are loaded once; each call reads the similar tracks and their genres
+    assert statement_counter.count == 2
+    assert [repo.get_similar_tracks([seed], 3)[0] for seed in seeds] == similar
+
+
+def copied_track(track: Track) -> Track:
+    # -- a new track with the same features, so the most similar to it
+    copy = Track(100001, 'Side C')
+    copy.artist = track.artist
+    copy.album = track.album
+    copy.track_duration = track.track_duration
+    for genre in track.genres:
+        copy.add_genre(genre)
+    return copy
+
+
+def test_repository_adds_tracks_to_the_loaded_features(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    repo.get_similar_tracks([137], 3)
+    track = copied_track(repo.get_track(137))
+    repo.add_track(track)
+
+    statement_counter.reset()
+    assert repo.get_similar_tracks([137], 1)[0] == [track]
+    # -- the new track is a row added to the features rather than a reason to load them again
+    assert statement_counter.count == 2
+
+
+def test_bulk_loads_build_the_features(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    track = copied_track(repo.get_track(137))
+    repo.bulk_load([], [], [track], [])
+
+    statement_counter.reset()
+    assert [similar.track_id for similar in repo.get_similar_tracks([137], 1)[0]] == [100001]
+    # -- only the similar tracks and their genres are read, as bulk_load built the features
+    assert statement_counter.count == 2
+
+
+def test_repository_browses_tracks_by_facets(session_factory, statement_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    tracks = repo.get_all_tracks()
+    filters = {'genre': 21, 'decade': 2000, 'duration': (None, 240)}
+    tracks_page, total, counts = repo.browse_tracks(filters, 10, 5)
+
+    def matches(track, facet):
+        album = track.album
+        if facet == 'genre':
+            return 21 in [genre.genre_id for genre in track.genres]
+        if facet == 'decade':
+            return album is not None and album.release_year is not None and 2000 <= album.release_year < 2010
+        return track.track_duration is not None and track.track_duration < 240
+
+    expected = sorted(track.track_id for track in tracks if all(matches(track, facet) for facet in filters))
+    assert [track.track_id for track in tracks_page] == expected[5:15]
+    assert total == len(expected)
+    # -- the genre counts ignore the genre filter
+    expected_genre_counts = dict()
+    for track in tracks:
+        if matches(track, 'decade') and matches(track, 'duration'):
+            for genre_id in {genre.genre_id for genre in track.genres}:
+                expected_genre_counts[genre_id] = expected_genre_counts.get(genre_id, 0) + 1
+    assert {value: count for value, _, count in counts['genre']} == expected_genre_counts
+    with pytest.raises(RepositoryException):
+        repo.browse_tracks({'mood': 'happy'})
+
+    statement_counter.reset()
+    repo.browse_tracks({'year': 2009}, 20)
+    # -- the facets are loaded once; each call reads the tracks shown and their genres
+    assert statement_counter.count == 2
@@ -1,8 +1,13 @@
 import pytest
 from datetime import datetime
 
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.exc import IntegrityError
 
+from music.adapters.orm import (
+    metadata, set_sqlite_pragmas, upgrade_schema, track_ratings_table, tracks_search_table, SchemaUpgradeException
+)
+
 from music.domainmodel.model import make_review, make_genre_association
 from music.adapters.repository import AbstractRepository
 from music.domainmodel.model import  make_genre_association, make_review, ModelException
@@ -15,6 +20,8 @@ from music.domainmodel.review import Review
 from music.domainmodel.track import Track
 from music.domainmodel.user import User
 
+from utils import get_project_root
+
 
 def insert_user(empty_session, values=None):
     new_name = "Andrew"
@@ -345,3 +352,167 @@ def test_saving_of_track_with_genres(empty_session):
         assert genre in track.genres
 
 
+def query_plan(empty_session, sql, values=None):
+    rows = empty_session.execute('EXPLAIN QUERY PLAN ' + sql, values or {}).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize(('sql', 'index_name'), (
+        ('SELECT * FROM tracks WHERE artist = :id', 'ix_tracks_artist'),
+        ('SELECT * FROM tracks WHERE album = :id', 'ix_tracks_album'),
+        ('SELECT genre_id FROM track_genres WHERE track_id = :id', 'ix_track_genres_track_id_genre_id'),
+        ('SELECT track_id FROM track_genres WHERE genre_id = :id ORDER BY track_id', 'ix_track_genres_genre_id_track_id'),
+        ('SELECT track_id FROM playlist_tracks WHERE playlist_id = :id', 'ix_playlist_tracks_playlist_id_track_id'),
+        ('SELECT * FROM reviews WHERE track_id = :id', 'ix_reviews_track_id'),
+        ('SELECT * FROM playlists WHERE user_id = :id', 'ix_playlists_user_id'),
+        ("SELECT * FROM users WHERE user_name = 'dave'", 'ix_users_user_name'),
+        ("SELECT * FROM artists WHERE full_name = 'AWOL'", 'ix_artists_full_name'),
+        ("SELECT * FROM albums WHERE title = 'Niris'", 'ix_albums_title'),
+        ("SELECT * FROM genres WHERE name = 'Pop'", 'ix_genres_name'),
+))
+def test_lookups_use_indexes(empty_session, sql, index_name):
+    plan = query_plan(empty_session, sql, {'id': 1})
+
+    assert f'INDEX {index_name}' in plan
+    assert 'SCAN' not in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_user_names_are_unique(empty_session):
+    insert_user(empty_session, ['dave', '1234567'])
+
+    with pytest.raises(IntegrityError):
+        insert_user(empty_session, ['dave', '7654321'])
+
+
+def test_upgrade_schema_adds_missing_indexes(empty_session):
+    engine = empty_session.get_bind()
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.drop(bind=engine)
+    assert inspect(engine).get_indexes('tracks') == []
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        assert {index['name'] for index in inspector.get_indexes(table.name)} == {index.name for index in table.indexes}
+
+
+
+def test_sqlite_pragmas_are_set_on_every_connection(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'pragmas.db'))
+    set_sqlite_pragmas(engine, {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'mmap_size': 1048576,
+                                'cache_size': -2048, 'temp_store': 'MEMORY'})
+
+    for _ in range(2):
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+            assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+            assert connection.exec_driver_sql('PRAGMA mmap_size').scalar() == 1048576
+            assert connection.exec_driver_sql('PRAGMA cache_size').scalar() == -2048
+            assert connection.exec_driver_sql('PRAGMA temp_store').scalar() == 2
+        engine.dispose()
+
+
+def test_sqlite_pragmas_can_be_left_unset(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'pragmas.db'))
+    set_sqlite_pragmas(engine, {})
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'delete'
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 2
+
+
+def test_upgrade_schema_makes_the_playlist_tracks_index_unique(empty_session, caplog):
+    engine = empty_session.get_bind()
+    engine.execute('DROP INDEX ix_playlist_tracks_playlist_id_track_id')
+    engine.execute('CREATE INDEX ix_playlist_tracks_playlist_id_track_id ON playlist_tracks (playlist_id, track_id)')
+    engine.execute('INSERT INTO playlist_tracks (playlist_id, track_id) VALUES (1, 1), (1, 1), (1, 2)')
+
+    upgrade_schema(engine)
+
+    indexes = {index['name']: index for index in inspect(engine).get_indexes('playlist_tracks')}
+    assert indexes['ix_playlist_tracks_playlist_id_track_id']['unique']
+    assert list(engine.execute('SELECT playlist_id, track_id FROM playlist_tracks ORDER BY id')) == [(1, 1), (1, 2)]
+    assert 'Removed 1 duplicate rows from playlist_tracks' in caplog.text
+
+
+def test_upgrade_schema_names_duplicate_users(empty_session):
+    engine = empty_session.get_bind()
+    engine.execute('DROP INDEX ix_users_user_name')
+    engine.execute('CREATE INDEX ix_users_user_name ON users (user_name)')
+    engine.execute("INSERT INTO users (user_name, password) VALUES "
+                   "('andrew', '1234'), ('andrew', '5678'), ('beth', '1234'), ('beth', '5678'), ('carl', '1234')")
+
+    # -- the index cannot be made unique, and no user is deleted to make it so
+    with pytest.raises(SchemaUpgradeException) as raised:
+        upgrade_schema(engine)
+    message = str(raised.value)
+    assert 'ix_users_user_name' in message and 'table users' in message
+    assert "'andrew' (2 rows), 'beth' (2 rows)." in message
+    assert 'carl' not in message
+    assert engine.execute('SELECT count(*) FROM users').scalar() == 5
+    assert not any(index['unique'] for index in inspect(engine).get_indexes('users'))
+
+    # -- once the duplicates are resolved
+    engine.execute("UPDATE users SET user_name = 'andrew2' WHERE password = '5678' AND user_name = 'andrew'")
+    engine.execute("DELETE FROM users WHERE password = '5678' AND user_name = 'beth'")
+    upgrade_schema(engine)
+    assert all(index['unique'] for index in inspect(engine).get_indexes('users'))
+
+
+def test_upgrade_schema_fills_an_empty_search_index(empty_session):
+    engine = empty_session.get_bind()
+    engine.execute("INSERT INTO artists (artist_id, full_name) VALUES (1, 'AWOL')")
+    engine.execute("INSERT INTO tracks (id, title, artist) VALUES (2, 'Food', 1), (3, 'Electric Ave', 1)")
+    engine.execute(tracks_search_table.delete())
+
+    upgrade_schema(engine)
+
+    matches = engine.execute("SELECT rowid FROM tracks_search WHERE tracks_search MATCH 'awol food'").fetchall()
+    assert matches == [(2,)]
+
+
+def test_upgrade_schema_summarises_the_ratings_of_existing_reviews(empty_session):
+    engine = empty_session.get_bind()
+    engine.execute("INSERT INTO users (id, user_name, password) VALUES (1, 'andrew', '1234')")
+    engine.execute("INSERT INTO tracks (id, title) VALUES (2, 'Food'), (3, 'Electric Ave')")
+    engine.execute("INSERT INTO reviews (user_id, track_id, review_text, rating, timestamp) VALUES "
+                   "(1, 2, 'good', 4, '2022-01-01'), (1, 2, 'great', 5, '2022-01-01'), (1, 3, 'bad', 1, '2022-01-01')")
+
+    upgrade_schema(engine)
+
+    rows = engine.execute(track_ratings_table.select().order_by(track_ratings_table.c.track_id)).fetchall()
+    assert [tuple(row) for row in rows] == [(2, 2, 9, 0, 0, 0, 1, 1), (3, 1, 1, 1, 0, 0, 0, 0)]
+
+
+def test_upgrade_schema_adds_missing_columns(empty_session):
+    engine = empty_session.get_bind()
+    engine.execute("INSERT INTO tracks (id, title) VALUES (2, 'Food')")
+    for column in ('track_listens', 'track_favorites', 'track_interest'):
+        engine.execute(f'ALTER TABLE tracks DROP COLUMN {column}')
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    assert list(engine.execute('SELECT id, track_listens, track_favorites, track_interest FROM tracks')) == \
+        [(2, 0, 0, 0)]
+
+
+def test_upgrade_schema_fills_added_popularity_counts_from_the_csv_file(empty_session):
+    engine = empty_session.get_bind()
+    engine.execute("INSERT INTO tracks (id, title) VALUES (2, 'Food'), (3, 'Electric Ave')")
+    for column in ('track_listens', 'track_favorites', 'track_interest'):
+        engine.execute(f'ALTER TABLE tracks DROP COLUMN {column}')
+
+    upgrade_schema(engine, get_project_root() / 'tests' / 'data')
+    query = 'SELECT id, track_listens, track_favorites, track_interest FROM tracks ORDER BY id'
+    assert list(engine.execute(query)) == [(2, 1293, 2, 4656), (3, 514, 1, 1470)]
+
+    # -- counts are only read from the csv file when their columns are added, as they change as tracks are liked
+    engine.execute('UPDATE tracks SET track_favorites = 10 WHERE id = 2')
+    upgrade_schema(engine, get_project_root() / 'tests' / 'data')
+    assert list(engine.execute(query))[0] == (2, 1293, 10, 4656)
+
@@ -1,15 +1,31 @@
-from sqlalchemy import select, inspect
-from music.adapters.orm import metadata
+import gc
+import weakref
+
+from sqlalchemy import create_engine, event, select, inspect
+from sqlalchemy.orm import sessionmaker
+
+import music.adapters.database_repository as database_repository
+from music.adapters import repository_populate
+from music.adapters.csvdatareader import TrackCSVReader
+from music.adapters.orm import metadata, tracks_search_table
+
+from utils import get_project_root
+
+
+def table_names(inspector):
+    # -- leaves out the full-text search table and the tables FTS5 keeps its index in
+    return [name for name in inspector.get_table_names() if not name.startswith(tracks_search_table.name)]
 
 def test_database_populate_inspect_table_names(database_engine):
     # Get table information
     inspector = inspect(database_engine)
-    assert inspector.get_table_names() == ['albums', 'artists', 'genres','playlist_liked_by', 'playlist_tracks', 'playlists', 'reviews', 'track_genres', 'tracks', 'users',]
+    assert table_names(inspector) == ['albums', 'artists', 'genres','playlist_liked_by', 'playlist_tracks', 'playlists', 'reviews', 'track_genres', 'track_ratings', 'tracks', 'users',]
+    assert tracks_search_table.name in inspector.get_table_names()
 
 def test_database_populate_select_all_albums(database_engine):
     # Get table information
     inspector = inspect(database_engine)
-    name_of_albums_table = inspector.get_table_names()[0]
+    name_of_albums_table = table_names(inspector)[0]
     with database_engine.connect() as connection:
         # query for records in table users
         select_statement = select([metadata.tables[name_of_albums_table]])
@@ -21,7 +37,7 @@ def test_database_populate_select_all_albums(database_engine):
 
 def test_database_populate_select_all_artists(database_engine):
     inspector = inspect(database_engine)
-    name_of_artists_table = inspector.get_table_names()[1]
+    name_of_artists_table = table_names(inspector)[1]
     with database_engine.connect() as connection:
         select_statement = select([metadata.tables[name_of_artists_table]])
         result = connection.execute(select_statement)
@@ -32,7 +48,7 @@ def test_database_populate_select_all_artists(database_engine):
 
 def test_database_populate_select_all_genres(database_engine):
     inspector = inspect(database_engine)
-    name_of_genres_table = inspector.get_table_names()[2]
+    name_of_genres_table = table_names(inspector)[2]
     with database_engine.connect() as connection:
         select_statement = select([metadata.tables[name_of_genres_table]])
         result = connection.execute(select_statement)
@@ -43,7 +59,7 @@ def test_database_populate_select_all_genres(database_engine):
 
 def test_database_populate_select_all_playlists(database_engine):
     inspector = inspect(database_engine)
-    name_of_playlists_table = inspector.get_table_names()[5]
+    name_of_playlists_table = table_names(inspector)[5]
     with database_engine.connect() as connection:
         select_statement = select([metadata.tables[name_of_playlists_table]])
         result = connection.execute(select_statement)
@@ -54,7 +70,7 @@ def test_database_populate_select_all_playlists(database_engine):
 
 def test_database_populate_select_all_reviews(database_engine):
     inspector = inspect(database_engine)
-    name_of_reviews_table = inspector.get_table_names()[6]
+    name_of_reviews_table = table_names(inspector)[6]
     with database_engine.connect() as connection:
         select_statement = select([metadata.tables[name_of_reviews_table]])
         result = connection.execute(select_statement)
@@ -63,9 +79,14 @@ def test_database_populate_select_all_reviews(database_engine):
             all_reviews.append((row['id'], row['user_id'], row['review_text'], row['rating']))
         assert all_reviews == [(1, 0, 'Very good', 5)]
 
+def test_database_populate_summarises_the_ratings(database_engine):
+    with database_engine.connect() as connection:
+        rows = connection.execute(select([metadata.tables['track_ratings']])).fetchall()
+        assert [tuple(row) for row in rows] == [(2, 1, 5, 0, 0, 0, 0, 1)]
+
 def test_database_populate_select_all_tracks(database_engine):
     inspector = inspect(database_engine)
-    name_of_tracks_table = inspector.get_table_names()[8]
+    name_of_tracks_table = table_names(inspector)[9]
     with database_engine.connect() as connection:
         select_statement = select([metadata.tables[name_of_tracks_table]])
         result = connection.execute(select_statement)
@@ -76,7 +97,7 @@ def test_database_populate_select_all_tracks(database_engine):
 
 def test_database_populate_select_all_users(database_engine):
     inspector = inspect(database_engine)
-    name_of_users_table = inspector.get_table_names()[9]
+    name_of_users_table = table_names(inspector)[10]
     with database_engine.connect() as connection:
         select_statement = select([metadata.tables[name_of_users_table]])
         result = connection.execute(select_statement)
@@ -88,3 +109,67 @@ def test_database_populate_select_all_users(database_engine):
 
 
 
+
+
+def test_database_fast_ingest_matches_orm_populate(database_engine, fast_ingest_engine):
+    for table_name in ['albums', 'artists', 'genres', 'tracks']:
+        table = metadata.tables[table_name]
+        with database_engine.connect() as connection:
+            expected = sorted(tuple(row) for row in connection.execute(select([table])))
+        with fast_ingest_engine.connect() as connection:
+            actual = sorted(tuple(row) for row in connection.execute(select([table])))
+        assert actual == expected
+
+def test_database_fast_ingest_select_track_genres(database_engine, fast_ingest_engine):
+    table = metadata.tables['track_genres']
+    with database_engine.connect() as connection:
+        expected = sorted((row['track_id'], row['genre_id']) for row in connection.execute(select([table])))
+    with fast_ingest_engine.connect() as connection:
+        actual = sorted((row['track_id'], row['genre_id']) for row in connection.execute(select([table])))
+    assert actual == expected
+
+
+def test_database_fast_ingest_inserts_streamed_tracks_in_chunks(database_engine, monkeypatch):
+    monkeypatch.setattr(database_repository, 'INGEST_CHUNK_SIZE', 3)
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    track_inserts = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: track_inserts.extend(
+                     [statement] if statement.startswith('INSERT INTO tracks ') else []))
+    repo = database_repository.SqlAlchemyRepository(sessionmaker(bind=engine))
+    repository_populate.populate(get_project_root() / 'tests' / 'data', repo, True, fast_ingest=True)
+
+    # -- 10 tracks in chunks of 3
+    assert len(track_inserts) == 4
+    for table_name in ['albums', 'artists', 'genres', 'tracks', 'track_genres']:
+        table = metadata.tables[table_name]
+        with database_engine.connect() as connection:
+            expected = sorted(tuple(row)[1:] if table_name == 'track_genres' else tuple(row)
+                              for row in connection.execute(select([table])))
+        with engine.connect() as connection:
+            actual = sorted(tuple(row)[1:] if table_name == 'track_genres' else tuple(row)
+                            for row in connection.execute(select([table])))
+        assert actual == expected
+
+
+def test_database_fast_ingest_frees_inserted_tracks(empty_session, monkeypatch):
+    # -- empty_session maps the domain model, whose backrefs are what would keep the tracks alive
+    monkeypatch.setattr(database_repository, 'INGEST_CHUNK_SIZE', 3)
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    repo = database_repository.SqlAlchemyRepository(sessionmaker(bind=engine))
+    data_path = get_project_root() / 'tests' / 'data'
+    reader = TrackCSVReader(str(data_path / 'raw_albums_excerpt.csv'), str(data_path / 'raw_tracks_excerpt.csv'))
+    inserted = []
+
+    def tracks():
+        for track in reader.iter_tracks():
+            inserted.append(weakref.ref(track))
+            yield track
+
+    repo.bulk_insert([], [], tracks(), [])
+    gc.collect()
+    # -- the artists, albums and genres the reader shares between tracks no longer hold on to them
+    assert len(inserted) == 10
+    assert all(track() is None for track in inserted)